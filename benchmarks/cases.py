@@ -0,0 +1,453 @@
+"""
+Benchmark datasets and cases for the fingerprinting and scoring hot paths
+"""
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+from diamondfp.ann import ANNIndex, benchmark_recall
+from diamondfp.fingerprints import (
+    ArchetypeMatrix,
+    PercentileReference,
+    archetypefp_batch,
+    binaryfp,
+    binaryfp_batch,
+    binnedfp,
+    binnedfp_batch,
+    normalizedfp,
+    normalizedfp_batch,
+    pack_fp,
+    percentilefp_batch,
+)
+from diamondfp.minhash import lsh_recall
+from diamondfp.scoring import (
+    block_weights,
+    cosine_sim,
+    jaccard,
+    manhattan,
+    score_many,
+    tanimoto,
+    tanimoto_packed,
+)
+from diamondfp.search import PopcountIndex, top_k, top_k_many
+from diamondfp.trajectory import build_trajectories
+from diamondfp.utils.features import feature_scaling, generate_quantiles
+from diamondfp.utils.io import read_savant_csv
+from diamondfp.utils.stats import OnlineFeatureStats
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+
+STAT_FEATURES = {
+    "H": [0.5, 0.75, 0.9, 0.95],
+    "2B": [0.75, 0.95],
+    "3B": [0.75, 0.95],
+    "HR": [0.9, 0.99],
+    "K%": [0.1, 0.25],
+    "BB%": [0.75, 0.99],
+    "AVG": [0.5, 0.75, 0.9, 0.95],
+    "OBP": [0.5, 0.75, 0.9, 0.95],
+    "SLG": [0.5, 0.75, 0.9, 0.95],
+    "OPS": [0.5, 0.75, 0.9, 0.95],
+}
+FEATURES = list(STAT_FEATURES)
+
+SEASON_FEATURES = {
+    "home_run": [0.5, 0.75, 0.9],
+    "k_percent": [0.25, 0.5, 0.75],
+    "bb_percent": [0.5, 0.75, 0.9],
+    "batting_avg": [0.25, 0.5, 0.75, 0.9],
+    "slg_percent": [0.25, 0.5, 0.75, 0.9],
+    "woba": [0.5, 0.75, 0.9],
+}
+
+# number of players at each scale, None is the full bundled career file
+SCALES = {"1k": 1_000, "18k": None, "1m": 1_000_000}
+
+N_QUERIES = 20
+
+
+def career_batting():
+    """
+    Bundled career batting data with the benchmark features filled in
+    """
+    df = pd.read_csv(os.path.join(DATA_DIR, "career-batting.csv"))
+    df[FEATURES] = df[FEATURES].fillna(0.0)
+    return df
+
+
+def synthetic_players(n, seed=0):
+    """
+    n synthetic players drawn from the career batting data with a little
+    multiplicative noise, so quantiles and fingerprints look like real ones
+    """
+    base = career_batting()
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(len(base), size=n)
+    X = base[FEATURES].to_numpy()[rows]
+    X = X * rng.normal(1.0, 0.05, size=X.shape)
+    df = pd.DataFrame(X, columns=FEATURES)
+    df.insert(0, "Name", [f"Player {i}" for i in range(n)])
+    return df
+
+
+class Dataset:
+    """
+    Data, fitted parameters and fingerprints of one scale, built lazily and
+    shared by every case run at that scale
+    """
+
+    def __init__(self, scale):
+        n = SCALES[scale]
+        if n is None:
+            self.df = career_batting()
+        elif n <= 18_000:
+            self.df = career_batting().sample(n, random_state=0).reset_index(drop=True)
+        else:
+            self.df = synthetic_players(n)
+        self.scale = scale
+        self.X = self.df[FEATURES].to_numpy(dtype=float)
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.df)
+
+    def get(self, name, build):
+        if name not in self._cache:
+            self._cache[name] = build()
+        return self._cache[name]
+
+    @property
+    def feat_quants(self):
+        return self.get("feat_quants", lambda: generate_quantiles(self.X, STAT_FEATURES))
+
+    @property
+    def feat_scaling(self):
+        return self.get("feat_scaling", lambda: feature_scaling(self.X, FEATURES, "minmax"))
+
+    @property
+    def binary(self):
+        return self.get("binary", lambda: binaryfp_batch(self.X, self.feat_quants))
+
+    @property
+    def packed(self):
+        return self.get("packed", lambda: pack_fp(self.binary))
+
+    @property
+    def normalized(self):
+        return self.get(
+            "normalized", lambda: normalizedfp_batch(self.X, self.feat_scaling, "minmax")
+        )
+
+    @property
+    def queries(self):
+        rng = np.random.default_rng(1)
+        return self.get("queries", lambda: rng.choice(len(self), N_QUERIES, replace=False))
+
+
+CASES = []
+
+
+def case(group, scales=tuple(SCALES)):
+    """
+    Registers a benchmark case. The decorated function takes a Dataset and
+    returns the callable to time; a callable returning a dict has those
+    values recorded alongside the timings (e.g. recall).
+    """
+
+    def register(func):
+        CASES.append({"name": func.__name__, "group": group, "scales": scales, "setup": func})
+        return func
+
+    return register
+
+
+# import cost
+
+
+def _import_time(statement):
+    code = (
+        "import sys, time; start = time.perf_counter(); "
+        f"{statement}; "
+        "print(time.perf_counter() - start, len(sys.modules), 'pandas' in sys.modules)"
+    )
+
+    def run():
+        out = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        ).stdout.split()
+        return {"import_time": float(out[0]), "modules": int(out[1]), "pandas": out[2] == "True"}
+
+    return run
+
+
+@case("imports", scales=("1k",))
+def import_package(ds):
+    return _import_time("import diamondfp")
+
+
+@case("imports", scales=("1k",))
+def import_fingerprints_scoring(ds):
+    return _import_time("import diamondfp.fingerprints, diamondfp.scoring")
+
+
+# fingerprints
+
+
+@case("fingerprints", scales=("1k",))
+def binaryfp_rows(ds):
+    rows = [row for _, row in ds.df.iterrows()]
+    return lambda: [binaryfp(row, ds.feat_quants) for row in rows]
+
+
+@case("fingerprints", scales=("1k",))
+def binnedfp_rows(ds):
+    rows = [row for _, row in ds.df.iterrows()]
+    return lambda: [binnedfp(row, ds.feat_quants) for row in rows]
+
+
+@case("fingerprints", scales=("1k",))
+def normalizedfp_rows(ds):
+    rows = [row for _, row in ds.df.iterrows()]
+    return lambda: [normalizedfp(row, ds.feat_scaling, "minmax") for row in rows]
+
+
+@case("fingerprints")
+def binaryfp_batch_frame(ds):
+    return lambda: binaryfp_batch(ds.df, ds.feat_quants)
+
+
+@case("fingerprints")
+def binnedfp_batch_frame(ds):
+    return lambda: binnedfp_batch(ds.df, ds.feat_quants)
+
+
+@case("fingerprints")
+def normalizedfp_batch_frame(ds):
+    return lambda: normalizedfp_batch(ds.df, ds.feat_scaling, "minmax")
+
+
+@case("fingerprints")
+def percentilefp_batch_frame(ds):
+    reference = ds.get(
+        "reference", lambda: PercentileReference({f: ds.X[:, j] for j, f in enumerate(FEATURES)})
+    )
+    return lambda: percentilefp_batch(ds.df, reference)
+
+
+@case("fingerprints")
+def archetypefp_batch_frame(ds):
+    rng = np.random.default_rng(0)
+    centers = ds.X[rng.choice(len(ds), 8, replace=False)]
+    archetypes = ArchetypeMatrix(pd.DataFrame(centers, columns=FEATURES))
+    return lambda: archetypefp_batch(ds.df, archetypes)
+
+
+@case("fingerprints")
+def pack_fp_binary(ds):
+    return lambda: pack_fp(ds.binary)
+
+
+# metrics
+
+
+def _pair_loop(ds, func, fps):
+    pairs = [(fps[i], fps[i + 1]) for i in range(0, min(len(fps), 1000) - 1, 2)]
+    return lambda: [func(a, b) for a, b in pairs]
+
+
+@case("metrics", scales=("1k",))
+def tanimoto_pairs(ds):
+    return _pair_loop(ds, tanimoto, ds.binary)
+
+
+@case("metrics", scales=("1k",))
+def jaccard_pairs(ds):
+    return _pair_loop(ds, jaccard, ds.binary)
+
+
+@case("metrics", scales=("1k",))
+def manhattan_pairs(ds):
+    return _pair_loop(ds, manhattan, ds.normalized)
+
+
+@case("metrics", scales=("1k",))
+def cosine_sim_pairs(ds):
+    return _pair_loop(ds, cosine_sim, ds.normalized)
+
+
+@case("metrics", scales=("1k",))
+def tanimoto_packed_pairs(ds):
+    return _pair_loop(ds, tanimoto_packed, ds.packed)
+
+
+def _score_many(ds, metric, fps, packed=False):
+    return lambda: [score_many(fps[q], fps, metric=metric, packed=packed) for q in ds.queries]
+
+
+@case("metrics")
+def score_many_tanimoto(ds):
+    return _score_many(ds, "tanimoto", ds.binary)
+
+
+@case("metrics")
+def score_many_tanimoto_packed(ds):
+    return _score_many(ds, "tanimoto", ds.packed, packed=True)
+
+
+@case("metrics")
+def score_many_jaccard_packed(ds):
+    return _score_many(ds, "jaccard", ds.packed, packed=True)
+
+
+@case("metrics")
+def score_many_manhattan(ds):
+    return _score_many(ds, "manhattan", ds.normalized)
+
+
+@case("metrics")
+def score_many_cosine_sim(ds):
+    return _score_many(ds, "cosine_sim", ds.normalized)
+
+
+# feature weights for the weighted kernels: contact up, doubles down
+WEIGHTS = {"H": 2.0, "2B": 0.5}
+
+
+def _score_many_weighted(ds, metric, fps, packed=False):
+    if metric in ("tanimoto", "jaccard"):
+        weights = block_weights(WEIGHTS, feat_quants=ds.feat_quants)
+    else:
+        weights = block_weights(WEIGHTS, features=FEATURES)
+    return lambda: [
+        score_many(fps[q], fps, metric=metric, packed=packed, weights=weights) for q in ds.queries
+    ]
+
+
+@case("metrics")
+def score_many_tanimoto_weighted(ds):
+    return _score_many_weighted(ds, "tanimoto", ds.binary)
+
+
+@case("metrics")
+def score_many_tanimoto_packed_weighted(ds):
+    return _score_many_weighted(ds, "tanimoto", ds.packed, packed=True)
+
+
+@case("metrics")
+def score_many_cosine_sim_weighted(ds):
+    return _score_many_weighted(ds, "cosine_sim", ds.normalized)
+
+
+@case("metrics")
+def score_many_cosine_sim_float32(ds):
+    fps = ds.get("normalized32", lambda: ds.normalized.astype(np.float32))
+    return _score_many(ds, "cosine_sim", fps)
+
+
+# quantiles and scaling
+
+
+@case("features")
+def generate_quantiles_frame(ds):
+    return lambda: generate_quantiles(ds.df, STAT_FEATURES)
+
+
+@case("features")
+def feature_scaling_frame(ds):
+    return lambda: feature_scaling(ds.df, FEATURES, "zscore")
+
+
+@case("features")
+def online_stats_chunks(ds):
+    def run():
+        stats = OnlineFeatureStats(FEATURES, seed=0)
+        for start in range(0, len(ds), 100_000):
+            stats.partial_fit(ds.X[start : start + 100_000])
+        return stats.generate_quantiles(STAT_FEATURES)
+
+    return run
+
+
+# top-k search
+
+
+@case("search")
+def top_k_brute_dense(ds):
+    fps = ds.normalized
+    return lambda: [top_k(fps[q], fps, k=10, metric="manhattan") for q in ds.queries]
+
+
+@case("search")
+def top_k_pruned_packed(ds):
+    index = ds.get("popcount_index", lambda: PopcountIndex(ds.packed, packed=True))
+    return lambda: [top_k(ds.packed[q], index, k=10, metric="tanimoto") for q in ds.queries]
+
+
+@case("search")
+def top_k_pruned_packed_weighted(ds):
+    index = ds.get("popcount_index", lambda: PopcountIndex(ds.packed, packed=True))
+    weights = block_weights(WEIGHTS, feat_quants=ds.feat_quants)
+    return lambda: [
+        top_k(ds.packed[q], index, k=10, metric="tanimoto", weights=weights) for q in ds.queries
+    ]
+
+
+@case("search")
+def top_k_many_packed(ds):
+    queries = ds.packed[ds.queries]
+    return lambda: top_k_many(
+        queries, ds.packed, k=10, metric="tanimoto", packed=True, exclude=ds.queries
+    )
+
+
+# career trajectories
+
+
+def season_trajectories():
+    """
+    Bundled 2015-2025 per-season batting data as packed trajectories
+    """
+    df = read_savant_csv(os.path.join(DATA_DIR, "batting_2015-2025.csv"))
+    feat_quants = generate_quantiles(df, SEASON_FEATURES, skipna=True)
+    return build_trajectories(df, "player_id", "year", feat_quants=feat_quants)
+
+
+def _trajectory_top_k(ds, method):
+    traj = ds.get("trajectories", season_trajectories)
+    players = [traj.ids[i] for i in np.flatnonzero(traj.lengths >= 5)[:N_QUERIES]]
+    return lambda: [traj.top_k(p, k=10, method=method, seasons=5) for p in players]
+
+
+@case("trajectory", scales=("1k",))
+def trajectory_aligned_first_five(ds):
+    return _trajectory_top_k(ds, "aligned")
+
+
+@case("trajectory", scales=("1k",))
+def trajectory_dtw_first_five(ds):
+    return _trajectory_top_k(ds, "dtw")
+
+
+# approximate search recall
+
+
+@case("recall", scales=("1k", "18k"))
+def lsh_recall_binary(ds):
+    return lambda: lsh_recall(ds.binary, threshold=0.8)
+
+
+@case("recall", scales=("18k", "1m"))
+def ann_recall_normalized(ds):
+    def run():
+        index = ANNIndex(metric="manhattan").build(ds.normalized)
+        results = benchmark_recall(
+            index, ds.normalized, ds.normalized[ds.queries], k=10, n_probes=(1, 4, 16)
+        )
+        return {f"recall@n_probe={r['n_probe']}": r["recall"] for r in results}
+
+    return run
@@ -0,0 +1,244 @@
+"""
+Runs the diamondfp benchmark suite and compares two runs
+
+Ex:
+python benchmarks/run.py run --scales 1k 18k --out before.json
+python benchmarks/run.py run --scales 1k 18k --out after.json
+python benchmarks/run.py compare before.json after.json
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cases import CASES, SCALES, Dataset  # noqa: E402
+
+
+def measure(func, min_time=0.5, max_repeats=20):
+    """
+    Times a callable and measures its peak traced memory
+
+    Parameters
+    ---------
+    func: callable
+        function to benchmark, called without arguments
+    min_time: float
+        keep repeating until this many seconds have been spent
+    max_repeats: int
+        most timed calls to make
+
+    Returns
+    -------
+    result: dict
+        best and median wall time in seconds, number of timed calls, peak
+        memory in bytes and the numbers in any dict the function returned
+    """
+    # the first call warms caches and its result is kept as extra metrics
+    start = time.perf_counter()
+    out = func()
+    times = [time.perf_counter() - start]
+    while sum(times) < min_time and len(times) < max_repeats:
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "time": min(times),
+        "time_median": statistics.median(times),
+        "repeats": len(times),
+        "peak_memory": peak,
+        "extra": {
+            key: float(value)
+            for key, value in (out.items() if isinstance(out, dict) else [])
+            if isinstance(value, (int, float))
+        },
+    }
+
+
+def run(scales, pattern="*", min_time=0.5, verbose=True):
+    """
+    Runs every registered case matching pattern at the given scales
+
+    Parameters
+    ---------
+    scales: list
+        scale names from cases.SCALES
+    pattern: str
+        glob matched against "group.name"
+    min_time: float
+        minimum seconds to spend timing each case
+
+    Returns
+    -------
+    report: dict
+        environment info and one result per case and scale
+    """
+    results = []
+    for scale in scales:
+        ds = None
+        for bench in CASES:
+            if scale not in bench["scales"]:
+                continue
+            if not fnmatch.fnmatch(f"{bench['group']}.{bench['name']}", pattern):
+                continue
+            if ds is None:
+                ds = Dataset(scale)
+            func = bench["setup"](ds)
+            # zero fingerprints make cosine_sim warn on every call
+            with np.errstate(all="ignore"):
+                result = measure(func, min_time=min_time)
+            result.update(
+                {"group": bench["group"], "name": bench["name"], "scale": scale, "n": len(ds)}
+            )
+            results.append(result)
+            if verbose:
+                print(_format(result), flush=True)
+
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+
+def _format(result):
+    extra = " ".join(f"{k}={v:.4g}" for k, v in result["extra"].items())
+    return (
+        f"{result['group']:>12} {result['name']:<28} {result['scale']:>4} "
+        f"{result['time'] * 1e3:10.3f} ms {result['peak_memory'] / 2**20:9.2f} MiB {extra}"
+    )
+
+
+def compare(
+    before,
+    after,
+    time_tolerance=0.25,
+    memory_tolerance=0.25,
+    recall_tolerance=0.01,
+    min_delta=1e-4,
+    min_bytes=2**16,
+):
+    """
+    Compares two benchmark reports and flags regressions
+
+    Parameters
+    ---------
+    before: dict
+        baseline report from run
+    after: dict
+        new report from run
+    time_tolerance: float
+        allowed relative slowdown before a case is flagged
+    memory_tolerance: float
+        allowed relative growth in peak memory before a case is flagged
+    recall_tolerance: float
+        allowed absolute drop in any recorded recall before a case is flagged
+    min_delta: float
+        slowdowns smaller than this many seconds are treated as noise
+    min_bytes: int
+        memory growth smaller than this many bytes is treated as noise
+
+    Returns
+    -------
+    rows: list of dict
+        one row per case present in both reports with the time and memory
+        ratios (after / before) and whether it regressed
+    """
+    base = {(r["group"], r["name"], r["scale"]): r for r in before["results"]}
+    rows = []
+    for new in after["results"]:
+        old = base.get((new["group"], new["name"], new["scale"]))
+        if old is None:
+            continue
+        time_ratio = new["time"] / old["time"] if old["time"] else float("inf")
+        memory_ratio = (
+            new["peak_memory"] / old["peak_memory"] if old["peak_memory"] else 1.0
+        )
+        slower = time_ratio > 1 + time_tolerance and new["time"] - old["time"] > min_delta
+        bigger = (
+            memory_ratio > 1 + memory_tolerance
+            and new["peak_memory"] - old["peak_memory"] > min_bytes
+        )
+        worse = any(
+            value < old["extra"].get(key, value) - recall_tolerance
+            for key, value in new["extra"].items()
+            if "recall" in key
+        )
+        rows.append({
+            "group": new["group"],
+            "name": new["name"],
+            "scale": new["scale"],
+            "time_before": old["time"],
+            "time_after": new["time"],
+            "time_ratio": time_ratio,
+            "memory_ratio": memory_ratio,
+            "regression": slower or bigger or worse,
+        })
+
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--scales", nargs="+", default=["1k", "18k"], choices=list(SCALES))
+    run_parser.add_argument("--filter", default="*", help="glob on group.name, e.g. 'search.*'")
+    run_parser.add_argument("--min-time", type=float, default=0.5)
+    run_parser.add_argument("--out", help="write the report to this JSON file")
+
+    cmp_parser = sub.add_parser("compare", help="flag regressions between two runs")
+    cmp_parser.add_argument("before")
+    cmp_parser.add_argument("after")
+    cmp_parser.add_argument("--time-tolerance", type=float, default=0.25)
+    cmp_parser.add_argument("--memory-tolerance", type=float, default=0.25)
+    cmp_parser.add_argument("--recall-tolerance", type=float, default=0.01)
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        report = run(args.scales, args.filter, args.min_time)
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(report, f, indent=2)
+        return 0
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    rows = compare(
+        before, after, args.time_tolerance, args.memory_tolerance, args.recall_tolerance
+    )
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else ""
+        print(
+            f"{row['group']:>12} {row['name']:<28} {row['scale']:>4} "
+            f"{row['time_before'] * 1e3:10.3f} -> {row['time_after'] * 1e3:10.3f} ms "
+            f"x{row['time_ratio']:5.2f}  mem x{row['memory_ratio']:5.2f}  {flag}"
+        )
+    n_regressions = sum(row["regression"] for row in rows)
+    print(f"{n_regressions} regression(s) in {len(rows)} compared cases")
+    return 1 if n_regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
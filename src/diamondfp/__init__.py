@@ -1,6 +1,37 @@
 """
 Initialze functions
+
+Submodules are imported on first access (diamondfp.fingerprints, ...) so
+`import diamondfp` stays cheap for short-lived jobs.
 """
 
-from . import fingerprints
-from . import scoring
+import importlib
+
+
+__all__ = [
+    "fingerprints",
+    "scoring",
+    "search",
+    "index",
+    "parallel",
+    "ann",
+    "minhash",
+    "cache",
+    "store",
+    "trajectory",
+    "profiling",
+    "pipeline",
+    "utils",
+]
+
+
+def __getattr__(name):
+    if name not in __all__:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(f".{name}", __name__)
+    globals()[name] = module
+    return module
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
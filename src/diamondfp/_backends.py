@@ -0,0 +1,31 @@
+"""
+Heavy optional dependencies, imported once on first use
+"""
+
+import importlib
+
+
+# attribute name: (module to import, package to pip install)
+_MODULES = {
+    "pd": ("pandas", "pandas"),
+    "pl": ("polars", "polars"),
+    "pa": ("pyarrow", "pyarrow"),
+    "pq": ("pyarrow.parquet", "pyarrow"),
+    "sklearn_cluster": ("sklearn.cluster", "scikit-learn"),
+}
+
+
+def __getattr__(name):
+    if name not in _MODULES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name, package = _MODULES[name]
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError as err:
+        raise ImportError(
+            f"{module_name} is required for this feature. Install it with "
+            f"'pip install {package}'."
+        ) from err
+    # later lookups find the module directly and skip __getattr__
+    globals()[name] = module
+    return module
@@ -0,0 +1,258 @@
+"""
+Approximate nearest neighbor search for dense fingerprints
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+
+from .scoring import score_many
+from .search import HIGHER_IS_BETTER, _select
+
+
+def _kmeans(X, n_lists, n_iter, rng):
+    """
+    Plain Lloyd's k-means used for the coarse quantizer
+    """
+    centroids = X[rng.choice(len(X), size=n_lists, replace=False)].copy()
+    for _ in range(n_iter):
+        assign = _nearest_centroids(X, centroids, 1)[:, 0]
+        counts = np.bincount(assign, minlength=n_lists)
+        filled = counts > 0
+        for d in range(X.shape[1]):
+            sums = np.bincount(assign, weights=X[:, d], minlength=n_lists)
+            centroids[filled, d] = sums[filled] / counts[filled]
+    return centroids
+
+
+def _nearest_centroids(X, centroids, n, chunk_size=4096):
+    """
+    Indices of the n closest centroids (euclidean) to every row of X
+    """
+    n = min(n, len(centroids))
+    c_sq = (centroids**2).sum(axis=1)
+    nearest = np.empty((len(X), n), dtype=np.intp)
+    for start in range(0, len(X), chunk_size):
+        chunk = X[start : start + chunk_size]
+        sq = c_sq[None, :] - 2 * chunk @ centroids.T
+        if n == 1:
+            nearest[start : start + chunk_size, 0] = sq.argmin(axis=1)
+            continue
+        if n == len(centroids):
+            nearest[start : start + chunk_size] = np.argsort(sq, axis=1)
+            continue
+        part = np.argpartition(sq, n - 1, axis=1)[:, :n]
+        order = np.take_along_axis(sq, part, axis=1).argsort(axis=1)
+        nearest[start : start + chunk_size] = np.take_along_axis(part, order, axis=1)
+    return nearest
+
+
+class ANNIndex:
+    """
+    Inverted file (IVF) index for normalized and archetype fingerprints.
+    Players are assigned to the nearest of n_lists k-means centroids, and a
+    query is only scored exactly against the players in its n_probe closest
+    lists. Raising n_probe trades speed for recall; n_probe = n_lists is an
+    exact search.
+
+    Parameters
+    ---------
+    n_lists: int
+        number of coarse clusters, defaults to about sqrt(n_players)
+    metric: str
+        manhattan or cosine_sim
+    n_iter: int
+        k-means iterations used to train the centroids
+    seed: int
+        seed for the k-means initialization
+    """
+
+    def __init__(self, n_lists=None, metric="manhattan", n_iter=10, seed=0):
+        if metric not in ("manhattan", "cosine_sim"):
+            raise ValueError("Invalid metric. Use 'manhattan' or 'cosine_sim'.")
+        self.n_lists = n_lists
+        self.metric = metric
+        self.n_iter = n_iter
+        self.seed = seed
+        self.centroids = None
+        self.fps = None
+        self.ids = None
+        self.offsets = None
+
+    def _space(self, X):
+        # cosine neighborhoods are found on the unit sphere
+        X = np.asarray(X, dtype=float)
+        if self.metric == "cosine_sim":
+            norms = np.linalg.norm(X, axis=-1, keepdims=True)
+            X = X / np.where(norms == 0, 1, norms)
+        return X
+
+    def build(self, fps):
+        """
+        Trains the coarse centroids and assigns every fingerprint to a list
+
+        Parameters
+        ---------
+        fps: np.ndarray
+            (n_players, n_dims) matrix of dense fingerprints
+
+        Returns
+        -------
+        self: ANNIndex
+            built index
+        """
+        fps = np.asarray(fps, dtype=float)
+        if np.isnan(fps).any():
+            raise ValueError("Fingerprints contain NaNs; drop or fill them before indexing.")
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(fps))))
+        n_lists = min(n_lists, len(fps))
+        rng = np.random.default_rng(self.seed)
+        X = self._space(fps)
+        # a few hundred points per list are plenty to place the centroids
+        n_train = min(len(X), 256 * n_lists)
+        train = X[rng.choice(len(X), size=n_train, replace=False)]
+        centroids = _kmeans(train, n_lists, self.n_iter, rng)
+
+        assign = _nearest_centroids(X, centroids, 1)[:, 0]
+        # duplicate players can leave duplicate centroids that never win an
+        # assignment; drop empty lists so probing never wastes a slot on one
+        used = np.bincount(assign, minlength=n_lists) > 0
+        self.centroids = centroids[used]
+        self.n_lists = n_lists = int(used.sum())
+        assign = (np.cumsum(used) - 1)[assign]
+        # store each list contiguously so probing a list is a slice
+        order = np.argsort(assign, kind="stable")
+        self.fps = fps[order]
+        self.ids = order
+        self.offsets = np.searchsorted(assign[order], np.arange(n_lists + 1))
+        return self
+
+    def query(self, query_fp, k=10, n_probe=8):
+        """
+        Finds approximate top-k matches of a query fingerprint
+
+        Parameters
+        ---------
+        query_fp: list or np.ndarray
+            fingerprint of the query player
+        k: int
+            number of matches to return
+        n_probe: int
+            number of closest lists to scan, the recall-vs-speed knob
+
+        Returns
+        -------
+        indices: np.ndarray
+            row indices (in the build matrix) of the best matches, best first
+        scores: np.ndarray
+            exact scores of the returned matches
+        """
+        if self.centroids is None:
+            raise ValueError("Index has not been built.")
+        query_fp = np.asarray(query_fp, dtype=float)
+        probe = _nearest_centroids(self._space(query_fp)[None, :], self.centroids, n_probe)[0]
+        rows = np.concatenate(
+            [np.arange(self.offsets[c], self.offsets[c + 1]) for c in probe]
+        )
+        scores = score_many(query_fp, self.fps[rows], metric=self.metric)
+        return _select(scores, self.ids[rows], k, HIGHER_IS_BETTER[self.metric])
+
+    def save(self, path):
+        """
+        Writes the index to a directory
+
+        Parameters
+        ---------
+        path: str
+            directory to write, created if needed
+        """
+        os.makedirs(path, exist_ok=True)
+        np.savez(
+            os.path.join(path, "ann.npz"),
+            centroids=self.centroids,
+            fps=self.fps,
+            ids=self.ids,
+            offsets=self.offsets,
+        )
+        params = {
+            "n_lists": self.n_lists,
+            "metric": self.metric,
+            "n_iter": self.n_iter,
+            "seed": self.seed,
+        }
+        with open(os.path.join(path, "ann.json"), "w") as f:
+            json.dump(params, f)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Opens an index written by save
+
+        Parameters
+        ---------
+        path: str
+            index directory
+
+        Returns
+        -------
+        index: ANNIndex
+            loaded index
+        """
+        with open(os.path.join(path, "ann.json")) as f:
+            index = cls(**json.load(f))
+        with np.load(os.path.join(path, "ann.npz")) as arrays:
+            index.centroids = arrays["centroids"]
+            index.fps = arrays["fps"]
+            index.ids = arrays["ids"]
+            index.offsets = arrays["offsets"]
+        return index
+
+
+def benchmark_recall(index, fps, queries, k=10, n_probes=(1, 2, 4, 8, 16)):
+    """
+    Measures recall@k of an ANNIndex against exact brute-force search
+
+    Parameters
+    ---------
+    index: ANNIndex
+        index built on fps
+    fps: np.ndarray
+        (n_players, n_dims) matrix the index was built on
+    queries: np.ndarray
+        (n_queries, n_dims) query fingerprints
+    k: int
+        number of matches per query
+    n_probes: list
+        n_probe settings to measure
+
+    Returns
+    -------
+    results: list of dict
+        n_probe, recall (fraction of the exact top-k found) and the mean
+        query time in seconds of the index and of exact search
+    """
+    higher = HIGHER_IS_BETTER[index.metric]
+    rows = np.arange(len(fps))
+    start = time.perf_counter()
+    exact = [
+        set(_select(score_many(q, fps, metric=index.metric), rows, k, higher)[0])
+        for q in queries
+    ]
+    exact_time = (time.perf_counter() - start) / len(queries)
+
+    results = []
+    for n_probe in n_probes:
+        start = time.perf_counter()
+        found = [index.query(q, k=k, n_probe=n_probe)[0] for q in queries]
+        ann_time = (time.perf_counter() - start) / len(queries)
+        hits = sum(len(truth.intersection(f)) for truth, f in zip(exact, found))
+        results.append({
+            "n_probe": n_probe,
+            "recall": hits / sum(len(truth) for truth in exact),
+            "query_time": ann_time,
+            "exact_time": exact_time,
+        })
+
+    return results
@@ -0,0 +1,331 @@
+"""
+Result cache for repeated player similarity queries
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from .index import _to_builtin
+from .search import PopcountIndex, top_k
+
+
+def content_digest(fps, ids):
+    """
+    Hash of the fingerprints and player IDs of an index, so indices with
+    the same fitted parameters but different or refreshed rows differ
+
+    Parameters
+    ---------
+    fps: np.ndarray
+        fingerprint matrix
+    ids: list
+        player ID of each row
+
+    Returns
+    -------
+    digest: str
+        hex digest
+    """
+    fps = np.ascontiguousarray(fps)
+    h = hashlib.sha256(f"{fps.dtype.str}{fps.shape}".encode())
+    h.update(fps.view(np.uint8).reshape(-1))
+    h.update(json.dumps(_to_builtin(list(ids))).encode())
+    return h.hexdigest()[:16]
+
+
+def spec_hash(index, digest=None):
+    """
+    Hash of the fitted parameters and the contents behind a
+    FingerprintIndex. Refitting feat_quants/feat_scaling, changing the
+    fingerprint type or scaling method, or changing any player or
+    fingerprint changes the hash.
+
+    Parameters
+    ---------
+    index: FingerprintIndex
+        index whose fingerprint spec to hash
+    digest: str
+        content_digest of the index if already known, computed if None
+
+    Returns
+    -------
+    spec: str
+        hex digest
+    """
+    if digest is None:
+        digest = content_digest(index.fps, index.ids)
+    spec = {
+        "content": digest,
+        "fp_type": index.fp_type,
+        "method": index.method,
+        "packed": bool(index.packed),
+        "n_bits": int(index.n_bits),
+        "n_players": len(index),
+        "feat_quants": _to_builtin(index.feat_quants),
+        "feat_scaling": _to_builtin(index.feat_scaling),
+    }
+    text = json.dumps(spec, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+class SimilarityCache:
+    """
+    Bounded least-recently-used cache of top-k results keyed by
+    (spec hash, player ID, metric, k), optionally backed by a directory
+    so results survive restarts and are shared between processes. On disk
+    each spec gets its own subdirectory, so several indices (or processes)
+    can share one path; subdirectories left unused for max_age seconds are
+    removed when the cache switches specs.
+
+    Parameters
+    ---------
+    maxsize: int
+        most results held in memory
+    path: str
+        directory for the on-disk cache, None for memory only
+    max_age: float
+        seconds an unused spec subdirectory is kept on disk, None to keep
+        them until clear
+    """
+
+    def __init__(self, maxsize=1024, path=None, max_age=7 * 24 * 3600):
+        self.maxsize = maxsize
+        self.path = None if path is None else os.fspath(path)
+        self.max_age = max_age
+        self.spec = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _file(self, key):
+        spec, player, metric, k = key
+        name = hashlib.sha256(repr((player, metric, k)).encode()).hexdigest()[:32]
+        return os.path.join(self.path, spec, name + ".npz")
+
+    def use_spec(self, spec):
+        """
+        Switches the cache to a spec. Entries of other specs stay cached
+        until the memory LRU evicts them, and their subdirectories on disk
+        until unused for max_age seconds.
+
+        Parameters
+        ---------
+        spec: str
+            spec hash from spec_hash
+        """
+        if spec == self.spec:
+            return
+        self.spec = spec
+        if self.path is None or not os.path.isdir(self.path):
+            return
+        now = time.time()
+        current = os.path.join(self.path, spec)
+        if os.path.isdir(current):
+            # mark the spec as used so other processes keep it
+            os.utime(current)
+        if self.max_age is None:
+            return
+        for name in os.listdir(self.path):
+            folder = os.path.join(self.path, name)
+            try:
+                unused = now - os.stat(folder).st_mtime
+            except OSError:
+                continue
+            if name != spec and unused > self.max_age:
+                shutil.rmtree(folder, ignore_errors=True)
+
+    def get(self, key):
+        """
+        Looks up a cached result
+
+        Parameters
+        ---------
+        key: tuple
+            (spec hash, player ID, metric, k)
+
+        Returns
+        -------
+        result: tuple or None
+            (indices, scores) if cached, else None
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        if self.path is not None:
+            try:
+                with np.load(self._file(key)) as arrays:
+                    result = _frozen(arrays["indices"], arrays["scores"])
+            except (OSError, KeyError, ValueError):
+                pass
+            else:
+                self.disk_hits += 1
+                self._remember(key, result)
+                return result
+        self.misses += 1
+        return None
+
+    def put(self, key, result):
+        """
+        Stores a result
+
+        Parameters
+        ---------
+        key: tuple
+            (spec hash, player ID, metric, k)
+        result: tuple
+            (indices, scores)
+
+        Returns
+        -------
+        result: tuple
+            read-only copies of (indices, scores) as cached
+        """
+        result = _frozen(*result)
+        self._remember(key, result)
+        if self.path is None:
+            return result
+        path = self._file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write then rename so readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".npz")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, indices=result[0], scores=result[1])
+        os.replace(tmp, path)
+        return result
+
+    def _remember(self, key, result):
+        if self.maxsize < 1:
+            return
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """
+        Drops every entry, in memory and on disk, and resets the statistics
+        """
+        self._entries.clear()
+        if self.path is not None:
+            shutil.rmtree(self.path, ignore_errors=True)
+        self.spec = None
+        self.hits = self.disk_hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """
+        Hit/miss statistics
+
+        Returns
+        -------
+        stats: dict
+            hits (memory), disk_hits, misses, evictions, size and hit_rate
+        """
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+
+def _frozen(indices, scores):
+    # cached arrays are shared between callers, so make them read-only
+    indices, scores = np.array(indices), np.array(scores)
+    indices.flags.writeable = False
+    scores.flags.writeable = False
+    return indices, scores
+
+
+class CachedSearch:
+    """
+    Top-k search over a FingerprintIndex that answers repeated queries from
+    a SimilarityCache. The spec hash is recomputed from the index's fitted
+    parameters on every query, so refitting them invalidates the cache
+    without any extra call. The fingerprints and IDs are hashed again
+    whenever index.fps or index.ids is replaced (e.g. by a refreshed
+    FingerprintStore.to_index); after editing them in place, call
+    cache.clear().
+
+    Parameters
+    ---------
+    index: FingerprintIndex
+        index to search
+    cache: SimilarityCache
+        cache to use, a new in-memory one if None
+    """
+
+    def __init__(self, index, cache=None):
+        self.index = index
+        self.cache = SimilarityCache() if cache is None else cache
+        self._popcount = None
+        self._popcount_spec = None
+        self._digest = None
+        self._digest_of = None
+
+    def _spec(self):
+        index = self.index
+        # hashing the contents is the costly part, so only redo it for new arrays
+        if self._digest_of is None or (
+            self._digest_of[0] is not index.fps or self._digest_of[1] is not index.ids
+        ):
+            self._digest = content_digest(index.fps, index.ids)
+            self._digest_of = (index.fps, index.ids)
+        return spec_hash(index, digest=self._digest)
+
+    def top_k(self, player, k=10, metric="tanimoto"):
+        """
+        Finds the k players most similar to a player in the index, leaving
+        the player out of its own matches
+
+        Parameters
+        ---------
+        player: str or int
+            player ID or name
+        k: int
+            number of matches to return
+        metric: str
+            tanimoto, jaccard, manhattan or cosine_sim
+
+        Returns
+        -------
+        indices: np.ndarray
+            rows of the k best matches, best first (read-only)
+        scores: np.ndarray
+            scores of the k best matches (read-only)
+        """
+        index = self.index
+        spec = self._spec()
+        self.cache.use_spec(spec)
+        row = index.row(player)
+        key = (spec, index.ids[row], metric, k)
+        result = self.cache.get(key)
+        if result is not None:
+            return result
+
+        fps = index.fps
+        if metric in ("tanimoto", "jaccard") or (metric == "manhattan" and index.packed):
+            # reuse the popcount ordering across misses of the same spec
+            if self._popcount_spec != spec:
+                self._popcount = PopcountIndex(index.fps, packed=index.packed)
+                self._popcount_spec = spec
+            fps = self._popcount
+        idx, scores = top_k(index.fps[row], fps, k=k + 1, metric=metric, packed=index.packed)
+        keep = idx != row
+        return self.cache.put(key, (idx[keep][:k], scores[keep][:k]))
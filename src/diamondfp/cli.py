@@ -0,0 +1,307 @@
+"""
+Command-line tool for bulk fingerprinting and similarity search
+
+Ex:
+diamondfp build data/career-batting.csv career-idx --id-col playerID \
+    --name-col Name --features features.json
+diamondfp query career-idx "Babe Ruth" "Shohei Ohtani" -k 5
+diamondfp query career-idx --all -k 10 --out matches.parquet
+diamondfp pairs career-idx --threshold 0.9 --out pairs.csv
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from . import _backends
+from .index import FingerprintIndex, build_index
+from .parallel import parallel_pairs, parallel_top_k
+from .search import HIGHER_IS_BETTER
+from .utils.features import feature_scaling, generate_quantiles
+from .utils.io import read_savant_csv
+
+
+class _CSVWriter:
+    """
+    Writes rows to a CSV file (or stdout) as soon as they arrive
+    """
+
+    def __init__(self, path, columns):
+        self._file = sys.stdout if path in (None, "-") else open(path, "w", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+        self.columns = columns
+
+    def write(self, batch):
+        self._writer.writerows(zip(*(batch[c] for c in self.columns)))
+
+    def close(self):
+        if self._file is sys.stdout:
+            self._file.flush()
+        else:
+            self._file.close()
+
+
+class _ParquetWriter:
+    """
+    Buffers rows and writes them to a Parquet file one row group at a time
+    """
+
+    def __init__(self, path, columns, row_group_size=65536):
+        self.path = path
+        self.columns = columns
+        self.row_group_size = row_group_size
+        self._buffer = {c: [] for c in columns}
+        self._writer = None
+
+    def write(self, batch):
+        for c in self.columns:
+            self._buffer[c].extend(batch[c])
+        if len(self._buffer[self.columns[0]]) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        table = _backends.pa.table(self._buffer)
+        if self._writer is None:
+            self._writer = _backends.pq.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table)
+        self._buffer = {c: [] for c in self.columns}
+
+    def close(self):
+        if self._buffer[self.columns[0]] or self._writer is None:
+            self._flush()
+        self._writer.close()
+
+
+def _open_writer(path, columns):
+    if path is not None and path.endswith(".parquet"):
+        return _ParquetWriter(path, columns)
+    return _CSVWriter(path, columns)
+
+
+def _load_spec(spec):
+    """
+    Reads a JSON feature spec from a file or an inline JSON string
+    """
+    if os.path.exists(spec):
+        with open(spec) as f:
+            return json.load(f)
+    try:
+        return json.loads(spec)
+    except json.JSONDecodeError:
+        raise ValueError(f"--features is neither a file nor valid JSON: {spec}")
+
+
+def _lookup(index, player):
+    """
+    Row of a player given on the command line as an ID or name
+    """
+    try:
+        return index.row(player)
+    except KeyError:
+        if player.lstrip("-").isdigit():
+            return index.row(int(player))
+        raise
+
+
+def _default_metric(index):
+    return "manhattan" if index.fp_type == "normalized" else "tanimoto"
+
+
+def _report(args, message):
+    if not args.quiet:
+        print(message, file=sys.stderr)
+
+
+def build(args):
+    start = time.perf_counter()
+    data = read_savant_csv(args.data)
+    spec = _load_spec(args.features)
+    feat_quants = feat_scaling = None
+    if args.fp_type in ("binary", "binned"):
+        if not isinstance(spec, dict):
+            raise ValueError(f"{args.fp_type} fingerprints need a {{feature: quantiles}} spec.")
+        feat_quants = generate_quantiles(data, spec, skipna=True)
+    else:
+        feat_scaling = feature_scaling(data, list(spec), method=args.method)
+
+    index = build_index(
+        data,
+        args.id_col,
+        args.name_col,
+        feat_quants=feat_quants,
+        feat_scaling=feat_scaling,
+        fp_type=args.fp_type,
+        method=args.method,
+        pack=not args.no_pack,
+    )
+    index.save(args.out)
+    elapsed = time.perf_counter() - start
+    _report(
+        args,
+        f"built {len(index)} {args.fp_type} fingerprints in {elapsed:.2f} s "
+        f"({len(index) / elapsed:,.0f} players/s) -> {args.out}",
+    )
+    return 0
+
+
+def query(args):
+    start = time.perf_counter()
+    index = FingerprintIndex.load(args.index)
+    if args.all:
+        rows = list(range(len(index)))
+    elif args.players:
+        rows = [_lookup(index, player) for player in args.players]
+    else:
+        raise ValueError("Give one or more players or --all.")
+    metric = args.metric or _default_metric(index)
+
+    names = index.names
+    columns = ["query_id", "rank", "match_id", "score"]
+    if names is not None:
+        columns = ["query_id", "query_name", "rank", "match_id", "match_name", "score"]
+    writer = _open_writer(args.out, columns)
+    try:
+        for row, idx, scores in parallel_top_k(
+            index,
+            k=args.k,
+            metric=metric,
+            queries=rows,
+            n_jobs=args.n_jobs,
+            block_size=args.block_size,
+        ):
+            batch = {
+                "query_id": [index.ids[row]] * len(idx),
+                "rank": list(range(1, len(idx) + 1)),
+                "match_id": [index.ids[i] for i in idx],
+                "score": scores.tolist(),
+            }
+            if names is not None:
+                batch["query_name"] = [names[row]] * len(idx)
+                batch["match_name"] = [names[i] for i in idx]
+            writer.write(batch)
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    _report(
+        args,
+        f"{len(rows)} queries against {len(index)} players ({metric}) in {elapsed:.2f} s "
+        f"({len(rows) / elapsed:,.0f} queries/s)",
+    )
+    return 0
+
+
+def pairs(args):
+    start = time.perf_counter()
+    index = FingerprintIndex.load(args.index)
+    metric = args.metric or _default_metric(index)
+
+    # object arrays turn a block of rows into labels without a Python loop
+    ids = np.asarray(index.ids, dtype=object)
+    names = None if index.names is None else np.asarray(index.names, dtype=object)
+    columns = ["id_a", "id_b", "score"]
+    if names is not None:
+        columns = ["id_a", "name_a", "id_b", "name_b", "score"]
+    writer = _open_writer(args.out, columns)
+    n_pairs = 0
+    try:
+        for rows_a, rows_b, scores in parallel_pairs(
+            index,
+            args.threshold,
+            metric=metric,
+            n_jobs=args.n_jobs,
+            block_size=args.block_size,
+        ):
+            batch = {
+                "id_a": ids[rows_a].tolist(),
+                "id_b": ids[rows_b].tolist(),
+                "score": scores.tolist(),
+            }
+            if names is not None:
+                batch["name_a"] = names[rows_a].tolist()
+                batch["name_b"] = names[rows_b].tolist()
+            writer.write(batch)
+            n_pairs += len(scores)
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    n_compared = len(index) * (len(index) - 1) // 2
+    _report(
+        args,
+        f"{n_pairs} pairs with {metric} {'>=' if HIGHER_IS_BETTER[metric] else '<='} "
+        f"{args.threshold} among {len(index)} players in {elapsed:.2f} s "
+        f"({n_compared / elapsed:,.0f} comparisons/s)",
+    )
+    return 0
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog="diamondfp", description="Bulk fingerprinting and similarity search"
+    )
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not report throughput")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("build", help="fingerprint a CSV into an index directory")
+    p.add_argument("data", help="CSV of player stats")
+    p.add_argument("out", help="index directory to write")
+    p.add_argument("--id-col", required=True, help="column holding the player IDs")
+    p.add_argument("--name-col", help="column holding the player names")
+    p.add_argument(
+        "--features",
+        required=True,
+        help="JSON file or string: {feature: quantiles} for binary/binned, "
+        "a list of features for normalized",
+    )
+    p.add_argument("--fp-type", default="binary", choices=["binary", "binned", "normalized"])
+    p.add_argument("--method", default="zscore", choices=["minmax", "zscore"])
+    p.add_argument("--no-pack", action="store_true", help="store unpacked 0/1 fingerprints")
+    p.set_defaults(func=build)
+
+    def add_search_args(p):
+        p.add_argument("index", help="index directory written by build")
+        p.add_argument("--metric", choices=list(HIGHER_IS_BETTER))
+        p.add_argument("--out", help="output .csv or .parquet file, CSV to stdout by default")
+        p.add_argument("--n-jobs", type=int, help="worker processes, defaults to all cores")
+        p.add_argument("--block-size", type=int, default=256, help="players per worker task")
+
+    p = sub.add_parser("query", help="top-k matches of players")
+    add_search_args(p)
+    p.add_argument("players", nargs="*", help="player IDs or names")
+    p.add_argument("--all", action="store_true", help="query every player in the index")
+    p.add_argument("-k", type=int, default=10, help="matches per player")
+    p.set_defaults(func=query)
+
+    p = sub.add_parser("pairs", help="all pairs of players past a score threshold")
+    add_search_args(p)
+    p.add_argument(
+        "--threshold",
+        type=float,
+        required=True,
+        help="minimum score (maximum distance for manhattan)",
+    )
+    p.set_defaults(func=pairs)
+    return parser
+
+
+def main(argv=None):
+    parser = _parser()
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except BrokenPipeError:
+        # the reader (e.g. head) stopped early; point stdout at devnull so
+        # the flush at interpreter exit does not fail again
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return 0
+    except (ValueError, KeyError, ImportError, OSError) as err:
+        message = err.args[0] if isinstance(err, KeyError) else err
+        parser.exit(2, f"diamondfp: error: {message}\n")
@@ -4,9 +4,11 @@ Fingerprint functions
 
 import numpy as np
 
+from .profiling import instrument
+from .utils.adapters import _backend, to_feature_matrix
 
 
-def binaryfp(row, feat_quants):
+def binaryfp(row, feat_quants, dtype=None):
     """
     Function for creating a binary fingerprint based on feature quantiles
     when those feature quantiles are met.
@@ -24,10 +26,13 @@ def binaryfp(row, feat_quants):
         row of player information (e.g. AVG, OPS, etc.)
     feat_quants: dict
         dictionary of features and their quantiles
+    dtype: np.dtype
+        return a NumPy array of this dtype (e.g. np.uint8 or bool) instead
+        of a list
 
     Returns
     -------
-    binary_fp: list
+    binary_fp: list or np.ndarray
         binary fingerprint list
     """
 
@@ -40,10 +45,10 @@ def binaryfp(row, feat_quants):
                 val_bin[i] = 1
         binary_fp.extend(val_bin)
 
-    return binary_fp
+    return _typed(binary_fp, dtype)
 
 
-def binnedfp(row, feat_quants):
+def binnedfp(row, feat_quants, dtype=None):
     """
     Function for creating quantile bin fingerprints based on feature quantiles
     when only the highest matching quantile is stored. This creates a sparser
@@ -62,10 +67,13 @@ def binnedfp(row, feat_quants):
         row of player information (e.g. AVG, OPS, etc.)
     feat_quants: dict
         dictionary of features and their quantiles
+    dtype: np.dtype
+        return a NumPy array of this dtype (e.g. np.uint8 or bool) instead
+        of a list
 
     Returns
     -------
-    binned_fp: list
+    binned_fp: list or np.ndarray
         binned fingerprint list
     """
 
@@ -78,10 +86,10 @@ def binnedfp(row, feat_quants):
                 break
         binned_fp.extend(val_bin)
 
-    return binned_fp
+    return _typed(binned_fp, dtype)
 
 
-def normalizedfp(row, feat_scaling, method="zscore"):
+def normalizedfp(row, feat_scaling, method="zscore", dtype=None):
     """
     Function for creating a normalized fingerprint based provided scaling
     of features.
@@ -94,10 +102,13 @@ def normalizedfp(row, feat_scaling, method="zscore"):
         dictionary of features and their scaling parameters
     method: str
         method of scaling to use (minmax or zscore)
+    dtype: np.dtype
+        return a NumPy array of this dtype (e.g. np.float32) instead of a
+        list
 
     Returns
     -------
-    norm_fp: list
+    norm_fp: list or np.ndarray
         normalized fingerprint list
     """
 
@@ -120,10 +131,10 @@ def normalizedfp(row, feat_scaling, method="zscore"):
 
         norm_fp.append(norm_v)
 
-    return norm_fp
+    return _typed(norm_fp, dtype)
 
 
-def percentilefp(row, feat_distros):
+def percentilefp(row, feat_distros, dtype=None):
     """
     Function for creating a fingerprint based on the percentile rank of each
     feature within a provided distribution.
@@ -132,14 +143,22 @@ def percentilefp(row, feat_distros):
     ---------
     row: row dict
         row of player information
-    feat_distros: dict of lists/arrays
+    feat_distros: dict of lists/arrays or PercentileReference
         dictionary of features and their reference distributions (e.g. all players' stats)
+    dtype: np.dtype
+        return a NumPy array of this dtype (e.g. np.float32) instead of a
+        list
 
     Returns
     -------
-    perc_fp: list
+    perc_fp: list or np.ndarray
         list of percentile ranks (0.0 to 1.0)
     """
+    if isinstance(feat_distros, PercentileReference):
+        vals = [[row[fkey] for fkey in feat_distros.features]]
+        ranks = feat_distros.ranks(vals)[0]
+        return ranks.tolist() if dtype is None else ranks.astype(dtype, copy=False)
+
     perc_fp = []
     for fkey, distro in feat_distros.items():
         val = row[fkey]
@@ -152,10 +171,10 @@ def percentilefp(row, feat_distros):
         rank = (distro < val).mean()
         perc_fp.append(rank)
     
-    return perc_fp
+    return _typed(perc_fp, dtype)
 
 
-def archetypefp(row, archetypes):
+def archetypefp(row, archetypes, dtype=None):
     """
     Function for creating a fingerprint based on distances to defined archetypes.
 
@@ -168,21 +187,22 @@ def archetypefp(row, archetypes):
         values/rows represent the centroid of an archetype.
         If DataFrame, index should be archetype names.
         If dict, keys should be archetype names and values dict of {feature: value}.
+    dtype: np.dtype
+        return a NumPy array of this dtype (e.g. np.float32) instead of a
+        list
 
     Returns
     -------
-    arch_fp: list
+    arch_fp: list or np.ndarray
         Vector of distances to each archetype.
     """
-    import pandas as pd
-    
     arch_fp = []
     
     # helper to extract feature vector from row matching archetype features
     def get_vec(target_dict, features):
         return [target_dict[f] for f in features]
 
-    if isinstance(archetypes, pd.DataFrame):
+    if _backend(archetypes) == "pandas":
         # iterate through rows
         features = archetypes.columns.tolist()
         player_vec = get_vec(row, features)
@@ -204,5 +224,424 @@ def archetypefp(row, archetypes):
             dist = np.linalg.norm(np.array(player_vec) - np.array(arch_vec))
             arch_fp.append(dist)
             
-    return arch_fp
+    return _typed(arch_fp, dtype)
+
+
+def _typed(fp, dtype):
+    """
+    Fingerprint list as an array of dtype, or unchanged when dtype is None
+    """
+    return fp if dtype is None else np.array(fp, dtype=dtype)
+
+
+@instrument("fingerprints.binaryfp_batch", rows_arg=0)
+def binaryfp_batch(data, feat_quants, dtype=np.uint8):
+    """
+    Batch version of binaryfp. Creates the binary fingerprint of every
+    player at once using broadcast comparisons against the feature quantiles.
+
+    Parameters
+    ---------
+    data: pd.DataFrame, pl.DataFrame, pa.Table, dict or np.ndarray
+        player information (e.g. AVG, OPS, etc.); a 2-D array must hold the
+        features as columns in the same order as feat_quants
+    feat_quants: dict
+        dictionary of features and their quantiles
+    dtype: np.dtype
+        dtype of the fingerprints, np.uint8 or bool
+
+    Returns
+    -------
+    binary_fps: np.ndarray
+        (n_players, n_bits) matrix of binary fingerprints
+    """
+
+    X = to_feature_matrix(data, feat_quants.keys())
+    thresholds, starts = _thresholds(feat_quants)
+    met = _met(X, np.arange(len(feat_quants)), thresholds, starts)
+
+    return met.astype(dtype, copy=False)
+
+
+@instrument("fingerprints.binnedfp_batch", rows_arg=0)
+def binnedfp_batch(data, feat_quants, dtype=np.uint8):
+    """
+    Batch version of binnedfp. Creates the binned fingerprint of every
+    player at once, keeping only the highest matching quantile per feature.
+
+    Parameters
+    ---------
+    data: pd.DataFrame, pl.DataFrame, pa.Table, dict or np.ndarray
+        player information (e.g. AVG, OPS, etc.); a 2-D array must hold the
+        features as columns in the same order as feat_quants
+    feat_quants: dict
+        dictionary of features and their quantiles
+    dtype: np.dtype
+        dtype of the fingerprints, np.uint8 or bool
+
+    Returns
+    -------
+    binned_fps: np.ndarray
+        (n_players, n_bits) matrix of binned fingerprints
+    """
+
+    X = to_feature_matrix(data, feat_quants.keys())
+    thresholds, starts = _thresholds(feat_quants)
+    met = _met(X, np.arange(len(feat_quants)), thresholds, starts)
+
+    return _highest_bits(met, starts, dtype=dtype)
+
+
+@instrument("fingerprints.normalizedfp_batch", rows_arg=0)
+def normalizedfp_batch(data, feat_scaling, method="zscore", dtype=float):
+    """
+    Batch version of normalizedfp. Creates the normalized fingerprint of
+    every player at once.
+
+    Parameters
+    ---------
+    data: pd.DataFrame, pl.DataFrame, pa.Table, dict or np.ndarray
+        player information (e.g. AVG, OPS, etc.); a 2-D array must hold the
+        features as columns in the same order as feat_scaling
+    feat_scaling: dict
+        dictionary of features and their scaling parameters
+    method: str
+        method of scaling to use (minmax or zscore)
+    dtype: np.dtype
+        dtype of the fingerprints (e.g. np.float32 to halve their size)
+
+    Returns
+    -------
+    norm_fps: np.ndarray
+        (n_players, n_features) matrix of normalized fingerprints
+    """
+
+    shift, scale, flat = _scaling(feat_scaling, method)
+    X = to_feature_matrix(data, feat_scaling.keys())
+
+    return _normalize(X, shift, scale, flat).astype(dtype, copy=False)
+
+
+def _thresholds(feat_quants):
+    """
+    Quantiles of every feature as one vector, with the first bit of each
+    feature's group (and the total number of bits last)
+    """
+    sizes = [len(quants) for quants in feat_quants.values()]
+    thresholds = np.concatenate(
+        [np.asarray(quants, dtype=float) for quants in feat_quants.values()] + [np.empty(0)]
+    )
+    return thresholds, np.cumsum([0] + sizes)
+
+
+def _met(X, cols, thresholds, starts):
+    """
+    Which quantiles every player meets, comparing one feature column at a
+    time so the feature values are never repeated once per bit
+    """
+    met = np.empty((len(X), len(thresholds)), dtype=bool)
+    for col, start, stop in zip(cols, starts[:-1], starts[1:]):
+        np.greater_equal(X[:, col, None], thresholds[start:stop], out=met[:, start:stop])
+    return met
+
+
+def _highest_bits(met, starts, dtype=np.uint8):
+    """
+    Keeps only the highest quantile met within each feature's group of bits
+    """
+    binned = np.zeros(met.shape, dtype=dtype)
+    rows = np.arange(len(met))
+    for start, stop in zip(starts[:-1], starts[1:]):
+        if stop == start:
+            continue
+        group = met[:, start:stop]
+        # index of the last quantile met, found by searching backwards
+        last = stop - 1 - np.argmax(group[:, ::-1], axis=1)
+        hit = group.any(axis=1)
+        binned[rows[hit], last[hit]] = 1
+    return binned
+
+
+def _scaling(feat_scaling, method):
+    """
+    Shift and scale of every feature, and which features have no spread
+    """
+    if method not in ("minmax", "zscore"):
+        raise ValueError("Invalid scaling method. Use 'minmax' or 'zscore'.")
+    params = np.asarray(list(feat_scaling.values()), dtype=float).reshape(-1, 2)
+    if method == "minmax":
+        shift = params[:, 0]
+        scale = params[:, 1] - params[:, 0]
+    else:
+        shift, scale = params[:, 0], params[:, 1]
+    flat = scale == 0
+    return shift, np.where(flat, 1.0, scale), flat
+
+
+def _normalize(X, shift, scale, flat):
+    """
+    Scaled feature values, with features that have no spread mapped to 0.0
+    as in normalizedfp
+    """
+    norm = (X - shift) / scale
+    norm[:, flat] = 0.0
+    return norm
+
+
+class PercentileReference:
+    """
+    Reference distributions sorted once so percentile ranks can be found by
+    binary search instead of scanning every reference value. NaNs in a
+    distribution never count as less than a value but still count towards
+    its size, matching percentilefp.
+
+    Parameters
+    ---------
+    feat_distros: dict of lists/arrays
+        dictionary of features and their reference distributions (e.g. all players' stats)
+    """
+
+    def __init__(self, feat_distros):
+        self.features = list(feat_distros.keys())
+        self.sorted_distros = []
+        self.sizes = np.empty(len(self.features))
+        for j, distro in enumerate(feat_distros.values()):
+            distro = np.asarray(distro, dtype=float).ravel()
+            self.sorted_distros.append(np.sort(distro[~np.isnan(distro)]))
+            self.sizes[j] = len(distro)
+
+    def keys(self):
+        return self.features
+
+    def ranks(self, X):
+        """
+        Percentile ranks of a matrix of values
+
+        Parameters
+        ---------
+        X: np.ndarray
+            (n_players, n_features) values in the order of features
+
+        Returns
+        -------
+        ranks: np.ndarray
+            (n_players, n_features) fraction of each distribution strictly
+            less than the values
+        """
+        X = np.asarray(X, dtype=float)
+        ranks = np.empty(X.shape)
+        for j, distro in enumerate(self.sorted_distros):
+            # side="left" counts the reference values strictly less than x
+            ranks[:, j] = np.searchsorted(distro, X[:, j], side="left")
+        ranks[np.isnan(X)] = 0.0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return ranks / self.sizes
+
+
+@instrument("fingerprints.percentilefp_batch", rows_arg=0)
+def percentilefp_batch(data, feat_distros, dtype=float):
+    """
+    Batch version of percentilefp. Creates the percentile fingerprint of
+    every player at once with a binary search of each sorted reference
+    distribution, O((n_players + n_reference) log n_reference) per feature.
+
+    Parameters
+    ---------
+    data: pd.DataFrame, pl.DataFrame, pa.Table, dict or np.ndarray
+        player information; a 2-D array must hold the features as columns
+        in the same order as feat_distros
+    feat_distros: dict of lists/arrays or PercentileReference
+        dictionary of features and their reference distributions (e.g. all
+        players' stats), or a PercentileReference to reuse across calls
+    dtype: np.dtype
+        dtype of the fingerprints (e.g. np.float32 to halve their size)
+
+    Returns
+    -------
+    perc_fps: np.ndarray
+        (n_players, n_features) matrix of percentile ranks (0.0 to 1.0)
+    """
+
+    if not isinstance(feat_distros, PercentileReference):
+        feat_distros = PercentileReference(feat_distros)
+    X = to_feature_matrix(data, feat_distros.features)
+
+    return feat_distros.ranks(X).astype(dtype, copy=False)
+
+
+class ArchetypeMatrix:
+    """
+    Archetype centroids converted once into a matrix so distances from many
+    players to every archetype can be computed with matrix products. The
+    inverse covariance used for mahalanobis distances is fixed here too, so
+    a player's fingerprint does not depend on who else is in the batch.
+
+    Parameters
+    ---------
+    archetypes: dict or pd.DataFrame
+        Dictionary or DataFrame of archetype centroids in the forms accepted
+        by archetypefp
+    data: pd.DataFrame, pl.DataFrame, pa.Table, dict or np.ndarray
+        data the archetypes were fit on, used to estimate the inverse
+        covariance for mahalanobis distances when VI is not given
+    VI: np.ndarray
+        inverse covariance matrix for mahalanobis distances
+    """
+
+    def __init__(self, archetypes, data=None, VI=None):
+        if isinstance(archetypes, dict):
+            first_arch = next(iter(archetypes.values()))
+            self.features = list(first_arch.keys())
+            self.names = list(archetypes.keys())
+            self.centroids = np.array(
+                [[arch[f] for f in self.features] for arch in archetypes.values()],
+                dtype=float,
+            ).reshape(len(self.names), len(self.features))
+        else:
+            self.features = list(archetypes.columns)
+            self.names = list(archetypes.index)
+            self.centroids = np.asarray(archetypes, dtype=float)
+        # centering on the centroid mean keeps the norm expansion accurate
+        self.center = self.centroids.mean(axis=0)
+        self._centered = self.centroids - self.center
+        self._sq_norms = (self._centered**2).sum(axis=1)
+        if VI is None and data is not None:
+            X = to_feature_matrix(data, self.features)
+            complete = X[~np.isnan(X).any(axis=1)]
+            VI = np.linalg.pinv(np.atleast_2d(np.cov(complete, rowvar=False)))
+        self.VI = None if VI is None else np.asarray(VI, dtype=float)
+
+    def distances(self, X, metric="euclidean", VI=None):
+        """
+        Distances from every player to every archetype
+
+        Parameters
+        ---------
+        X: np.ndarray
+            (n_players, n_features) values in the order of features
+        metric: str
+            euclidean, sqeuclidean, manhattan or mahalanobis
+        VI: np.ndarray
+            inverse covariance matrix for mahalanobis, the one this matrix
+            was built with when not given
+
+        Returns
+        -------
+        dists: np.ndarray
+            (n_players, n_archetypes) distances
+        """
+        X = np.asarray(X, dtype=float) - self.center
+        C = self._centered
+        if metric in ("euclidean", "sqeuclidean"):
+            # ||x - c||^2 = ||x||^2 + ||c||^2 - 2 x.c
+            sq = (X**2).sum(axis=1)[:, None] + self._sq_norms[None, :] - 2 * X @ C.T
+        elif metric == "mahalanobis":
+            if VI is None:
+                VI = self.VI
+            if VI is None:
+                raise ValueError(
+                    "mahalanobis distances need VI or the data the archetypes were fit on."
+                )
+            XV = X @ VI
+            sq = (
+                (XV * X).sum(axis=1)[:, None]
+                + ((C @ VI) * C).sum(axis=1)[None, :]
+                - 2 * XV @ C.T
+            )
+        elif metric == "manhattan":
+            dists = np.zeros((len(X), len(C)))
+            for j in range(X.shape[1]):
+                dists += np.abs(X[:, j, None] - C[None, :, j])
+            return dists
+        else:
+            raise ValueError(
+                "Invalid metric. Use 'euclidean', 'sqeuclidean', 'manhattan' or 'mahalanobis'."
+            )
+
+        sq = np.maximum(sq, 0.0)
+        return sq if metric == "sqeuclidean" else np.sqrt(sq)
+
+
+@instrument("fingerprints.archetypefp_batch", rows_arg=0)
+def archetypefp_batch(data, archetypes, metric="euclidean", VI=None, dtype=float):
+    """
+    Batch version of archetypefp. Creates the archetype distance fingerprint
+    of every player at once with a single matrix product. Euclidean
+    distances agree with archetypefp up to floating point rounding.
+
+    Parameters
+    ---------
+    data: pd.DataFrame, pl.DataFrame, pa.Table, dict or np.ndarray
+        player information; a 2-D array must hold the archetype features as
+        columns in the archetype feature order
+    archetypes: dict, pd.DataFrame or ArchetypeMatrix
+        archetype centroids in the forms accepted by archetypefp, or an
+        ArchetypeMatrix to reuse across calls
+    metric: str
+        euclidean, sqeuclidean (squared euclidean), manhattan or mahalanobis
+    VI: np.ndarray
+        inverse covariance matrix for mahalanobis; when not given, the one
+        of an ArchetypeMatrix built with its fit data (see ArchetypeMatrix)
+    dtype: np.dtype
+        dtype of the fingerprints (e.g. np.float32 to halve their size)
+
+    Returns
+    -------
+    arch_fps: np.ndarray
+        (n_players, n_archetypes) matrix of distances to each archetype
+    """
+
+    if not isinstance(archetypes, ArchetypeMatrix):
+        archetypes = ArchetypeMatrix(archetypes)
+    X = to_feature_matrix(data, archetypes.features)
+
+    return archetypes.distances(X, metric=metric, VI=VI).astype(dtype, copy=False)
+
+
+@instrument("fingerprints.pack_fp", rows_arg=0)
+def pack_fp(fp):
+    """
+    Packs binary or binned fingerprints into 64-bit words so each fingerprint
+    bit takes a single bit of memory. Unused bits of the last word are zero.
+
+    Parameters
+    ---------
+    fp: list or np.ndarray
+        a single fingerprint (n_bits,) or a matrix of fingerprints
+        (n_players, n_bits) of 0/1 values
+
+    Returns
+    -------
+    packed_fp: np.ndarray
+        little-endian uint64 array of shape (..., ceil(n_bits / 64))
+    """
+
+    bits = np.asarray(fp) != 0
+    n_bytes = -(-bits.shape[-1] // 64) * 8
+    packed = np.packbits(bits, axis=-1, bitorder="little")
+    pad = [(0, 0)] * (packed.ndim - 1) + [(0, n_bytes - packed.shape[-1])]
+    packed = np.pad(packed, pad)
+
+    return np.ascontiguousarray(packed).view(np.dtype("<u8"))
+
+
+@instrument("fingerprints.unpack_fp", rows_arg=0)
+def unpack_fp(packed_fp, n_bits):
+    """
+    Unpacks fingerprints produced by pack_fp back into 0/1 values
+
+    Parameters
+    ---------
+    packed_fp: np.ndarray
+        packed fingerprint(s) from pack_fp
+    n_bits: int
+        length of the original fingerprint
+
+    Returns
+    -------
+    fp: np.ndarray
+        uint8 array of shape (..., n_bits)
+    """
 
+    packed = np.ascontiguousarray(packed_fp, dtype=np.dtype("<u8")).view(np.uint8)
+    return np.unpackbits(packed, axis=-1, count=n_bits, bitorder="little")
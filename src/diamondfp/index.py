@@ -0,0 +1,262 @@
+"""
+On-disk fingerprint index
+"""
+
+import json
+import os
+
+import numpy as np
+
+from .fingerprints import binaryfp_batch, binnedfp_batch, normalizedfp_batch, pack_fp
+from .utils.adapters import column_values
+
+
+FORMAT_VERSION = 1
+
+# files of a saved index directory, also read by parallel workers
+META_FILE = "meta.json"
+FPS_FILE = "fps.npy"
+
+
+def _to_builtin(value):
+    """
+    Converts numpy scalars and containers into JSON serializable values
+    """
+    if isinstance(value, dict):
+        return {k: _to_builtin(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_to_builtin(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class FingerprintIndex:
+    """
+    Fingerprint matrix bundled with the player IDs/names and the fitted
+    parameters used to build it. Saved as a directory holding the matrix
+    as a .npy file and the metadata as JSON, so loading memory-maps the
+    matrix instead of reading it and processes share one page-cache copy.
+
+    Parameters
+    ---------
+    fps: np.ndarray
+        (n_players, n_bits) fingerprint matrix, or packed fingerprints
+    ids: list
+        player ID of each row
+    names: list
+        player name of each row
+    feat_quants: dict
+        dictionary of features and their quantiles used for the fingerprints
+    feat_scaling: dict
+        dictionary of features and their scaling parameters used for the
+        fingerprints
+    fp_type: str
+        fingerprint type (binary, binned or normalized)
+    packed: bool
+        whether fps is packed with fingerprints.pack_fp
+    n_bits: int
+        length of the unpacked fingerprints, defaults to fps.shape[1] when
+        not packed
+    method: str
+        scaling method for normalized fingerprints
+
+    Attributes
+    ---------
+    path: str
+        directory the index was loaded from, None if built in memory
+    """
+
+    def __init__(
+        self,
+        fps,
+        ids,
+        names=None,
+        feat_quants=None,
+        feat_scaling=None,
+        fp_type="binary",
+        packed=False,
+        n_bits=None,
+        method=None,
+    ):
+        if len(ids) != len(fps):
+            raise ValueError(f"Got {len(ids)} ids for {len(fps)} fingerprints.")
+        if names is not None and len(names) != len(fps):
+            raise ValueError(f"Got {len(names)} names for {len(fps)} fingerprints.")
+        self.fps = fps
+        self.ids = list(ids)
+        self.names = None if names is None else list(names)
+        self.feat_quants = feat_quants
+        self.feat_scaling = feat_scaling
+        self.fp_type = fp_type
+        self.packed = packed
+        self.n_bits = n_bits if n_bits is not None else np.shape(fps)[1]
+        self.method = method
+        self.path = None
+        self._rows = None
+
+    def __len__(self):
+        return len(self.fps)
+
+    def row(self, player):
+        """
+        Looks up the row of a player by ID, falling back to name
+
+        Parameters
+        ---------
+        player: str or int
+            player ID or name
+
+        Returns
+        -------
+        row: int
+            row of the player in fps
+        """
+        if self._rows is None:
+            self._rows = {}
+            for i, name in enumerate(self.names or []):
+                self._rows.setdefault(name, i)
+            for i, pid in enumerate(self.ids):
+                self._rows[pid] = i
+        if player not in self._rows:
+            raise KeyError(f"Player '{player}' not found in index.")
+        return self._rows[player]
+
+    def save(self, path):
+        """
+        Writes the index to a directory
+
+        Parameters
+        ---------
+        path: str
+            directory to write, created if needed
+        """
+        os.makedirs(path, exist_ok=True)
+        fps = np.ascontiguousarray(self.fps)
+        np.save(os.path.join(path, FPS_FILE), fps)
+        meta = {
+            "format_version": FORMAT_VERSION,
+            "fp_type": self.fp_type,
+            "packed": self.packed,
+            "n_bits": int(self.n_bits),
+            "method": self.method,
+            "ids": _to_builtin(self.ids),
+            "names": _to_builtin(self.names),
+            "feat_quants": _to_builtin(self.feat_quants),
+            "feat_scaling": _to_builtin(self.feat_scaling),
+        }
+        with open(os.path.join(path, META_FILE), "w") as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Opens an index written by save
+
+        Parameters
+        ---------
+        path: str
+            index directory
+        mmap: bool
+            memory-map the fingerprint matrix read-only instead of reading it
+
+        Returns
+        -------
+        index: FingerprintIndex
+            loaded index
+        """
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        version = meta.get("format_version")
+        if version != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported index format version {version}, expected {FORMAT_VERSION}."
+            )
+        fps = np.load(os.path.join(path, FPS_FILE), mmap_mode="r" if mmap else None)
+        feat_scaling = meta["feat_scaling"]
+        if feat_scaling is not None:
+            feat_scaling = {k: tuple(v) for k, v in feat_scaling.items()}
+        index = cls(
+            fps,
+            meta["ids"],
+            names=meta["names"],
+            feat_quants=meta["feat_quants"],
+            feat_scaling=feat_scaling,
+            fp_type=meta["fp_type"],
+            packed=meta["packed"],
+            n_bits=meta["n_bits"],
+            method=meta["method"],
+        )
+        index.path = path
+        return index
+
+
+def build_index(
+    data,
+    id_col,
+    name_col=None,
+    feat_quants=None,
+    feat_scaling=None,
+    fp_type="binary",
+    method="zscore",
+    pack=True,
+):
+    """
+    Fingerprints every player in a dataset and wraps the result in a
+    FingerprintIndex
+
+    Parameters
+    ---------
+    data: pd.DataFrame, pl.DataFrame or pa.Table
+        player data
+    id_col: str
+        column holding the player IDs
+    name_col: str
+        column holding the player names
+    feat_quants: dict
+        dictionary of features and their quantiles (binary and binned)
+    feat_scaling: dict
+        dictionary of features and their scaling parameters (normalized)
+    fp_type: str
+        fingerprint type (binary, binned or normalized)
+    method: str
+        scaling method for normalized fingerprints (minmax or zscore)
+    pack: bool
+        pack binary and binned fingerprints with fingerprints.pack_fp
+
+    Returns
+    -------
+    index: FingerprintIndex
+        index of the dataset fingerprints
+    """
+    if fp_type in ("binary", "binned"):
+        if feat_quants is None:
+            raise ValueError(f"{fp_type} fingerprints need feat_quants.")
+        fp_func = binaryfp_batch if fp_type == "binary" else binnedfp_batch
+        fps = fp_func(data, feat_quants)
+        n_bits = fps.shape[1]
+        if pack:
+            fps = pack_fp(fps)
+        return FingerprintIndex(
+            fps,
+            column_values(data, id_col),
+            names=None if name_col is None else column_values(data, name_col),
+            feat_quants=feat_quants,
+            fp_type=fp_type,
+            packed=pack,
+            n_bits=n_bits,
+        )
+    elif fp_type == "normalized":
+        if feat_scaling is None:
+            raise ValueError("normalized fingerprints need feat_scaling.")
+        fps = normalizedfp_batch(data, feat_scaling, method=method)
+        return FingerprintIndex(
+            fps,
+            column_values(data, id_col),
+            names=None if name_col is None else column_values(data, name_col),
+            feat_scaling=feat_scaling,
+            fp_type=fp_type,
+            method=method,
+        )
+    else:
+        raise ValueError("Invalid fingerprint type. Use 'binary', 'binned' or 'normalized'.")
@@ -0,0 +1,229 @@
+"""
+MinHash signatures and LSH banding for sub-linear Jaccard pair search
+"""
+
+import numpy as np
+
+from .scoring import iter_score_blocks
+
+
+def minhash_signatures(fps, n_perm=100, seed=0):
+    """
+    MinHash signatures of binary fingerprints. Each signature entry is the
+    position of the first bit turned on under a random permutation of the
+    bits, so two fingerprints agree on an entry with probability equal to
+    their Jaccard score.
+
+    Parameters
+    ---------
+    fps: np.ndarray
+        (n_players, n_bits) matrix of 0/1 fingerprints (unpack packed
+        fingerprints with fingerprints.unpack_fp first)
+    n_perm: int
+        number of permutations (signature length)
+    seed: int
+        seed for the permutations
+
+    Returns
+    -------
+    signatures: np.ndarray
+        (n_players, n_perm) int32 signatures; empty fingerprints get n_bits
+        in every entry
+    """
+    bits = np.asarray(fps) != 0
+    n_bits = bits.shape[1]
+    rng = np.random.default_rng(seed)
+    signatures = np.empty((len(bits), n_perm), dtype=np.int32)
+    for p in range(n_perm):
+        rank = rng.permutation(n_bits).astype(np.int32)
+        signatures[:, p] = np.where(bits, rank, n_bits).min(axis=1, initial=n_bits)
+    return signatures
+
+
+class MinHashLSH:
+    """
+    LSH banding index over MinHash signatures. Signatures are cut into
+    bands of rows entries and fingerprints sharing any band become candidate
+    pairs, which are then verified with exact Jaccard scores (same semantics
+    as scoring.jaccard). Pairs with Jaccard s are found with probability
+    1 - (1 - s**rows)**bands, an S-curve centered near
+    (1 / bands)**(1 / rows).
+
+    Identical fingerprints are collapsed before indexing, so duplicates cost
+    nothing extra to search and are expanded back when pairs are produced.
+
+    Parameters
+    ---------
+    bands: int
+        number of bands
+    rows: int
+        signature entries per band
+    seed: int
+        seed for the MinHash permutations
+    """
+
+    def __init__(self, bands=20, rows=5, seed=0):
+        self.bands = bands
+        self.rows = rows
+        self.seed = seed
+        self.unique_fps = None
+        self.groups = None
+        self.signatures = None
+
+    def index(self, fps):
+        """
+        Builds the MinHash signatures of the distinct fingerprints
+
+        Parameters
+        ---------
+        fps: np.ndarray
+            (n_players, n_bits) matrix of 0/1 fingerprints
+
+        Returns
+        -------
+        self: MinHashLSH
+            built index
+        """
+        bits = (np.asarray(fps) != 0).astype(np.uint8)
+        unique_fps, inverse = np.unique(bits, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        order = np.argsort(inverse, kind="stable")
+        bounds = np.searchsorted(inverse[order], np.arange(len(unique_fps) + 1))
+        self.unique_fps = unique_fps
+        self.groups = [order[bounds[u] : bounds[u + 1]] for u in range(len(unique_fps))]
+        self.signatures = minhash_signatures(unique_fps, self.bands * self.rows, self.seed)
+        return self
+
+    def candidate_pairs(self):
+        """
+        Pairs of distinct fingerprints that share at least one band
+
+        Returns
+        -------
+        pairs: np.ndarray
+            (n_pairs, 2) indices into unique_fps with first < second
+        """
+        n = len(self.unique_fps)
+        nonempty = np.flatnonzero(self.unique_fps.any(axis=1))
+        keys = []
+        for b in range(self.bands):
+            band = self.signatures[nonempty, b * self.rows : (b + 1) * self.rows]
+            _, bucket = np.unique(band, axis=0, return_inverse=True)
+            bucket = bucket.ravel()
+            order = np.argsort(bucket, kind="stable")
+            starts = np.flatnonzero(np.diff(np.r_[-1, bucket[order]]))
+            sizes = np.diff(np.r_[starts, len(order)])
+            for start, size in zip(starts[sizes > 1], sizes[sizes > 1]):
+                members = nonempty[order[start : start + size]]
+                i, j = np.triu_indices(size, 1)
+                a, c = np.minimum(members[i], members[j]), np.maximum(members[i], members[j])
+                keys.append(a.astype(np.int64) * n + c)
+        if not keys:
+            return np.empty((0, 2), dtype=np.int64)
+        keys = np.unique(np.concatenate(keys))
+        return np.stack([keys // n, keys % n], axis=1)
+
+    def similar_unique_pairs(self, threshold=0.8):
+        """
+        Verified pairs of distinct fingerprints with Jaccard >= threshold
+
+        Parameters
+        ---------
+        threshold: float
+            minimum Jaccard score
+
+        Returns
+        -------
+        pairs: np.ndarray
+            (n_pairs, 2) indices into unique_fps
+        scores: np.ndarray
+            exact Jaccard score of each pair
+        """
+        pairs = self.candidate_pairs()
+        a, b = self.unique_fps[pairs[:, 0]], self.unique_fps[pairs[:, 1]]
+        c = (a & b).sum(axis=1)
+        u = (a | b).sum(axis=1)
+        scores = np.divide(c, u, out=np.zeros(len(c)), where=u != 0)
+        keep = scores >= threshold
+        return pairs[keep], scores[keep]
+
+    def iter_pairs(self, threshold=0.8):
+        """
+        Streams all player pairs with Jaccard >= threshold, including pairs
+        of players with identical fingerprints
+
+        Parameters
+        ---------
+        threshold: float
+            minimum Jaccard score
+
+        Yields
+        -------
+        rows_a: np.ndarray
+            row of the first player of each pair
+        rows_b: np.ndarray
+            row of the second player of each pair (rows_a < rows_b)
+        scores: np.ndarray
+            Jaccard score of each pair
+        """
+        for u, group in enumerate(self.groups):
+            # identical non-empty fingerprints have a Jaccard score of 1
+            if len(group) > 1 and self.unique_fps[u].any():
+                i, j = np.triu_indices(len(group), 1)
+                yield group[i], group[j], np.ones(len(i))
+        pairs, scores = self.similar_unique_pairs(threshold)
+        for (u, v), score in zip(pairs, scores):
+            a, b = np.meshgrid(self.groups[u], self.groups[v], indexing="ij")
+            a, b = a.ravel(), b.ravel()
+            yield np.minimum(a, b), np.maximum(a, b), np.full(len(a), score)
+
+
+def lsh_recall(fps, threshold=0.8, bands=20, rows=5, seed=0):
+    """
+    Measures how many of the exact pairs with Jaccard >= threshold the LSH
+    index finds
+
+    Parameters
+    ---------
+    fps: np.ndarray
+        (n_players, n_bits) matrix of 0/1 fingerprints
+    threshold: float
+        minimum Jaccard score
+    bands: int
+        number of bands
+    rows: int
+        signature entries per band
+    seed: int
+        seed for the MinHash permutations
+
+    Returns
+    -------
+    recall: dict
+        unique_recall over distinct fingerprint pairs, player_recall over
+        player pairs, plus the exact and found pair counts and the number
+        of candidate pairs verified
+    """
+    lsh = MinHashLSH(bands, rows, seed).index(fps)
+    sizes = np.array([len(g) for g in lsh.groups])
+    found, _ = lsh.similar_unique_pairs(threshold)
+
+    exact_pairs = 0
+    exact_players = 0
+    for start, _, block in iter_score_blocks(lsh.unique_fps, metric="jaccard"):
+        i, j = np.nonzero(block >= threshold)
+        upper = j > i + start
+        exact_pairs += upper.sum()
+        exact_players += (sizes[i[upper] + start] * sizes[j[upper]]).sum()
+
+    # identical fingerprints always collide, count them on both sides
+    same = sum(s * (s - 1) // 2 for s, fp in zip(sizes, lsh.unique_fps) if fp.any())
+    found_players = (sizes[found[:, 0]] * sizes[found[:, 1]]).sum() + same
+    return {
+        "unique_recall": float(len(found) / exact_pairs) if exact_pairs else 1.0,
+        "player_recall": float(found_players / (exact_players + same))
+        if exact_players + same
+        else 1.0,
+        "exact_unique_pairs": int(exact_pairs),
+        "found_unique_pairs": int(len(found)),
+        "candidate_pairs": int(len(lsh.candidate_pairs())),
+    }
@@ -0,0 +1,236 @@
+"""
+Parallel similarity search across processes
+"""
+
+import os
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .index import FingerprintIndex, FPS_FILE
+from .scoring import iter_score_blocks
+from .search import HIGHER_IS_BETTER, top_k_many
+
+
+# fingerprint matrix memory-mapped once in each worker process
+_WORKER_FPS = None
+
+
+def _init_worker(fps_path):
+    global _WORKER_FPS
+    _WORKER_FPS = None if fps_path is None else np.load(fps_path, mmap_mode="r")
+
+
+def _top_k_block(query_rows, k, metric, packed, exclude_self, max_memory):
+    fps = _WORKER_FPS
+    return query_rows, top_k_many(
+        fps[query_rows],
+        fps,
+        k=k,
+        metric=metric,
+        packed=packed,
+        exclude=query_rows if exclude_self else None,
+        max_memory=max_memory,
+    )
+
+
+def _pairs_block(start, stop, threshold, metric, packed, max_memory):
+    fps = _WORKER_FPS
+    higher = HIGHER_IS_BETTER[metric]
+    rows_a, rows_b, scores = [], [], []
+    # only the upper triangle: rows start:stop against rows start:
+    for sub_start, _, block in iter_score_blocks(
+        fps[start:stop], fps[start:], metric=metric, packed=packed, max_memory=max_memory
+    ):
+        hit = block >= threshold if higher else block <= threshold
+        i, j = np.nonzero(hit)
+        a, b = start + sub_start + i, start + j
+        upper = b > a
+        rows_a.append(a[upper])
+        rows_b.append(b[upper])
+        scores.append(block[i[upper], j[upper]])
+    return np.concatenate(rows_a), np.concatenate(rows_b), np.concatenate(scores)
+
+
+def parallel_top_k(
+    fps,
+    k=10,
+    metric="tanimoto",
+    packed=False,
+    queries=None,
+    exclude_self=True,
+    n_jobs=None,
+    block_size=256,
+    max_memory=2**27,
+):
+    """
+    Finds the top-k matches of many players against every player, splitting
+    the queries into blocks scored in a pool of worker processes. Workers
+    memory-map the fingerprint matrix from disk instead of receiving a
+    pickled copy, and each holds at most one block of scores at a time.
+
+    Parameters
+    ---------
+    fps: np.ndarray, FingerprintIndex or str
+        (n_players, n_bits) fingerprint matrix, a loaded FingerprintIndex or
+        the path to a saved index directory or .npy file
+    k: int
+        number of matches to return per player
+    metric: str
+        tanimoto, jaccard, manhattan or cosine_sim
+    packed: bool
+        whether the fingerprints are packed with fingerprints.pack_fp,
+        taken from the index when fps is a FingerprintIndex
+    queries: list or np.ndarray
+        rows to find matches for, defaults to every row
+    exclude_self: bool
+        leave each query player out of its own matches
+    n_jobs: int
+        number of worker processes, defaults to the number of cores; 1 runs
+        in the current process
+    block_size: int
+        number of query players sent to a worker at a time
+    max_memory: int
+        approximate number of bytes of working memory per worker
+
+    Yields
+    -------
+    row: int
+        row of the query player
+    indices: np.ndarray
+        rows of the k best matches, best first
+    scores: np.ndarray
+        scores of the k best matches
+    """
+    fps_path, packed, tmp_dir = _shared_matrix(fps, packed)
+    try:
+        n_players = len(np.load(fps_path, mmap_mode="r"))
+        queries = np.arange(n_players) if queries is None else np.asarray(queries)
+        blocks = [
+            (queries[i : i + block_size],) for i in range(0, len(queries), block_size)
+        ]
+        args = (k, metric, packed, exclude_self, max_memory)
+        for result in _map_blocks(fps_path, _top_k_block, blocks, args, n_jobs):
+            yield from _unpack_block(*result)
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def parallel_pairs(
+    fps,
+    threshold,
+    metric="tanimoto",
+    packed=False,
+    n_jobs=None,
+    block_size=256,
+    max_memory=2**27,
+):
+    """
+    Finds every pair of players scoring at least threshold (at most, for
+    manhattan distances), splitting the upper triangle of the score matrix
+    into blocks of rows scored in a pool of worker processes
+
+    Parameters
+    ---------
+    fps: np.ndarray, FingerprintIndex or str
+        (n_players, n_bits) fingerprint matrix, a loaded FingerprintIndex or
+        the path to a saved index directory or .npy file
+    threshold: float
+        minimum score (maximum distance for manhattan) of a pair
+    metric: str
+        tanimoto, jaccard, manhattan or cosine_sim
+    packed: bool
+        whether the fingerprints are packed with fingerprints.pack_fp,
+        taken from the index when fps is a FingerprintIndex
+    n_jobs: int
+        number of worker processes, defaults to the number of cores; 1 runs
+        in the current process
+    block_size: int
+        number of rows sent to a worker at a time
+    max_memory: int
+        approximate number of bytes of working memory per worker
+
+    Yields
+    -------
+    rows_a: np.ndarray
+        row of the first player of each pair
+    rows_b: np.ndarray
+        row of the second player of each pair (rows_a < rows_b)
+    scores: np.ndarray
+        score of each pair
+    """
+    if metric not in HIGHER_IS_BETTER:
+        raise ValueError(
+            f"Invalid metric '{metric}'. Use one of {', '.join(HIGHER_IS_BETTER)}."
+        )
+    fps_path, packed, tmp_dir = _shared_matrix(fps, packed)
+    try:
+        n_players = len(np.load(fps_path, mmap_mode="r"))
+        blocks = [
+            (start, min(start + block_size, n_players))
+            for start in range(0, n_players, block_size)
+        ]
+        args = (threshold, metric, packed, max_memory)
+        yield from _map_blocks(fps_path, _pairs_block, blocks, args, n_jobs)
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _shared_matrix(fps, packed):
+    """
+    Path of a .npy file holding the fingerprints for workers to
+    memory-map, writing in-memory matrices to a temporary directory
+    """
+    tmp_dir = None
+    if isinstance(fps, FingerprintIndex):
+        packed = fps.packed
+        fps = fps.fps if fps.path is None else fps.path
+    if isinstance(fps, (str, os.PathLike)):
+        fps_path = os.fspath(fps)
+        if os.path.isdir(fps_path):
+            packed = FingerprintIndex.load(fps_path).packed
+            fps_path = os.path.join(fps_path, FPS_FILE)
+    else:
+        tmp_dir = tempfile.mkdtemp(prefix="diamondfp-")
+        fps_path = os.path.join(tmp_dir, FPS_FILE)
+        np.save(fps_path, np.ascontiguousarray(fps))
+    return fps_path, packed, tmp_dir
+
+
+def _map_blocks(fps_path, func, blocks, args, n_jobs):
+    """
+    Calls func(*block, *args) on every block in worker processes sharing
+    the memory-mapped matrix, yielding the results in order
+    """
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs == 1:
+        _init_worker(fps_path)
+        try:
+            for block in blocks:
+                yield func(*block, *args)
+        finally:
+            _init_worker(None)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=n_jobs, initializer=_init_worker, initargs=(fps_path,)
+    ) as pool:
+        # keep a bounded number of blocks in flight and yield in order
+        pending = deque()
+        for block in blocks:
+            pending.append(pool.submit(func, *block, *args))
+            if len(pending) >= 2 * n_jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _unpack_block(query_rows, result):
+    indices, scores = result
+    for row, idx, sc in zip(query_rows, indices, scores):
+        yield int(row), idx, sc
@@ -0,0 +1,225 @@
+"""
+Fingerprint pipeline that fits once and transforms many
+"""
+
+import numpy as np
+
+from .fingerprints import (
+    ArchetypeMatrix,
+    PercentileReference,
+    _highest_bits,
+    _met,
+    _normalize,
+    _scaling,
+    _thresholds,
+)
+from .utils.adapters import to_feature_matrix
+from .utils.features import create_archetypes, feature_scaling, generate_quantiles
+
+
+FP_TYPES = ("binary", "binned", "normalized", "percentile", "archetype")
+
+
+class FingerprintPipeline:
+    """
+    Fits the parameters of one or more fingerprint types on a dataset and
+    compiles them into index arrays and threshold vectors, so transforming
+    a frame pulls the feature columns once and builds every fingerprint in
+    a single vectorized pass. Several fingerprint types are concatenated
+    into one vector in the order given. A fitted pipeline holds only NumPy
+    arrays and plain containers, so it pickles cleanly for pool workers.
+
+    Ex:
+    FingerprintPipeline([
+        ("binary", {"HR": [0.9, 0.99], "AVG": [0.5, 0.75]}),
+        ("normalized", ["HR", "AVG"], {"method": "minmax"}),
+    ])
+
+    Parameters
+    ---------
+    steps: list of tuples
+        (fp_type, spec) or (fp_type, spec, params) where fp_type is binary,
+        binned, normalized, percentile or archetype. spec is a stat_features
+        dict for binary/binned and a list of features otherwise. params can
+        hold skipna (binary/binned), method (normalized) and k, method,
+        metric (archetype).
+    """
+
+    def __init__(self, steps):
+        self.steps = []
+        for step in steps:
+            fp_type, spec = step[0], step[1]
+            params = dict(step[2]) if len(step) > 2 else {}
+            if fp_type not in FP_TYPES:
+                raise ValueError(
+                    f"Invalid fingerprint type '{fp_type}'. Use one of {', '.join(FP_TYPES)}."
+                )
+            self.steps.append((fp_type, spec, params))
+        self.features_ = None
+        self.params_ = None
+        self._compiled = None
+
+    def fit(self, data):
+        """
+        Fits the quantiles, scaling, reference distributions and archetypes
+        each step needs
+
+        Parameters
+        ---------
+        data: pd.DataFrame, pl.DataFrame or pa.Table
+            player data to fit on
+
+        Returns
+        -------
+        self: FingerprintPipeline
+            fitted pipeline
+        """
+        self.params_ = []
+        for fp_type, spec, params in self.steps:
+            if fp_type in ("binary", "binned"):
+                fitted = generate_quantiles(data, spec, skipna=params.get("skipna", False))
+            elif fp_type == "normalized":
+                fitted = feature_scaling(data, spec, method=params.get("method", "zscore"))
+            elif fp_type == "percentile":
+                X = to_feature_matrix(data, spec)
+                fitted = PercentileReference({feat: X[:, j] for j, feat in enumerate(spec)})
+            else:
+                fitted = create_archetypes(
+                    data, spec, k=params.get("k", 5), method=params.get("method", "kmeans")
+                )
+                if params.get("metric") == "mahalanobis":
+                    # fix the covariance to the fit data, not each transformed batch
+                    fitted = ArchetypeMatrix(fitted, data=data)
+            self.params_.append(fitted)
+        return self.compile()
+
+    def compile(self):
+        """
+        Compiles the fitted parameters into index arrays and thresholds.
+        Called by fit; call it directly after setting params_ by hand (e.g.
+        to reuse an existing feat_quants) instead of fitting.
+
+        Returns
+        -------
+        self: FingerprintPipeline
+            compiled pipeline
+        """
+        features = []
+        col = {}
+
+        def cols(names):
+            for name in names:
+                if name not in col:
+                    col[name] = len(features)
+                    features.append(name)
+            return np.array([col[name] for name in names], dtype=np.intp)
+
+        compiled = []
+        for (fp_type, _, params), fitted in zip(self.steps, self.params_):
+            if fp_type in ("binary", "binned"):
+                thresholds, starts = _thresholds(fitted)
+                step = {"cols": cols(fitted.keys()), "thresholds": thresholds, "starts": starts}
+            elif fp_type == "normalized":
+                shift, scale, flat = _scaling(fitted, params.get("method", "zscore"))
+                step = {"cols": cols(fitted.keys()), "shift": shift, "scale": scale, "flat": flat}
+            elif fp_type == "percentile":
+                reference = fitted
+                if not isinstance(reference, PercentileReference):
+                    reference = PercentileReference(fitted)
+                step = {"cols": cols(reference.features), "reference": reference}
+            else:
+                archetypes = fitted
+                if not isinstance(archetypes, ArchetypeMatrix):
+                    archetypes = ArchetypeMatrix(fitted)
+                step = {
+                    "cols": cols(archetypes.features),
+                    "archetypes": archetypes,
+                    "metric": params.get("metric", "euclidean"),
+                }
+            compiled.append(step)
+
+        self.features_ = features
+        self._compiled = compiled
+        return self
+
+    @property
+    def n_dims(self):
+        """
+        Length of the concatenated fingerprint
+        """
+        return sum(stop - start for start, stop in self.slices_)
+
+    @property
+    def slices_(self):
+        """
+        (start, stop) columns of each step in the concatenated fingerprint
+        """
+        if self._compiled is None:
+            raise ValueError("Pipeline has not been fitted.")
+        bounds = [0]
+        for (fp_type, _, _), step in zip(self.steps, self._compiled):
+            if fp_type in ("binary", "binned"):
+                width = len(step["thresholds"])
+            elif fp_type == "archetype":
+                width = len(step["archetypes"].names)
+            else:
+                width = len(step["cols"])
+            bounds.append(bounds[-1] + width)
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def transform(self, data):
+        """
+        Fingerprints every row of a dataset
+
+        Parameters
+        ---------
+        data: pd.DataFrame, pl.DataFrame, pa.Table, dict or np.ndarray
+            player data; a 2-D array must hold the columns of features_
+
+        Returns
+        -------
+        fps: np.ndarray
+            (n_players, n_dims) fingerprints, uint8 if every step is binary
+            or binned and float otherwise
+        """
+        if self._compiled is None:
+            raise ValueError("Pipeline has not been fitted.")
+        X = to_feature_matrix(data, self.features_)
+        blocks = []
+        for (fp_type, _, _), step in zip(self.steps, self._compiled):
+            if fp_type in ("binary", "binned"):
+                bits = _met(X, step["cols"], step["thresholds"], step["starts"])
+                if fp_type == "binned":
+                    bits = _highest_bits(bits, step["starts"])
+                blocks.append(bits.astype(np.uint8, copy=False))
+            elif fp_type == "normalized":
+                blocks.append(
+                    _normalize(X[:, step["cols"]], step["shift"], step["scale"], step["flat"])
+                )
+            elif fp_type == "percentile":
+                blocks.append(step["reference"].ranks(X[:, step["cols"]]))
+            else:
+                blocks.append(
+                    step["archetypes"].distances(X[:, step["cols"]], metric=step["metric"])
+                )
+
+        if all(block.dtype == np.uint8 for block in blocks):
+            return np.concatenate(blocks, axis=1) if blocks else np.empty((len(X), 0), np.uint8)
+        return np.concatenate([block.astype(float) for block in blocks], axis=1)
+
+    def fit_transform(self, data):
+        """
+        Fits the pipeline and fingerprints the same data
+
+        Parameters
+        ---------
+        data: pd.DataFrame
+            player data
+
+        Returns
+        -------
+        fps: np.ndarray
+            (n_players, n_dims) fingerprints
+        """
+        return self.fit(data).transform(data)
+
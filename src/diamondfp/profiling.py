@@ -0,0 +1,381 @@
+"""
+Opt-in per-stage profiling of quantiles, fingerprinting and scoring
+"""
+
+import contextvars
+import functools
+import itertools
+import json
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+
+# profiler receiving records in the current thread/task, None when disabled
+_ACTIVE = contextvars.ContextVar("diamondfp_profiler", default=None)
+
+# number of profilers active in any thread, checked first so disabled
+# profiling costs a global lookup per call; updated under _LOCK
+_n_active = 0
+_LOCK = threading.Lock()
+
+# highest traced memory seen by each open memory-tracked call, by scope id;
+# tracemalloc keeps a single peak, so it is folded into every open scope
+# before anyone resets it
+_PEAKS = {}
+_scope_ids = itertools.count()
+
+
+class Profiler:
+    """
+    Call counts, wall time, rows processed and bytes produced per stage
+    (e.g. "fingerprints.binaryfp_batch"), collected while the profiler is
+    active. Times are inclusive: a stage calling another instrumented
+    stage counts the inner time too. Batch and bulk functions are
+    instrumented (the *_batch fingerprints, pack_fp, score_many,
+    score_matrix, the blocks of iter_score_blocks and utils.features);
+    per-pair metrics and single-row fingerprints are not, as the
+    bookkeeping would rival their run time. Only calls made in the thread
+    (or async task) that activated the profiler are recorded, and calls
+    made in worker processes are not.
+
+    Use through profile():
+
+    with profile() as prof:
+        feat_quants = generate_quantiles(df, stat_features)
+        fps = binaryfp_batch(df, feat_quants)
+    prof.to_dict()
+
+    Parameters
+    ---------
+    callback: callable
+        called as callback(stage, seconds, rows, nbytes) after every
+        recorded call, e.g. to forward timings to a metrics system
+    track_memory: bool
+        also record the peak bytes allocated during each call with
+        tracemalloc, which slows every allocation down while active
+    """
+
+    def __init__(self, callback=None, track_memory=False):
+        self.callback = callback
+        self.track_memory = track_memory
+        self.stages = {}
+        self.seconds = 0.0
+        self._parent = None
+        self._token = None
+        self._started_tracing = False
+        self._start = None
+
+    def __enter__(self):
+        global _n_active
+        if self._token is not None:
+            raise ValueError("Profiler is already active.")
+        with _LOCK:
+            _n_active += 1
+        self._parent = _ACTIVE.get()
+        self._token = _ACTIVE.set(self)
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        global _n_active
+        with _LOCK:
+            _n_active -= 1
+        self.seconds += time.perf_counter() - self._start
+        _ACTIVE.reset(self._token)
+        self._token = None
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        return False
+
+    def _call(self, stage, func, args, kwargs, rows_arg, rows_name):
+        if self.track_memory and tracemalloc.is_tracing():
+            before = tracemalloc.get_traced_memory()[0]
+            with track_peak() as traced:
+                start = time.perf_counter()
+                result = func(*args, **kwargs)
+                seconds = time.perf_counter() - start
+            peak = max(traced.bytes - before, 0)
+        else:
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            seconds = time.perf_counter() - start
+            peak = None
+
+        if rows_arg is None:
+            rows = 1
+        elif len(args) > rows_arg:
+            rows = _n_rows(args[rows_arg])
+        else:
+            rows = _n_rows(kwargs.get(rows_name))
+        self.record(stage, seconds, rows, _n_bytes(result), peak)
+        return result
+
+    def record(self, stage, seconds, rows=0, nbytes=0, peak_bytes=None):
+        """
+        Adds one call to a stage, e.g. to time a custom stage such as loading
+
+        Parameters
+        ---------
+        stage: str
+            stage name
+        seconds: float
+            wall time of the call
+        rows: int
+            rows (players, seasons or pairs) processed
+        nbytes: int
+            bytes of the arrays produced
+        peak_bytes: int
+            peak bytes allocated during the call, if tracked
+        """
+        stats = self.stages.get(stage)
+        if stats is None:
+            stats = self.stages[stage] = {"calls": 0, "seconds": 0.0, "rows": 0, "bytes": 0}
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        stats["rows"] += rows
+        stats["bytes"] += nbytes
+        if peak_bytes is not None:
+            stats["peak_bytes"] = max(stats.get("peak_bytes", 0), peak_bytes)
+        if self.callback is not None:
+            self.callback(stage, seconds, rows, nbytes)
+        if self._parent is not None:
+            self._parent.record(stage, seconds, rows, nbytes, peak_bytes)
+
+    def stage(self, name):
+        """
+        Context manager timing a block of code as a stage
+
+        Ex:
+        with prof.stage("load"):
+            df = read_savant_csv("batting.csv")
+
+        Parameters
+        ---------
+        name: str
+            stage name
+        """
+        return _Stage(self, name)
+
+    def to_dict(self):
+        """
+        Recorded statistics
+
+        Returns
+        -------
+        report: dict
+            total seconds profiled and, per stage, calls, seconds, rows,
+            bytes, rows_per_second and peak_bytes (with track_memory)
+        """
+        stages = {}
+        for name, stats in sorted(self.stages.items(), key=lambda item: -item[1]["seconds"]):
+            stats = dict(stats)
+            seconds = stats["seconds"]
+            stats["rows_per_second"] = stats["rows"] / seconds if seconds > 0 else 0.0
+            stages[name] = stats
+        return {"seconds": self.seconds, "stages": stages}
+
+    def to_json(self, path=None, **kwargs):
+        """
+        Recorded statistics as JSON
+
+        Parameters
+        ---------
+        path: str
+            file to write the JSON to, None to only return it
+        kwargs:
+            passed on to json.dumps (e.g. indent=2)
+
+        Returns
+        -------
+        report: str
+            to_dict as a JSON string
+        """
+        text = json.dumps(self.to_dict(), **kwargs)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+
+class _Stage:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self._start)
+        return False
+
+
+class _Peak:
+    def __init__(self):
+        self.bytes = None
+        self._scope = None
+
+    def __enter__(self):
+        self._scope = _start_peak()
+        return self
+
+    def __exit__(self, *exc):
+        self.bytes = _stop_peak(self._scope)
+        return False
+
+
+def track_peak():
+    """
+    Measures the peak memory traced by tracemalloc inside a with block.
+    Blocks can be nested and run alongside instrumented calls without
+    lowering each other's peaks, which a bare tracemalloc.reset_peak would.
+    tracemalloc must be tracing.
+
+    Ex:
+    with track_peak() as peak:
+        model.fit(X)
+    peak.bytes
+
+    Returns
+    -------
+    peak: context manager
+        its bytes attribute holds the peak traced bytes after the block
+    """
+    return _Peak()
+
+
+def profile(callback=None, track_memory=False):
+    """
+    Starts recording every instrumented call made inside a with block.
+    Profilers can be nested, in which case the outer one records the
+    calls of the inner one too; entering a profiler that is already
+    active raises a ValueError.
+
+    Parameters
+    ---------
+    callback: callable
+        called as callback(stage, seconds, rows, nbytes) after every
+        recorded call
+    track_memory: bool
+        also record the peak bytes allocated during each call
+
+    Returns
+    -------
+    profiler: Profiler
+        profiler to use as a context manager
+    """
+    return Profiler(callback=callback, track_memory=track_memory)
+
+
+def active():
+    """
+    Profiler receiving records in the current thread, None when profiling
+    is disabled; for code recording stages by hand with Profiler.record
+    """
+    if not _n_active:
+        return None
+    return _ACTIVE.get()
+
+
+def _fold_peak():
+    peak = tracemalloc.get_traced_memory()[1]
+    for scope, seen in _PEAKS.items():
+        _PEAKS[scope] = max(seen, peak)
+
+
+def _start_peak():
+    """
+    Opens a scope tracking the peak traced memory from now on and returns
+    its id for _stop_peak. Scopes may nest and span threads: the traced
+    peak is reset for the new scope only after the open ones have taken
+    it into account.
+    """
+    with _LOCK:
+        _fold_peak()
+        scope = next(_scope_ids)
+        _PEAKS[scope] = tracemalloc.get_traced_memory()[0]
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+    return scope
+
+
+def _stop_peak(scope):
+    """
+    Closes a scope opened by _start_peak and returns the peak traced
+    memory (bytes) seen while it was open
+    """
+    with _LOCK:
+        _fold_peak()
+        return _PEAKS.pop(scope)
+
+
+def instrument(stage, rows_arg=None):
+    """
+    Decorator recording the calls of a function as a stage while a
+    profiler is active. When none is, the only cost is the extra function
+    call and one global lookup (well under a microsecond), so it is meant
+    for batch functions rather than per-pair or per-row ones.
+
+    Parameters
+    ---------
+    stage: str
+        stage name
+    rows_arg: int
+        position of the argument whose rows are counted (it may also be
+        passed by name), None to count one row per call
+    """
+
+    def decorator(func):
+        rows_name = None if rows_arg is None else func.__code__.co_varnames[rows_arg]
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _n_active:
+                return func(*args, **kwargs)
+            profiler = _ACTIVE.get()
+            if profiler is None:
+                return func(*args, **kwargs)
+            return profiler._call(stage, func, args, kwargs, rows_arg, rows_name)
+
+        return wrapper
+
+    return decorator
+
+
+def _n_rows(data):
+    """
+    Number of rows of a table, matrix or dict of columns; 1 for a single
+    row (dict of values, Series, list or 1-D array)
+    """
+    if data is None:
+        return 0
+    shape = getattr(data, "shape", None)
+    if shape is not None:
+        return int(shape[0]) if len(shape) > 1 else 1
+    if isinstance(data, dict):
+        first = next(iter(data.values()), None)
+        if isinstance(first, (list, tuple)) or getattr(first, "ndim", 0) == 1:
+            return len(first)
+        return 1
+    if isinstance(data, (list, tuple)) and data and isinstance(data[0], (list, tuple)):
+        return len(data)
+    return 1
+
+
+def _n_bytes(result):
+    """
+    Bytes of the arrays in a result (an array or a tuple of arrays)
+    """
+    if isinstance(result, np.ndarray):
+        return result.nbytes
+    if isinstance(result, tuple):
+        return sum(r.nbytes for r in result if isinstance(r, np.ndarray))
+    return 0
@@ -1,5 +1,73 @@
+import time
+
 import numpy as np
 
+from . import profiling
+from .fingerprints import pack_fp
+from .profiling import instrument
+
+
+# bits set in every possible byte, used when np.bitwise_count is unavailable
+_BYTE_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1)
+
+
+if hasattr(int, "bit_count"):
+    _bit_count = int.bit_count
+else:
+
+    def _bit_count(i):
+        return bin(i).count("1")
+
+
+def popcount(packed_fp):
+    """
+    Counts the bits turned on in packed fingerprints
+
+    Parameters
+    ---------
+    packed_fp: np.ndarray
+        packed fingerprint(s) from fingerprints.pack_fp
+
+    Returns
+    -------
+    count: int or np.ndarray
+        number of bits on, one per fingerprint
+    """
+    packed_fp = np.asarray(packed_fp)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(packed_fp).sum(axis=-1, dtype=np.int64)
+    as_bytes = np.ascontiguousarray(packed_fp).view(np.uint8)
+    return _BYTE_POPCOUNT[as_bytes].sum(axis=-1, dtype=np.int64)
+
+
+def _as_bits(v):
+    """
+    Fingerprint as an integer or bool array, without copying arrays that
+    already are one (e.g. uint8 fingerprints from the batch functions)
+    """
+    v = np.asarray(v)
+    return v if v.dtype.kind in "biu" else v.astype(int)
+
+
+def _as_values(v):
+    """
+    Fingerprint as a float array, without copying arrays that already are
+    one (e.g. float32 fingerprints). Integer and bool fingerprints become
+    float64 so differences cannot wrap around.
+    """
+    v = np.asarray(v)
+    return v if v.dtype.kind == "f" else v.astype(float)
+
+
+def _word_counts(words):
+    """
+    Bits turned on in each 64-bit word, without summing over the words
+    """
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+    as_bytes = np.ascontiguousarray(words).view(np.uint8)
+    return _BYTE_POPCOUNT[as_bytes].reshape(words.shape + (8,)).sum(axis=-1)
+
 
 def tanimoto(v1, v2):
     """
@@ -9,9 +77,9 @@ def tanimoto(v1, v2):
 
     Parameters
     ---------
-    v1: list
+    v1: list or np.ndarray
         fingerprint of player 1
-    v2: list
+    v2: list or np.ndarray
         fingeprint of player 2
 
     Returns
@@ -19,8 +87,8 @@ def tanimoto(v1, v2):
     score: float
         tanimoto coefficient
     """
-    v1 = np.array(v1, dtype=int)
-    v2 = np.array(v2, dtype=int)
+    v1 = _as_bits(v1)
+    v2 = _as_bits(v2)
     c = np.sum(v1 & v2)
     u = np.sum(v1 | v2)
     return c / u if u != 0 else 0
@@ -34,9 +102,9 @@ def jaccard(v1, v2):
 
     Parameters
     ---------
-    v1: list
+    v1: list or np.ndarray
         fingerprint of player 1
-    v2: list
+    v2: list or np.ndarray
         fingeprint of player 2
 
     Returns
@@ -44,8 +112,8 @@ def jaccard(v1, v2):
     score: float
         Jaccard score
     """
-    v1 = np.array(v1, dtype=int)
-    v2 = np.array(v2, dtype=int)
+    v1 = _as_bits(v1)
+    v2 = _as_bits(v2)
     c = np.sum(v1 & v2)
     u = np.sum(v1 | v2)
     return c / u if u != 0 else 0
@@ -58,9 +126,9 @@ def manhattan(v1, v2):
 
     Parameters
     ---------
-    v1: list
+    v1: list or np.ndarray
         fingerprint of player 1
-    v2: list
+    v2: list or np.ndarray
         fingeprint of player 2
 
     Returns
@@ -68,9 +136,9 @@ def manhattan(v1, v2):
     score: float
         manhattan distance
     """
-    v1 = np.array(v1, dtype=float)
-    v2 = np.array(v2, dtype=float)
-    distance = np.sum(np.abs(np.array(v1) - np.array(v2)))
+    v1 = _as_values(v1)
+    v2 = _as_values(v2)
+    distance = np.sum(np.abs(v1 - v2), dtype=float)
     return distance
 
 
@@ -81,9 +149,9 @@ def cosine_sim(v1, v2):
 
     Parameters
     ---------
-    v1: list
+    v1: list or np.ndarray
         fingerprint of player 1
-    v2: list
+    v2: list or np.ndarray
         fingeprint of player 2
 
     Returns
@@ -91,7 +159,524 @@ def cosine_sim(v1, v2):
     score: float
         cosine similarity
     """
-    v1 = np.array(v1, dtype=float)
-    v2 = np.array(v2, dtype=float)
+    v1 = _as_values(v1)
+    v2 = _as_values(v2)
     similarity = np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2))
     return similarity
+
+
+def tanimoto_packed(p1, p2):
+    """
+    Calculates the tanimoto coefficent between two packed fingerprints
+    using popcounts of the 64-bit words. Gives the same score as tanimoto
+    on the unpacked fingerprints.
+    **want closer to 1**
+
+    Parameters
+    ---------
+    p1: np.ndarray
+        packed fingerprint of player 1 (see fingerprints.pack_fp)
+    p2: np.ndarray
+        packed fingerprint of player 2; 2-D inputs are broadcast and
+        scored row by row
+
+    Returns
+    -------
+    score: float or np.ndarray
+        tanimoto coefficient
+    """
+    p1 = np.asarray(p1)
+    p2 = np.asarray(p2)
+    if p1.ndim == 1 and p2.ndim == 1:
+        # a single pair is fastest as arbitrary precision ints
+        i1 = int.from_bytes(p1.tobytes(), "little")
+        i2 = int.from_bytes(p2.tobytes(), "little")
+        c = _bit_count(i1 & i2)
+        u = _bit_count(i1 | i2)
+    else:
+        c = popcount(p1 & p2)
+        u = popcount(p1 | p2)
+        return np.divide(c, u, out=np.zeros(np.shape(c)), where=u != 0)
+    return c / u if u != 0 else 0.0
+
+
+def jaccard_packed(p1, p2):
+    """
+    Calculates the Jaccard score between two packed fingerprints
+    Exact same as tanimoto_packed but for those not familiar with cheminformatics
+    **want closer to 1**
+
+    Parameters
+    ---------
+    p1: np.ndarray
+        packed fingerprint of player 1 (see fingerprints.pack_fp)
+    p2: np.ndarray
+        packed fingerprint of player 2; 2-D inputs are broadcast and
+        scored row by row
+
+    Returns
+    -------
+    score: float or np.ndarray
+        Jaccard score
+    """
+    return tanimoto_packed(p1, p2)
+
+
+def block_weights(weights, feat_quants=None, features=None, default=1.0):
+    """
+    Expands weights given per feature, or per block of features, into one
+    weight per fingerprint bit (binary and binned fingerprints, laid out by
+    feat_quants) or per dimension (normalized fingerprints, one per feature)
+
+    Ex:
+    block_weights({("HR", "SLG"): 2.0, ("K%", "BB%"): 0.5}, feat_quants)
+    weighs every bit of HR and SLG twice and the plate discipline bits half
+
+    Parameters
+    ---------
+    weights: dict
+        weight of each feature, or of each tuple of features
+    feat_quants: dict
+        dictionary of features and their quantiles, for bit weights
+    features: list
+        features of a normalized fingerprint, for dimension weights
+    default: float
+        weight of the features not in weights
+
+    Returns
+    -------
+    weights: np.ndarray
+        (n_bits,) or (n_features,) float array of weights
+    """
+    if (feat_quants is None) == (features is None):
+        raise ValueError("Give either feat_quants or features.")
+    if feat_quants is not None:
+        features = list(feat_quants)
+        sizes = [len(quants) for quants in feat_quants.values()]
+    else:
+        features = list(features)
+        sizes = [1] * len(features)
+
+    per_feature = dict.fromkeys(features, float(default))
+    for block, weight in weights.items():
+        for feat in (block,) if isinstance(block, str) else block:
+            if feat not in per_feature:
+                raise ValueError(f"Invalid feature '{feat}'. Use one of {', '.join(features)}.")
+            per_feature[feat] = float(weight)
+    if any(weight < 0 for weight in per_feature.values()):
+        raise ValueError("Weights must not be negative.")
+
+    return np.repeat([per_feature[feat] for feat in features], sizes)
+
+
+def weighted_tanimoto(v1, v2, weights):
+    """
+    Calculates the tanimoto coefficient between two fingerprints with
+    every bit counted by its weight, sum(w * (v1 & v2)) / sum(w * (v1 | v2))
+    **want closer to 1**
+
+    Parameters
+    ---------
+    v1: list or np.ndarray
+        fingerprint of player 1
+    v2: list or np.ndarray
+        fingeprint of player 2
+    weights: np.ndarray
+        weight of each bit (see block_weights)
+
+    Returns
+    -------
+    score: float
+        weighted tanimoto coefficient
+    """
+    v1 = _as_bits(v1)
+    v2 = _as_bits(v2)
+    weights = np.asarray(weights, dtype=float)
+    c = np.dot(weights, v1 & v2)
+    u = np.dot(weights, v1 | v2)
+    return c / u if u != 0 else 0
+
+
+def weighted_manhattan(v1, v2, weights):
+    """
+    Calculates the manhattan distance between two fingerprints with every
+    dimension scaled by its weight, sum(w * |v1 - v2|)
+    **want non-negative, smaller value**
+
+    Parameters
+    ---------
+    v1: list or np.ndarray
+        fingerprint of player 1
+    v2: list or np.ndarray
+        fingeprint of player 2
+    weights: np.ndarray
+        weight of each dimension (see block_weights)
+
+    Returns
+    -------
+    score: float
+        weighted manhattan distance
+    """
+    v1 = _as_values(v1)
+    v2 = _as_values(v2)
+    return np.dot(np.asarray(weights, dtype=float), np.abs(v1 - v2))
+
+
+def weighted_cosine(v1, v2, weights):
+    """
+    Calculates the cosine similarity between two fingerprints under the
+    weighted inner product sum(w * v1 * v2)
+    **want closer to 1**
+
+    Parameters
+    ---------
+    v1: list or np.ndarray
+        fingerprint of player 1
+    v2: list or np.ndarray
+        fingeprint of player 2
+    weights: np.ndarray
+        weight of each dimension (see block_weights)
+
+    Returns
+    -------
+    score: float
+        weighted cosine similarity
+    """
+    v1 = _as_values(v1)
+    v2 = _as_values(v2)
+    weights = np.asarray(weights, dtype=float)
+    wv1 = weights * v1
+    return np.dot(wv1, v2) / (np.sqrt(np.dot(wv1, v1)) * np.sqrt(np.dot(weights * v2, v2)))
+
+
+def _packable(fps, metric, packed, weights):
+    """
+    Whether unpacked fingerprints hold only 0/1 integers or bools, so an
+    unweighted tanimoto, jaccard or manhattan run can pack them once and
+    count bits instead of scoring a float64 copy
+    """
+    if packed or weights is not None or metric not in ("tanimoto", "jaccard", "manhattan"):
+        return False
+    fps = np.asarray(fps)
+    if fps.dtype.kind == "b":
+        return True
+    return fps.dtype.kind in "iu" and (fps.size == 0 or (fps.min() >= 0 and fps.max() <= 1))
+
+
+def _weight_levels(weights, packed):
+    """
+    For packed fingerprints, a packed mask of the bits carrying each
+    distinct nonzero weight, and the weight of every masked word. Weighted
+    bit counts are then the per-word popcounts times the word weights.
+    """
+    if weights is None or not packed:
+        return None
+    weights = np.asarray(weights, dtype=float)
+    levels = np.unique(weights[weights != 0])
+    masks = pack_fp(weights[None, :] == levels[:, None])
+    return np.repeat(levels, masks.shape[1]), masks
+
+
+def _block_levels(weights, split):
+    """
+    Weights _score_block applies in the products: the word weights of a
+    split from _weight_levels, else the per-dimension weights
+    """
+    if split is not None:
+        return split[0]
+    return None if weights is None else np.asarray(weights, dtype=float)
+
+
+def _weighted_counts(fps, weights, packed):
+    """
+    Weighted number of bits turned on in each fingerprint, sum(w * v),
+    computed as the bulk kernels count them
+    """
+    fps = np.asarray(fps)
+    weights = np.asarray(weights, dtype=float)
+    if not packed:
+        return _as_values(fps) @ weights
+    levels, masks = _weight_levels(weights, packed)
+    words = (fps[..., None, :] & masks).reshape(fps.shape[:-1] + (-1,))
+    return _word_counts(words) @ levels
+
+
+def _check_weights(fps, weights, packed):
+    """
+    Raises if weights do not cover every bit or dimension of fps. Packed
+    fingerprints do not record their bit count, so weights must fall in
+    the last word and leave no bit that is turned on without a weight.
+    """
+    width = fps.shape[1]
+    if not packed:
+        if len(weights) != width:
+            raise ValueError(f"Got {len(weights)} weights for fingerprints of width {width}.")
+        return
+    if not 64 * (width - 1) < len(weights) <= 64 * width:
+        raise ValueError(f"Got {len(weights)} weights for packed fingerprints of {width} words.")
+    tail = len(weights) % 64
+    if tail and np.any(fps[:, -1] >> np.uint64(tail)):
+        raise ValueError(
+            f"Got {len(weights)} weights for fingerprints with bits turned on past bit "
+            f"{len(weights)}."
+        )
+
+
+def _prepare(fps, metric, packed, weights=None, split=None):
+    """
+    Converts a set of fingerprints once into the arrays the bulk kernels use.
+    Weights are folded in here where they can be: packed words are split
+    by weight level (split from _weight_levels) and unpacked counts and
+    norms are weighted, while _score_block weights one side of the
+    unpacked products.
+    """
+    if metric not in _BULK_METRICS:
+        raise ValueError(
+            f"Invalid metric '{metric}'. Use one of {', '.join(_BULK_METRICS)}."
+        )
+    fps = np.asarray(fps)
+    if fps.ndim != 2:
+        raise ValueError(f"Expected a 2-D fingerprint matrix, got shape {fps.shape}.")
+    if weights is not None:
+        weights = np.asarray(weights, dtype=float)
+        _check_weights(fps, weights, packed)
+    if packed:
+        if weights is None:
+            return fps, popcount(fps).astype(float)
+        # (n_players, n_levels * n_words): the words of each weight level
+        levels, masks = split
+        words = (fps[:, None, :] & masks[None, :, :]).reshape(len(fps), -1)
+        return words, _word_counts(words) @ levels
+    # float32 fingerprints are scored as they are, without a float64 copy;
+    # 0/1 integer ones were packed by the caller where the metric allows
+    fps = _as_values(fps)
+    if metric in ("tanimoto", "jaccard"):
+        if weights is None:
+            return fps, fps.sum(axis=1)
+        return fps, fps @ weights
+    if metric == "cosine_sim":
+        if weights is None:
+            return fps, np.linalg.norm(fps, axis=1)
+        return fps, np.sqrt(np.einsum("ij,ij->i", fps * weights, fps))
+    return (fps,) if weights is None else (fps * weights,)
+
+
+def _score_block(prep_a, prep_b, metric, packed, levels=None):
+    """
+    Scores every fingerprint of prep_a against every fingerprint of prep_b.
+    levels holds the weight of every packed word or unpacked dimension (see
+    _block_levels); unpacked products weight prep_a only, so the sums are
+    the same as in the pairwise weighted functions.
+    """
+    if packed:
+        (wa, ca), (wb, cb) = prep_a, prep_b
+        if levels is None:
+            c = popcount(wa[:, None, :] & wb[None, :, :]).astype(float)
+        else:
+            c = _word_counts(wa[:, None, :] & wb[None, :, :]) @ levels
+        if metric == "manhattan":
+            return ca[:, None] + cb[None, :] - 2 * c
+        if metric == "cosine_sim":
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return c / (np.sqrt(ca)[:, None] * np.sqrt(cb)[None, :])
+    elif metric == "manhattan":
+        fa, fb = prep_a[0], prep_b[0]
+        distance = np.zeros((len(fa), len(fb)))
+        for j in range(fa.shape[1]):
+            distance += np.abs(fa[:, j, None] - fb[None, :, j])
+        return distance
+    else:
+        (fa, ca), (fb, cb) = prep_a, prep_b
+        if levels is not None:
+            fa = fa * levels
+        c = fa @ fb.T
+        if metric == "cosine_sim":
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return c / (ca[:, None] * cb[None, :])
+
+    # tanimoto/jaccard: union = |a| + |b| - |a & b|
+    u = ca[:, None] + cb[None, :] - c
+    return np.divide(c, u, out=np.zeros_like(c), where=u != 0)
+
+
+def _pair_bytes(prep, packed):
+    """
+    Rough number of working bytes needed per scored pair
+    """
+    if packed:
+        return 8 * prep[0].shape[1] + 32
+    return 32
+
+
+def _slice(prep, start, stop):
+    return tuple(p[start:stop] for p in prep)
+
+
+# metrics supported by the one-vs-many and many-vs-many functions
+_BULK_METRICS = ("tanimoto", "jaccard", "manhattan", "cosine_sim")
+
+
+@instrument("scoring.score_many", rows_arg=1)
+def score_many(query, fps, metric="tanimoto", packed=False, max_memory=2**27, weights=None):
+    """
+    Scores one fingerprint against a whole matrix of fingerprints with
+    vectorized kernels instead of a Python loop over players.
+
+    Parameters
+    ---------
+    query: list or np.ndarray
+        fingerprint of the query player
+    fps: np.ndarray
+        (n_players, n_bits) matrix of fingerprints to compare against
+    metric: str
+        tanimoto, jaccard, manhattan or cosine_sim
+    packed: bool
+        whether query and fps are packed with fingerprints.pack_fp
+    max_memory: int
+        approximate number of bytes of working memory to use at once
+    weights: np.ndarray
+        weight of each bit or dimension (see block_weights) for weighted
+        scores, None to weigh them all equally
+
+    Returns
+    -------
+    scores: np.ndarray
+        (n_players,) float array of scores, same values as calling the
+        pairwise function (or its weighted version) on every player
+    """
+    query = np.asarray(query)
+    if _packable(query, metric, packed, weights) and _packable(fps, metric, packed, weights):
+        query, fps, packed = pack_fp(query), pack_fp(fps), True
+    split = _weight_levels(weights, packed)
+    levels = _block_levels(weights, split)
+    prep_q = _prepare(query[None, :], metric, packed, weights, split)
+    prep_f = _prepare(fps, metric, packed, weights, split)
+    n = len(prep_f[0])
+    step = max(1, max_memory // _pair_bytes(prep_f, packed))
+    scores = np.empty(n)
+    for start in range(0, n, step):
+        prep_b = _slice(prep_f, start, start + step)
+        block = _score_block(prep_q, prep_b, metric, packed, levels)
+        scores[start : start + step] = block[0]
+
+    return scores
+
+
+def iter_score_blocks(
+    fps_a,
+    fps_b=None,
+    metric="tanimoto",
+    packed=False,
+    max_memory=2**27,
+    dtype=float,
+    weights=None,
+):
+    """
+    Scores many fingerprints against many fingerprints, yielding the score
+    matrix one block of rows at a time so the full matrix never has to be
+    held in memory.
+
+    Parameters
+    ---------
+    fps_a: np.ndarray
+        (n_a, n_bits) matrix of query fingerprints
+    fps_b: np.ndarray
+        (n_b, n_bits) matrix of fingerprints to compare against, defaults to
+        fps_a for an all-pairs run
+    metric: str
+        tanimoto, jaccard, manhattan or cosine_sim
+    packed: bool
+        whether the fingerprints are packed with fingerprints.pack_fp
+    max_memory: int
+        approximate number of bytes of working memory used per block
+    dtype: np.dtype
+        dtype of the yielded blocks (e.g. np.float32 to halve their size)
+    weights: np.ndarray
+        weight of each bit or dimension (see block_weights) for weighted
+        scores, None to weigh them all equally
+
+    Yields
+    -------
+    start: int
+        index of the first row of fps_a in the block
+    stop: int
+        index after the last row of fps_a in the block
+    block: np.ndarray
+        (stop - start, n_b) matrix of scores
+    """
+    if _packable(fps_a, metric, packed, weights) and (
+        fps_b is None or _packable(fps_b, metric, packed, weights)
+    ):
+        fps_a = pack_fp(fps_a)
+        fps_b = None if fps_b is None else pack_fp(fps_b)
+        packed = True
+    split = _weight_levels(weights, packed)
+    levels = _block_levels(weights, split)
+    prep_a = _prepare(fps_a, metric, packed, weights, split)
+    prep_b = prep_a if fps_b is None else _prepare(fps_b, metric, packed, weights, split)
+    n_a, n_b = len(prep_a[0]), len(prep_b[0])
+    row_bytes = max(1, n_b) * _pair_bytes(prep_b, packed)
+    step = max(1, max_memory // row_bytes)
+    profiler = profiling.active()
+    for start in range(0, n_a, step):
+        stop = min(start + step, n_a)
+        if profiler is not None:
+            tic = time.perf_counter()
+        block = _score_block(_slice(prep_a, start, stop), prep_b, metric, packed, levels)
+        block = block.astype(dtype, copy=False)
+        if profiler is not None:
+            # timed per block, so the time the caller spends between blocks is left out
+            profiler.record(
+                "scoring.iter_score_blocks", time.perf_counter() - tic, stop - start, block.nbytes
+            )
+        yield start, stop, block
+
+
+@instrument("scoring.score_matrix", rows_arg=0)
+def score_matrix(
+    fps_a,
+    fps_b=None,
+    metric="tanimoto",
+    packed=False,
+    max_memory=2**27,
+    dtype=float,
+    weights=None,
+):
+    """
+    Builds the full (n_a, n_b) score matrix between two sets of fingerprints.
+    Only use this when the whole matrix is wanted in memory; otherwise
+    iterate over iter_score_blocks.
+
+    Parameters
+    ---------
+    fps_a: np.ndarray
+        (n_a, n_bits) matrix of query fingerprints
+    fps_b: np.ndarray
+        (n_b, n_bits) matrix of fingerprints to compare against, defaults to
+        fps_a for an all-pairs run
+    metric: str
+        tanimoto, jaccard, manhattan or cosine_sim
+    packed: bool
+        whether the fingerprints are packed with fingerprints.pack_fp
+    max_memory: int
+        approximate number of bytes of working memory used per block
+    dtype: np.dtype
+        dtype of the returned matrix
+    weights: np.ndarray
+        weight of each bit or dimension (see block_weights) for weighted
+        scores, None to weigh them all equally
+
+    Returns
+    -------
+    scores: np.ndarray
+        (n_a, n_b) matrix of scores
+    """
+    n_a = len(fps_a)
+    n_b = n_a if fps_b is None else len(fps_b)
+    scores = np.empty((n_a, n_b), dtype=dtype)
+    for start, stop, block in iter_score_blocks(
+        fps_a, fps_b, metric, packed, max_memory, dtype, weights
+    ):
+        scores[start:stop] = block
+
+    return scores
@@ -0,0 +1,362 @@
+"""
+Nearest player search functions
+"""
+
+import numpy as np
+
+from .scoring import (
+    _BULK_METRICS,
+    _block_levels,
+    _prepare,
+    _score_block,
+    _slice,
+    _weight_levels,
+    _weighted_counts,
+    iter_score_blocks,
+    popcount,
+    score_many,
+)
+
+
+# whether a larger score means a closer match for each metric
+HIGHER_IS_BETTER = {
+    "tanimoto": True,
+    "jaccard": True,
+    "manhattan": False,
+    "cosine_sim": True,
+}
+
+
+class PopcountIndex:
+    """
+    Binary fingerprints sorted and grouped by the number of bits turned on.
+    Players with the same popcount share the same upper bound on their
+    Tanimoto score against a query (Swamidass & Baldi, 2007), so whole
+    groups can be skipped once they cannot beat the current top-k.
+
+    Parameters
+    ---------
+    fps: np.ndarray
+        (n_players, n_bits) matrix of 0/1 fingerprints, or packed
+        fingerprints from fingerprints.pack_fp
+    packed: bool
+        whether fps is packed
+    counts: np.ndarray
+        bits turned on in each fingerprint, computed from fps if None
+    """
+
+    def __init__(self, fps, packed=False, counts=None):
+        fps = np.asarray(fps)
+        if fps.ndim != 2:
+            raise ValueError(f"Expected a 2-D fingerprint matrix, got shape {fps.shape}.")
+        if counts is None:
+            counts = popcount(fps) if packed else np.count_nonzero(fps, axis=1)
+        self.packed = packed
+        self.order = np.argsort(counts, kind="stable")
+        self.fps = fps[self.order]
+        self.counts = counts
+        self.bucket_counts, self.offsets = np.unique(counts[self.order], return_index=True)
+        self.offsets = np.append(self.offsets, len(fps))
+
+    def __len__(self):
+        return len(self.fps)
+
+    def weighted(self, weights):
+        """
+        The same players sorted by weighted bit count, sum(w * bits), in
+        blocks whose lowest and highest counts bound the weighted scores of
+        the block. Kept for the last weights used, so repeated weighted
+        queries sort once.
+
+        Parameters
+        ---------
+        weights: np.ndarray
+            weight of each bit (see scoring.block_weights)
+
+        Returns
+        -------
+        index: WeightedPopcountIndex
+            index to prune weighted searches with
+        """
+        weights = np.asarray(weights, dtype=float)
+        cached = getattr(self, "_weighted", None)
+        if cached is not None and cached[0] is self.fps and np.array_equal(cached[1], weights):
+            return cached[2]
+        index = WeightedPopcountIndex(self, weights)
+        self._weighted = (self.fps, weights, index)
+        return index
+
+    def bucket(self, b):
+        """
+        Rows and fingerprints of the players in the b-th popcount bucket
+
+        Parameters
+        ---------
+        b: int
+            position of the bucket in bucket_counts
+
+        Returns
+        -------
+        rows: np.ndarray
+            rows of the players in the original fingerprint matrix
+        fps: np.ndarray
+            fingerprints of those players
+        """
+        start, stop = self.offsets[b], self.offsets[b + 1]
+        return self.order[start:stop], self.fps[start:stop]
+
+
+class WeightedPopcountIndex(PopcountIndex):
+    """
+    Players of a PopcountIndex sorted by weighted bit count and cut into
+    blocks of block_size. Weighted Tanimoto and Manhattan scores obey the
+    same bounds as unweighted ones with the counts weighted, so a block is
+    skipped when its count closest to the query's cannot beat the k-th best
+    score. Built through PopcountIndex.weighted.
+
+    Parameters
+    ---------
+    index: PopcountIndex
+        index of the players
+    weights: np.ndarray
+        weight of each bit (see scoring.block_weights)
+    block_size: int
+        players per block
+    """
+
+    def __init__(self, index, weights, block_size=512):
+        counts = _weighted_counts(index.fps, weights, index.packed)
+        order = np.argsort(counts, kind="stable")
+        self.packed = index.packed
+        self.weights = weights
+        self.order = index.order[order]
+        self.fps = index.fps[order]
+        self.counts = counts[order]
+        self.offsets = np.append(np.arange(0, len(order), block_size), len(order))
+        self.bucket_counts = self.counts[self.offsets[:-1]]
+        self.bucket_highs = self.counts[self.offsets[1:] - 1]
+        self.split = _weight_levels(weights, self.packed)
+        self._prepared = {}
+
+    def prepared(self, metric):
+        """
+        The sorted fingerprints converted once for the bulk kernels, so
+        searching a block does not redo the weighting
+        """
+        key = "packed" if self.packed else metric
+        if key not in self._prepared:
+            self._prepared[key] = _prepare(
+                self.fps, metric, self.packed, self.weights, self.split
+            )
+        return self._prepared[key]
+
+
+def _bounds(query_count, bucket_counts, metric, bucket_highs=None):
+    """
+    Best score any player in each popcount bucket can reach against the
+    query. Buckets spanning a range of counts (bucket_counts up to
+    bucket_highs) are bounded by the count in range closest to the query's.
+    """
+    if bucket_highs is not None:
+        bucket_counts = np.clip(query_count, bucket_counts, bucket_highs)
+    if metric == "manhattan":
+        # at least |a| - |b| bits must differ
+        return np.abs(bucket_counts - query_count).astype(float)
+    lo = np.minimum(bucket_counts, query_count)
+    hi = np.maximum(bucket_counts, query_count)
+    return np.divide(lo, hi, out=np.zeros(len(hi)), where=hi != 0)
+
+
+def _select(scores, indices, k, higher):
+    """
+    Picks the k best scores, breaking ties by the lower player index, using
+    argpartition rather than sorting every score
+    """
+    key = -scores if higher else scores
+    key = np.where(np.isnan(key), np.inf, key)
+    if k < len(key):
+        kth = key[np.argpartition(key, k - 1)[k - 1]]
+        # keep every tie with the k-th score so the index tie-break is exact
+        cand = np.flatnonzero(key <= kth)
+    else:
+        cand = np.arange(len(key))
+    best = cand[np.lexsort((indices[cand], key[cand]))[:k]]
+
+    return indices[best], scores[best]
+
+
+def top_k(query_fp, fp_matrix, k=10, metric="tanimoto", packed=False, weights=None):
+    """
+    Finds the k players most similar to a query fingerprint. Given a
+    prebuilt PopcountIndex, tanimoto, jaccard and manhattan candidates are
+    visited by popcount and skipped once their bound cannot reach the
+    current k-th best score; a plain matrix is scored in full, as sorting
+    it into an index would cost more than a single query saves. Results
+    are identical to scoring every player and sorting by score, with ties
+    going to the lower index. Weighted tanimoto, jaccard and manhattan
+    searches prune the same way on weighted bit counts (see
+    PopcountIndex.weighted).
+
+    Parameters
+    ---------
+    query_fp: list or np.ndarray
+        fingerprint of the query player
+    fp_matrix: np.ndarray or PopcountIndex
+        (n_players, n_bits) matrix of fingerprints to search, or a prebuilt
+        PopcountIndex to prune repeated queries with
+    k: int
+        number of matches to return
+    metric: str
+        tanimoto, jaccard, manhattan or cosine_sim
+    packed: bool
+        whether query_fp and fp_matrix are packed with fingerprints.pack_fp
+    weights: np.ndarray
+        weight of each bit or dimension (see block_weights) for weighted
+        scores, None to weigh them all equally
+
+    Returns
+    -------
+    indices: np.ndarray
+        row indices of the k best matches, best first
+    scores: np.ndarray
+        scores of the k best matches
+    """
+    if metric not in _BULK_METRICS:
+        raise ValueError(
+            f"Invalid metric '{metric}'. Use one of {', '.join(_BULK_METRICS)}."
+        )
+    if k < 1:
+        raise ValueError("k must be at least 1.")
+    higher = HIGHER_IS_BETTER[metric]
+    query_fp = np.asarray(query_fp)
+
+    if isinstance(fp_matrix, PopcountIndex):
+        index = fp_matrix
+        packed = index.packed
+    else:
+        scores = score_many(query_fp, fp_matrix, metric=metric, packed=packed, weights=weights)
+        return _select(scores, np.arange(len(scores)), k, higher)
+
+    if metric == "cosine_sim":
+        scores = score_many(query_fp, index.fps, metric=metric, packed=packed, weights=weights)
+        return _select(scores, index.order, k, higher)
+
+    if weights is None:
+        query_count = popcount(query_fp) if packed else np.count_nonzero(query_fp)
+        bounds = _bounds(query_count, index.bucket_counts, metric)
+    else:
+        index = index.weighted(weights)
+        query_count = _weighted_counts(query_fp, weights, packed)
+        bounds = _bounds(query_count, index.bucket_counts, metric, index.bucket_highs)
+        # weighted counts are floats; keep rounding from pruning a tie
+        bounds = bounds + 1e-9 if higher else bounds - 1e-9
+        prep_q = _prepare(query_fp[None, :], metric, packed, index.weights, index.split)
+        prep = index.prepared(metric)
+        levels = _block_levels(index.weights, index.split)
+
+    def score_bucket(b):
+        if weights is None:
+            rows, fps = index.bucket(b)
+            return rows, score_many(query_fp, fps, metric=metric, packed=packed)
+        start, stop = index.offsets[b], index.offsets[b + 1]
+        prep_b = _slice(prep, start, stop)
+        return index.order[start:stop], _score_block(prep_q, prep_b, metric, packed, levels)[0]
+
+    return _bucket_top_k(bounds, score_bucket, k, higher)
+
+
+def _bucket_top_k(bounds, score_bucket, k, higher):
+    """
+    Visits buckets best bound first, scoring bucket b with score_bucket(b)
+    (its rows and their scores), until no bucket left can beat the k-th
+    best score
+    """
+    visit = np.argsort(-bounds if higher else bounds, kind="stable")
+    best_idx = np.empty(0, dtype=np.intp)
+    best_scores = np.empty(0)
+    for b in visit:
+        if len(best_idx) == k:
+            kth = best_scores[-1]
+            if bounds[b] < kth if higher else bounds[b] > kth:
+                break
+        rows, scores = score_bucket(b)
+        # anything dropped here is beaten by k kept players, so it can never
+        # make the final top-k
+        best_idx, best_scores = _select(
+            np.concatenate([best_scores, scores]),
+            np.concatenate([best_idx, rows]),
+            k,
+            higher,
+        )
+
+    return best_idx, best_scores
+
+
+def top_k_many(
+    query_fps,
+    fp_matrix,
+    k=10,
+    metric="tanimoto",
+    packed=False,
+    exclude=None,
+    max_memory=2**27,
+    weights=None,
+):
+    """
+    Finds the k best matches for many query fingerprints at once, scoring
+    blocks of queries against every player so working memory stays within
+    max_memory
+
+    Parameters
+    ---------
+    query_fps: np.ndarray
+        (n_queries, n_bits) matrix of query fingerprints
+    fp_matrix: np.ndarray
+        (n_players, n_bits) matrix of fingerprints to search
+    k: int
+        number of matches to return per query
+    metric: str
+        tanimoto, jaccard, manhattan or cosine_sim
+    packed: bool
+        whether the fingerprints are packed with fingerprints.pack_fp
+    exclude: list or np.ndarray
+        row of fp_matrix to leave out for each query (e.g. the query player
+        itself), or None
+    max_memory: int
+        approximate number of bytes of working memory used per block
+    weights: np.ndarray
+        weight of each bit or dimension (see block_weights) for weighted
+        scores, None to weigh them all equally
+
+    Returns
+    -------
+    indices: np.ndarray
+        (n_queries, k) row indices of the best matches, best first
+    scores: np.ndarray
+        (n_queries, k) scores of the best matches
+    """
+    if k < 1:
+        raise ValueError("k must be at least 1.")
+    higher = HIGHER_IS_BETTER.get(metric)
+    n_players = len(fp_matrix)
+    k_out = min(k, n_players - (exclude is not None))
+    indices = np.empty((len(query_fps), k_out), dtype=np.intp)
+    scores = np.empty((len(query_fps), k_out))
+    rows = np.arange(n_players)
+    for start, stop, block in iter_score_blocks(
+        query_fps,
+        fp_matrix,
+        metric=metric,
+        packed=packed,
+        max_memory=max_memory,
+        weights=weights,
+    ):
+        for i in range(start, stop):
+            if exclude is None:
+                indices[i], scores[i] = _select(block[i - start], rows, k, higher)
+            else:
+                idx, sc = _select(block[i - start], rows, k + 1, higher)
+                keep = idx != exclude[i]
+                indices[i], scores[i] = idx[keep][:k_out], sc[keep][:k_out]
+
+    return indices, scores
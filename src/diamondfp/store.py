@@ -0,0 +1,421 @@
+"""
+Updatable fingerprint store for incremental refreshes
+"""
+
+import numpy as np
+
+from .fingerprints import (
+    _scaling,
+    binaryfp_batch,
+    binnedfp_batch,
+    normalizedfp_batch,
+    pack_fp,
+)
+from .index import FingerprintIndex
+from .scoring import popcount, score_many
+from .search import HIGHER_IS_BETTER, _bounds, _bucket_top_k, top_k
+from .utils.adapters import column_values, to_feature_matrix
+
+
+class FingerprintStore:
+    """
+    Fingerprints kept alongside the raw feature values of every player so
+    the table can change one row at a time. Upserts and deletes touch only
+    the rows involved, refitting feat_quants/feat_scaling marks stale only
+    the rows whose fingerprint can change (values between an old and a new
+    threshold, or features whose scaling moved), and refresh re-fingerprints
+    just the stale rows. Searches always refresh first, and the popcount
+    buckets used for pruned search move only the refreshed and deleted
+    rows, so results match a full rebuild without re-sorting the store.
+
+    Parameters
+    ---------
+    feat_quants: dict
+        dictionary of features and their quantiles (binary and binned)
+    feat_scaling: dict
+        dictionary of features and their scaling parameters (normalized)
+    fp_type: str
+        fingerprint type (binary, binned or normalized)
+    method: str
+        scaling method for normalized fingerprints (minmax or zscore)
+    pack: bool
+        store binary and binned fingerprints packed with fingerprints.pack_fp
+    """
+
+    def __init__(
+        self, feat_quants=None, feat_scaling=None, fp_type="binary", method="zscore", pack=True
+    ):
+        if fp_type in ("binary", "binned"):
+            if feat_quants is None:
+                raise ValueError(f"{fp_type} fingerprints need feat_quants.")
+            params = feat_quants
+        elif fp_type == "normalized":
+            if feat_scaling is None:
+                raise ValueError("normalized fingerprints need feat_scaling.")
+            params = feat_scaling
+        else:
+            raise ValueError("Invalid fingerprint type. Use 'binary', 'binned' or 'normalized'.")
+        self.fp_type = fp_type
+        self.method = method
+        self.binary = fp_type != "normalized"
+        self.packed = pack and self.binary
+        self.feat_quants = feat_quants
+        self.feat_scaling = feat_scaling
+        self.features = list(params)
+        self.ids = []
+        self._rows = {}
+        self._X = np.empty((0, len(self.features)))
+        self._fps = np.empty((0, self._width()), dtype=self._dtype())
+        self._counts = np.empty(0, dtype=np.int64)
+        self._stale = np.empty(0, dtype=bool)
+        # popcount buckets for pruned search, built on the first search
+        self._buckets = None
+
+    @classmethod
+    def from_data(cls, data, id_col, **kwargs):
+        """
+        Creates a store holding every player of a dataset
+
+        Parameters
+        ---------
+        data: pd.DataFrame, pl.DataFrame or pa.Table
+            player data
+        id_col: str
+            column holding the player IDs
+        kwargs:
+            feat_quants, feat_scaling, fp_type, method and pack
+
+        Returns
+        -------
+        store: FingerprintStore
+            store with every row fingerprinted
+        """
+        store = cls(**kwargs)
+        store.upsert(column_values(data, id_col), data)
+        store.refresh()
+        return store
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _n_bits(self):
+        return sum(len(q) for q in self.feat_quants.values())
+
+    def _width(self):
+        if not self.binary:
+            return len(self.features)
+        return -(-self._n_bits() // 64) if self.packed else self._n_bits()
+
+    def _dtype(self):
+        if not self.binary:
+            return float
+        return np.uint64 if self.packed else np.uint8
+
+    def _grow(self, n):
+        # amortized doubling so a stream of upserts stays linear overall
+        capacity = len(self._X)
+        if n <= capacity:
+            return
+        capacity = max(n, 2 * capacity, 16)
+        for name in ("_X", "_fps", "_counts", "_stale"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[: len(self)] = old[: len(self)]
+            setattr(self, name, new)
+
+    def upsert(self, ids, data):
+        """
+        Inserts new players or replaces the stats of existing ones. The rows
+        are marked stale and fingerprinted on the next refresh or search.
+
+        Parameters
+        ---------
+        ids: list
+            player ID of each row of data
+        data: pd.DataFrame, pl.DataFrame, pa.Table, dict or np.ndarray
+            player stats; a 2-D array must hold the columns of features
+
+        Returns
+        -------
+        rows: np.ndarray
+            rows of the players in the store
+        """
+        ids = list(ids)
+        X = to_feature_matrix(data, self.features)
+        if len(X) != len(ids):
+            raise ValueError(f"Got {len(ids)} ids for {len(X)} rows.")
+        new_ids = [pid for pid in dict.fromkeys(ids) if pid not in self._rows]
+        self._grow(len(self) + len(new_ids))
+        for pid in new_ids:
+            self._rows[pid] = len(self.ids)
+            self.ids.append(pid)
+        rows = np.array([self._rows[pid] for pid in ids], dtype=np.intp)
+        # with repeated ids the last row wins, as with sequential upserts
+        self._X[rows] = X
+        self._stale[rows] = True
+        return rows
+
+    def delete(self, ids):
+        """
+        Removes players. The last row is moved into each freed row so the
+        arrays stay compact.
+
+        Parameters
+        ---------
+        ids: list
+            player IDs to remove
+        """
+        for pid in ids:
+            row = self._rows.pop(pid)
+            last = len(self.ids) - 1
+            if self._buckets is not None:
+                self._buckets.remove(row)
+            if row != last:
+                moved = self.ids[last]
+                for arr in (self._X, self._fps, self._counts, self._stale):
+                    arr[row] = arr[last]
+                self.ids[row] = moved
+                self._rows[moved] = row
+                if self._buckets is not None:
+                    self._buckets.move(last, row)
+            self.ids.pop()
+
+    def refit(self, feat_quants=None, feat_scaling=None):
+        """
+        Swaps in refit parameters and marks stale only the rows whose
+        fingerprint can change
+
+        Parameters
+        ---------
+        feat_quants: dict
+            new quantiles (binary and binned)
+        feat_scaling: dict
+            new scaling parameters (normalized)
+
+        Returns
+        -------
+        n_stale: int
+            number of rows now waiting for a refresh
+        """
+        n = len(self)
+        X = self._X[:n]
+        if self.binary:
+            if feat_quants is None or list(feat_quants) != self.features:
+                raise ValueError("Refit feat_quants must cover the same features.")
+            if [len(q) for q in feat_quants.values()] != [
+                len(q) for q in self.feat_quants.values()
+            ]:
+                # the bit layout changed, every fingerprint is rebuilt
+                self.feat_quants = feat_quants
+                self._fps = np.zeros((len(self._X), self._width()), dtype=self._dtype())
+                self._stale[:n] = True
+                return n
+            for j, feat in enumerate(self.features):
+                for old, new in zip(self.feat_quants[feat], feat_quants[feat]):
+                    self._stale[:n] |= _crossed(X[:, j], old, new)
+            self.feat_quants = feat_quants
+        else:
+            if feat_scaling is None or list(feat_scaling) != self.features:
+                raise ValueError("Refit feat_scaling must cover the same features.")
+            old_flat = _scaling(self.feat_scaling, self.method)[2]
+            new_flat = _scaling(feat_scaling, self.method)[2]
+            for j, feat in enumerate(self.features):
+                if old_flat[j] != new_flat[j]:
+                    # missing values map to 0.0 without spread and NaN with it
+                    self._stale[:n] = True
+                elif tuple(feat_scaling[feat]) != tuple(self.feat_scaling[feat]):
+                    self._stale[:n] |= ~np.isnan(X[:, j])
+            self.feat_scaling = feat_scaling
+        return int(self._stale[:n].sum())
+
+    @property
+    def stale(self):
+        """
+        IDs of the players waiting to be fingerprinted
+        """
+        return [self.ids[row] for row in np.flatnonzero(self._stale[: len(self)])]
+
+    def refresh(self):
+        """
+        Fingerprints the stale rows
+
+        Returns
+        -------
+        n_refreshed: int
+            number of rows fingerprinted
+        """
+        rows = np.flatnonzero(self._stale[: len(self)])
+        if len(rows) == 0:
+            return 0
+        X = self._X[rows]
+        if self.fp_type == "binary":
+            fps = binaryfp_batch(X, self.feat_quants)
+        elif self.fp_type == "binned":
+            fps = binnedfp_batch(X, self.feat_quants)
+        else:
+            fps = normalizedfp_batch(X, self.feat_scaling, method=self.method)
+        if self.binary:
+            counts = np.count_nonzero(fps, axis=1)
+            self._counts[rows] = counts
+            if self._buckets is not None:
+                for row, count in zip(rows.tolist(), counts.tolist()):
+                    self._buckets.add(row, count)
+            if self.packed:
+                fps = pack_fp(fps)
+        self._fps[rows] = fps
+        self._stale[rows] = False
+        return len(rows)
+
+    @property
+    def fps(self):
+        """
+        Up to date fingerprint matrix, one row per entry of ids
+        """
+        self.refresh()
+        return self._fps[: len(self)]
+
+    def top_k(self, player, k=10, metric="tanimoto"):
+        """
+        Finds the k players most similar to a player in the store, leaving
+        the player out of its own matches
+
+        Parameters
+        ---------
+        player: str or int
+            player ID
+        k: int
+            number of matches to return
+        metric: str
+            tanimoto, jaccard, manhattan or cosine_sim
+
+        Returns
+        -------
+        ids: list
+            IDs of the k best matches, best first
+        scores: np.ndarray
+            scores of the k best matches
+        """
+        if metric not in HIGHER_IS_BETTER:
+            raise ValueError(
+                f"Invalid metric '{metric}'. Use one of {', '.join(HIGHER_IS_BETTER)}."
+            )
+        fps = self.fps
+        row = self._rows[player]
+        if self.binary and metric in ("tanimoto", "jaccard", "manhattan"):
+            if self._buckets is None:
+                self._buckets = _PopcountBuckets(self._counts[: len(self)], self.packed)
+            idx, scores = self._buckets.top_k(fps[row], fps, k + 1, metric)
+        else:
+            idx, scores = top_k(fps[row], fps, k=k + 1, metric=metric, packed=self.packed)
+        keep = idx != row
+        return [self.ids[i] for i in idx[keep][:k]], scores[keep][:k]
+
+    def to_index(self, names=None):
+        """
+        Snapshot of the store as a FingerprintIndex, e.g. to save it or to
+        run parallel searches
+
+        Parameters
+        ---------
+        names: list
+            player name of each row, in the order of ids
+
+        Returns
+        -------
+        index: FingerprintIndex
+            index of the current fingerprints
+        """
+        return FingerprintIndex(
+            self.fps.copy(),
+            list(self.ids),
+            names=names,
+            feat_quants=self.feat_quants if self.binary else None,
+            feat_scaling=None if self.binary else self.feat_scaling,
+            fp_type=self.fp_type,
+            packed=self.packed,
+            n_bits=self._n_bits() if self.binary else None,
+            method=None if self.binary else self.method,
+        )
+
+
+class _PopcountBuckets:
+    """
+    Rows of a FingerprintStore grouped by popcount, pruning searches like a
+    search.PopcountIndex but updated one row at a time instead of
+    re-sorting the whole store after every change. Buckets hold store rows,
+    and their fingerprints are gathered when searched.
+    """
+
+    def __init__(self, counts, packed):
+        self.packed = packed
+        self._count = {}
+        self._rows = {}
+        self._arrays = {}
+        for row, count in enumerate(counts.tolist()):
+            self.add(row, count)
+
+    def add(self, row, count):
+        """
+        Puts a row in the bucket of its popcount, leaving its old one
+        """
+        if self._count.get(row) == count:
+            return
+        self.remove(row)
+        self._count[row] = count
+        self._rows.setdefault(count, set()).add(row)
+        self._arrays.pop(count, None)
+
+    def remove(self, row):
+        """
+        Takes a row out of its bucket
+        """
+        count = self._count.pop(row, None)
+        if count is None:
+            return
+        bucket = self._rows[count]
+        bucket.discard(row)
+        if not bucket:
+            del self._rows[count]
+        self._arrays.pop(count, None)
+
+    def move(self, old, new):
+        """
+        Follows a fingerprint moved from row old to row new
+        """
+        count = self._count.get(old)
+        if count is not None:
+            self.remove(old)
+            self.add(new, count)
+
+    def _bucket_rows(self, count):
+        rows = self._arrays.get(count)
+        if rows is None:
+            rows = self._arrays[count] = np.sort(np.fromiter(self._rows[count], dtype=np.intp))
+        return rows
+
+    def top_k(self, query_fp, fps, k, metric):
+        """
+        Pruned search of the store's fingerprints fps, visiting the buckets
+        as search.top_k visits those of a PopcountIndex
+        """
+        counts = np.array(sorted(self._rows), dtype=np.int64)
+        query_count = popcount(query_fp) if self.packed else np.count_nonzero(query_fp)
+        bounds = _bounds(query_count, counts, metric)
+
+        def score_bucket(b):
+            rows = self._bucket_rows(int(counts[b]))
+            return rows, score_many(query_fp, fps[rows], metric=metric, packed=self.packed)
+
+        return _bucket_top_k(bounds, score_bucket, k, HIGHER_IS_BETTER[metric])
+
+
+def _crossed(values, old, new):
+    """
+    Rows whose value falls on different sides of an old and a new
+    threshold, i.e. whose x >= threshold bit flips
+    """
+    if old == new or (np.isnan(old) and np.isnan(new)):
+        return np.zeros(len(values), dtype=bool)
+    if np.isnan(old) or np.isnan(new):
+        return values >= (new if np.isnan(old) else old)
+    return (values >= min(old, new)) & (values < max(old, new))
@@ -0,0 +1,623 @@
+"""
+Season-by-season fingerprint trajectories and career matching
+"""
+
+import numpy as np
+
+from .index import build_index
+from .scoring import score_many, score_matrix
+from .search import HIGHER_IS_BETTER, _select
+from .utils.adapters import column_values
+
+
+class Trajectories:
+    """
+    Season fingerprints of many players stored back to back in one matrix,
+    ragged by player: the seasons of player i are the rows
+    offsets[i]:offsets[i + 1], in season order. No per-player arrays or
+    padding are kept, so gathering the s-th season of every player is a
+    single fancy index.
+
+    Parameters
+    ---------
+    fps: np.ndarray
+        (n_seasons, n_bits) fingerprint matrix, grouped by player
+    offsets: np.ndarray
+        (n_players + 1,) start row of each player, then the number of rows
+    ids: list
+        player ID of each trajectory
+    names: list
+        player name of each trajectory
+    keys: np.ndarray
+        (n_seasons,) order key of each season (e.g. year)
+    packed: bool
+        whether fps is packed with fingerprints.pack_fp
+    """
+
+    def __init__(self, fps, offsets, ids, names=None, keys=None, packed=False):
+        self.fps = np.asarray(fps)
+        self.offsets = np.asarray(offsets, dtype=np.intp)
+        if len(self.offsets) != len(ids) + 1 or self.offsets[-1] != len(self.fps):
+            raise ValueError("offsets must hold a start row per player and the number of rows.")
+        self.ids = list(ids)
+        self.names = None if names is None else list(names)
+        self.keys = None if keys is None else np.asarray(keys)
+        self.packed = packed
+        self._rows = {pid: i for i, pid in enumerate(self.ids)}
+        if self.names is not None:
+            for i, name in enumerate(self.names):
+                self._rows.setdefault(name, i)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def lengths(self):
+        """
+        Number of seasons of each player
+        """
+        return np.diff(self.offsets)
+
+    def row(self, player):
+        """
+        Position of a player, looked up by ID or name
+        """
+        return self._rows[player]
+
+    def __getitem__(self, player):
+        i = self.row(player)
+        return self.fps[self.offsets[i] : self.offsets[i + 1]]
+
+    @property
+    def career_seasons(self):
+        """
+        Career season of every row, counted from the player's first season
+        (keys minus the player's first key, so 0 for the first season). A
+        missed season leaves a gap instead of moving the later seasons up.
+        Row positions within each player when keys are missing or not
+        numeric.
+        """
+        if getattr(self, "_career", None) is None:
+            first = np.repeat(self.offsets[:-1], self.lengths)
+            if self.keys is None or self.keys.dtype.kind not in "iuf":
+                self._career = np.arange(len(self.fps)) - first
+            else:
+                self._career = (self.keys - self.keys[first]).astype(np.intp)
+        return self._career
+
+    @property
+    def censored(self):
+        """
+        Whether each player's first season is the first key of the table
+        (e.g. 2015 for the 2015-2025 exports). These careers may have
+        started earlier, so their first seasons in the table need not be
+        their first career seasons.
+        """
+        if self.keys is None or len(self.fps) == 0:
+            return np.zeros(len(self), dtype=bool)
+        first = self.keys[np.minimum(self.offsets[:-1], len(self.fps) - 1)]
+        return (first == self.keys.min()) & (self.lengths > 0)
+
+    def _window(self, seasons):
+        """
+        Number of rows of each player within its first seasons career
+        seasons (rows are in season order, so these lead every player)
+        """
+        return (self._season_rows()[:, :seasons] >= 0).sum(axis=1)
+
+    def _season_rows(self):
+        """
+        (n_players, n_career_seasons) row of every player's career seasons,
+        -1 for seasons the player missed
+        """
+        if getattr(self, "_table", None) is None:
+            career = self.career_seasons
+            n_seasons = int(career.max()) + 1 if len(career) else 0
+            self._table = np.full((len(self), n_seasons), -1, dtype=np.intp)
+            player = np.repeat(np.arange(len(self)), self.lengths)
+            self._table[player, career] = np.arange(len(career))
+        return self._table
+
+    def head(self, seasons):
+        """
+        Trajectories cut to the first career seasons of every player (see
+        career_seasons)
+
+        Parameters
+        ---------
+        seasons: int
+            number of career seasons to keep
+
+        Returns
+        -------
+        trajectories: Trajectories
+            first seasons of every player
+        """
+        lengths = self._window(seasons)
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        rows = _ragged_rows(self.offsets[:-1], lengths)
+        return Trajectories(
+            self.fps[rows],
+            offsets,
+            self.ids,
+            names=self.names,
+            keys=None if self.keys is None else self.keys[rows],
+            packed=self.packed,
+        )
+
+    def top_k(
+        self,
+        player,
+        k=10,
+        metric="tanimoto",
+        method="aligned",
+        seasons=None,
+        min_seasons=None,
+        weights=None,
+        skip_censored=False,
+    ):
+        """
+        Finds the k players whose trajectories best match a player's,
+        leaving the player out of its own matches
+
+        Seasons are counted from each player's first season in the table
+        (see career_seasons). Tables that start mid-career (e.g. 2015 for
+        the 2015-2025 exports) are left-censored: for a player already
+        active before the first year, the first seasons here are not the
+        first seasons of the career. Such players are flagged by censored
+        and can be left out of the matches with skip_censored; a censored
+        query is still compared from its first season in the table.
+
+        Ex:
+        whose first five seasons looked like this player's
+        traj.top_k("Judge, Aaron", k=10, seasons=5, skip_censored=True)
+
+        Parameters
+        ---------
+        player: str or int
+            player ID or name
+        k: int
+            number of matches to return
+        metric: str
+            tanimoto, jaccard, manhattan or cosine_sim
+        method: str
+            aligned (career season by career season, see aligned_top_k) or
+            dtw
+        seasons: int
+            compare only the first career seasons of every player
+        min_seasons: int
+            leave out players with fewer seasons (dtw, default 1) or fewer
+            career seasons in common with the query (aligned, default all
+            of the query's)
+        weights: np.ndarray
+            weight of each bit or dimension (see scoring.block_weights)
+        skip_censored: bool
+            leave out players whose first season is the table's first
+
+        Returns
+        -------
+        indices: np.ndarray
+            positions of the k best matching players, best first
+        scores: np.ndarray
+            mean season score (aligned) or DTW cost (dtw) of each match
+        """
+        i = self.row(player)
+        rows = np.arange(self.offsets[i], self.offsets[i + 1])
+        career = self.career_seasons[rows]
+        if seasons is not None:
+            rows, career = rows[career < seasons], career[career < seasons]
+        query = self.fps[rows]
+        exclude = [i]
+        if skip_censored:
+            exclude = np.union1d(exclude, np.flatnonzero(self.censored))
+        if method == "aligned":
+            return aligned_top_k(
+                query,
+                self,
+                k,
+                metric,
+                weights=weights,
+                exclude=exclude,
+                query_seasons=career,
+                min_seasons=min_seasons,
+            )
+        if method == "dtw":
+            min_seasons = 1 if min_seasons is None else min_seasons
+            return dtw_top_k(
+                query, self, k, metric, seasons, min_seasons, weights=weights, exclude=exclude
+            )
+        raise ValueError("Invalid method. Use 'aligned' or 'dtw'.")
+
+
+def _ragged_rows(starts, lengths):
+    """
+    Rows starts[i] .. starts[i] + lengths[i] of every group, concatenated
+    """
+    total = int(lengths.sum())
+    group_starts = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    return group_starts + np.arange(total)
+
+
+def build_trajectories(
+    data,
+    id_col,
+    order_col="year",
+    name_col=None,
+    feat_quants=None,
+    feat_scaling=None,
+    fp_type="binary",
+    method="zscore",
+    pack=True,
+):
+    """
+    Fingerprints every season of a per-season table (one row per player
+    and season, e.g. the Savant 2015-2025 exports) and groups the seasons
+    of each player into a trajectory ordered by order_col
+
+    Parameters
+    ---------
+    data: pd.DataFrame, pl.DataFrame or pa.Table
+        per-season player data
+    id_col: str
+        column holding the player IDs
+    order_col: str
+        column to order each player's seasons by
+    name_col: str
+        column holding the player names
+    feat_quants: dict
+        dictionary of features and their quantiles (binary and binned)
+    feat_scaling: dict
+        dictionary of features and their scaling parameters (normalized)
+    fp_type: str
+        fingerprint type (binary, binned or normalized)
+    method: str
+        scaling method for normalized fingerprints (minmax or zscore)
+    pack: bool
+        pack binary and binned fingerprints with fingerprints.pack_fp
+
+    Returns
+    -------
+    trajectories: Trajectories
+        season fingerprints of every player
+    """
+    index = build_index(
+        data,
+        id_col,
+        name_col,
+        feat_quants=feat_quants,
+        feat_scaling=feat_scaling,
+        fp_type=fp_type,
+        method=method,
+        pack=pack,
+    )
+    positions = {}
+    codes = np.array(
+        [positions.setdefault(pid, len(positions)) for pid in index.ids], dtype=np.intp
+    )
+    keys = np.asarray(column_values(data, order_col))
+    order = np.lexsort((keys, codes))
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(positions)))])
+    names = None
+    if index.names is not None:
+        names = [index.names[row] for row in order[offsets[:-1]]]
+    return Trajectories(
+        index.fps[order],
+        offsets,
+        list(positions),
+        names=names,
+        keys=keys[order],
+        packed=index.packed,
+    )
+
+
+def _candidates(trajectories, min_length, exclude):
+    keep = trajectories.lengths >= min_length
+    if exclude is not None:
+        keep[exclude] = False
+    return np.flatnonzero(keep)
+
+
+def aligned_top_k(
+    query,
+    trajectories,
+    k=10,
+    metric="tanimoto",
+    weights=None,
+    exclude=None,
+    query_seasons=None,
+    min_seasons=None,
+):
+    """
+    Finds the players whose careers best match the query season by season,
+    aligned on career seasons (see Trajectories.career_seasons): first
+    season against first season, fifth against fifth, even when either
+    player missed a season in between. Seasons missed by either player are
+    not compared, and the score is the mean score of the seasons both
+    played. Careers are counted from the first season in the table, so for
+    left-censored players (see Trajectories.censored) they start at the
+    table's first year rather than at their debut.
+
+    Every season is scored for all remaining players at once, and players
+    are abandoned as soon as the best mean they can still reach (season
+    scores are at most 1, distances at least 0) cannot beat the current
+    k-th best. Results are identical to scoring every season of every
+    player, with ties going to the lower position.
+
+    Parameters
+    ---------
+    query: np.ndarray
+        (n_seasons, n_bits) season fingerprints of the query player
+    trajectories: Trajectories
+        trajectories to search
+    k: int
+        number of matches to return
+    metric: str
+        tanimoto, jaccard, manhattan or cosine_sim
+    weights: np.ndarray
+        weight of each bit or dimension (see scoring.block_weights)
+    exclude: int or list
+        positions of players to leave out (e.g. the query player)
+    query_seasons: np.ndarray
+        (n_seasons,) increasing career season of each query season;
+        0, 1, 2, ... by default
+    min_seasons: int
+        leave out players sharing fewer career seasons with the query;
+        all of the query's seasons by default
+
+    Returns
+    -------
+    indices: np.ndarray
+        positions of the k best matching players, best first
+    scores: np.ndarray
+        mean season score of each match
+    """
+    if metric not in HIGHER_IS_BETTER:
+        raise ValueError(
+            f"Invalid metric '{metric}'. Use one of {', '.join(HIGHER_IS_BETTER)}."
+        )
+    if k < 1:
+        raise ValueError("k must be at least 1.")
+    query = np.asarray(query)
+    n_seasons = len(query)
+    if n_seasons == 0:
+        raise ValueError("The query needs at least one season.")
+    if query_seasons is None:
+        query_seasons = np.arange(n_seasons)
+    query_seasons = np.asarray(query_seasons, dtype=np.intp)
+    if len(query_seasons) != n_seasons:
+        raise ValueError("query_seasons must hold a career season per query season.")
+    min_seasons = n_seasons if min_seasons is None else min(max(min_seasons, 1), n_seasons)
+    higher = HIGHER_IS_BETTER[metric]
+    fps, packed = trajectories.fps, trajectories.packed
+
+    # row of every player's season at each of the query's career seasons
+    table = trajectories._season_rows()
+    inside = query_seasons < table.shape[1]
+    if inside.all():
+        rows = table[:, query_seasons]
+    else:
+        # query seasons past every career are played by nobody
+        rows = np.full((len(table), n_seasons), -1, dtype=np.intp)
+        rows[:, inside] = table[:, query_seasons[inside]]
+    played = rows >= 0
+    shared = played.sum(axis=1)
+    keep = shared >= min_seasons
+    if exclude is not None:
+        keep[exclude] = False
+    cand = np.flatnonzero(keep)
+    rows, played, shared = rows[cand], played[cand], shared[cand]
+    # shared seasons from season s on, for the pruning bound
+    left = np.cumsum(played[:, ::-1], axis=1)[:, ::-1]
+
+    def season_scores(s, players):
+        # score of season s for each player, 0 where the player missed it
+        has = played[players, s]
+        if has.all():
+            return score_many(
+                query[s], fps[rows[players, s]], metric=metric, packed=packed, weights=weights
+            )
+        scores = np.zeros(len(players))
+        if has.any():
+            season = fps[rows[players[has], s]]
+            scores[has] = score_many(
+                query[s], season, metric=metric, packed=packed, weights=weights
+            )
+        return scores
+
+    # fully score the k best first seasons to get a k-th best to prune by
+    everyone = np.arange(len(cand))
+    first = season_scores(0, everyone)
+    seed, _ = _select(np.where(played[:, 0], first, np.nan), everyone, k, higher)
+    seed_totals = first[seed]
+    for s in range(1, n_seasons):
+        seed_totals = seed_totals + season_scores(s, seed)
+
+    rest = np.ones(len(cand), dtype=bool)
+    rest[seed] = False
+    active = np.flatnonzero(rest)
+    totals = first[active]
+    kth = None
+    if len(seed) == k:
+        kth = _select(seed_totals / shared[seed], seed, k, higher)[1][-1]
+    for s in range(1, n_seasons):
+        if kth is not None and len(active):
+            if higher:
+                # every remaining shared season scores at most 1
+                keep = ~((totals + left[active, s]) / shared[active] < kth - 1e-9)
+            else:
+                keep = ~(totals / shared[active] > kth + 1e-9)
+            active, totals = active[keep], totals[keep]
+        totals = totals + season_scores(s, active)
+
+    positions = np.concatenate([seed, active]).astype(np.intp)
+    scores = np.concatenate([seed_totals, totals]) / shared[positions]
+    return _select(scores, cand[positions], k, higher)
+
+
+def _local_costs(query, fps, metric, packed, weights):
+    """
+    Cost of matching every query season with every season in fps:
+    1 - similarity, or the manhattan distance
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores = score_matrix(query, fps, metric=metric, packed=packed, weights=weights)
+    if HIGHER_IS_BETTER[metric]:
+        # seasons with no bits or zero norm do not match anything
+        return np.where(np.isnan(scores), 1.0, 1.0 - scores)
+    return scores
+
+
+def _dtw(costs, kth=np.inf):
+    """
+    Dynamic time warping cost of many candidates of the same length at once,
+    from their (n_candidates, n_query, n_seasons) local costs. Candidates
+    whose cheapest partial alignment already costs more than kth are
+    abandoned and get an inf cost.
+    """
+    n, a, b = costs.shape
+    result = np.full(n, np.inf)
+    alive = np.arange(n)
+    acc = np.full((n, b + 1), np.inf)
+    acc[:, 0] = 0.0
+    for i in range(a):
+        prev = acc
+        acc = np.full((len(alive), b + 1), np.inf)
+        for j in range(1, b + 1):
+            best = np.minimum(np.minimum(prev[:, j], prev[:, j - 1]), acc[:, j - 1])
+            acc[:, j] = costs[alive, i, j - 1] + best
+        # costs only grow along an alignment, so the row minimum bounds it
+        keep = acc[:, 1:].min(axis=1) <= kth
+        if not keep.all():
+            alive, acc = alive[keep], acc[keep]
+    result[alive] = acc[:, b]
+    return result
+
+
+def dtw_top_k(
+    query,
+    trajectories,
+    k=10,
+    metric="tanimoto",
+    seasons=None,
+    min_seasons=1,
+    weights=None,
+    exclude=None,
+):
+    """
+    Finds the players whose trajectories best match the query under
+    dynamic time warping, so careers that develop at different speeds can
+    still line up. The local cost of matching two seasons is 1 - score for
+    tanimoto, jaccard and cosine_sim and the distance for manhattan; the
+    DTW cost (lower is better) is the smallest total cost of a monotone
+    alignment of all seasons of both players.
+
+    All season-to-season costs come from one score_matrix call. Players are
+    then visited in order of a lower bound on their DTW cost (each season
+    of either player is matched at least once) in vectorized chunks, and
+    the search stops once the bound of the next player cannot beat the
+    current k-th best. Within a chunk, players are abandoned as soon as
+    every partial alignment already costs more than the k-th best.
+
+    Parameters
+    ---------
+    query: np.ndarray
+        (n_seasons, n_bits) season fingerprints of the query player
+    trajectories: Trajectories
+        trajectories to search
+    k: int
+        number of matches to return
+    metric: str
+        tanimoto, jaccard, manhattan or cosine_sim
+    seasons: int
+        compare only the first seasons of the query and the first career
+        seasons (see Trajectories.career_seasons) of every player
+    min_seasons: int
+        leave out players with fewer seasons
+    weights: np.ndarray
+        weight of each bit or dimension (see scoring.block_weights)
+    exclude: int or list
+        positions of players to leave out (e.g. the query player)
+
+    Returns
+    -------
+    indices: np.ndarray
+        positions of the k best matching players, best first
+    scores: np.ndarray
+        DTW cost of each match
+    """
+    if metric not in HIGHER_IS_BETTER:
+        raise ValueError(
+            f"Invalid metric '{metric}'. Use one of {', '.join(HIGHER_IS_BETTER)}."
+        )
+    if k < 1:
+        raise ValueError("k must be at least 1.")
+    query = np.asarray(query)
+    if seasons is not None:
+        query = query[:seasons]
+    if len(query) == 0:
+        raise ValueError("The query needs at least one season.")
+    cand = _candidates(trajectories, max(min_seasons, 1), exclude)
+    if len(cand) == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0)
+    lengths = trajectories.lengths[cand]
+    if seasons is not None:
+        lengths = trajectories._window(seasons)[cand]
+    rows = _ragged_rows(trajectories.offsets[cand], lengths)
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.intp)
+
+    costs = _local_costs(query, trajectories.fps[rows], metric, trajectories.packed, weights)
+    bound = np.maximum(
+        np.minimum.reduceat(costs, starts, axis=1).sum(axis=0),
+        np.add.reduceat(costs.min(axis=0), starts),
+    )
+    visit = np.argsort(bound, kind="stable")
+
+    best_idx = np.empty(0, dtype=np.intp)
+    best_scores = np.empty(0)
+    chunk = max(4 * k, 256)
+    for lo in range(0, len(visit), chunk):
+        order = visit[lo : lo + chunk]
+        kth = best_scores[-1] if len(best_idx) == k else np.inf
+        order = order[bound[order] <= kth]
+        if len(order) == 0:
+            break
+        for length in np.unique(lengths[order]):
+            group = order[lengths[order] == length]
+            cols = starts[group, None] + np.arange(length)
+            dtw = _dtw(costs[:, cols].transpose(1, 0, 2), kth)
+            best_idx, best_scores = _select(
+                np.concatenate([best_scores, dtw]),
+                np.concatenate([best_idx, cand[group]]),
+                k,
+                False,
+            )
+            kth = best_scores[-1] if len(best_idx) == k else np.inf
+
+    return best_idx, best_scores
+
+
+def dtw_distance(a, b, metric="tanimoto", packed=False, weights=None):
+    """
+    Dynamic time warping cost between two trajectories, as used by
+    dtw_top_k
+
+    Parameters
+    ---------
+    a: np.ndarray
+        (n_seasons, n_bits) season fingerprints of player 1
+    b: np.ndarray
+        (n_seasons, n_bits) season fingerprints of player 2
+    metric: str
+        tanimoto, jaccard, manhattan or cosine_sim
+    packed: bool
+        whether the fingerprints are packed with fingerprints.pack_fp
+    weights: np.ndarray
+        weight of each bit or dimension (see scoring.block_weights)
+
+    Returns
+    -------
+    cost: float
+        DTW cost, 0 for identical trajectories
+    """
+    costs = _local_costs(np.asarray(a), np.asarray(b), metric, packed, weights)
+    return float(_dtw(costs[None])[0])
@@ -2,4 +2,19 @@
 Initialze functions
 """
 
-from . import features
+import importlib
+
+
+__all__ = ["adapters", "features", "io", "stats"]
+
+
+def __getattr__(name):
+    if name not in __all__:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(f".{name}", __name__)
+    globals()[name] = module
+    return module
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,97 @@
+"""
+Columnar input adapters for NumPy, pandas, polars and pyarrow
+"""
+
+import numpy as np
+
+
+def _backend(data):
+    """
+    Name of the library that defines the type of data, found without
+    importing that library
+    """
+    return type(data).__module__.split(".")[0]
+
+
+def to_feature_matrix(data, features, dtype=float):
+    """
+    Pulls the requested feature columns of a table into one 2-D array
+    without building a Python object per row. Tables come back with every
+    feature column contiguous in memory (column-major), the order the
+    fingerprint kernels read them in. When the requested pandas columns all
+    live in one block of the requested dtype, the result is a read-only
+    view of that block and nothing is copied; other tables are copied once.
+    Arrays are returned as they are when already of the requested dtype.
+    pandas, polars and pyarrow are never imported here; the backend is
+    recognized from the type of data.
+
+    Parameters
+    ---------
+    data: np.ndarray, pd.DataFrame, pl.DataFrame, pa.Table, dict or row
+        player data; a 2-D array must already hold the features as columns
+        in the order given, and a single row (dict or pd.Series of scalars)
+        becomes a one row matrix
+    features: list
+        list of feature names to extract
+    dtype: np.dtype
+        floating point dtype of the result
+
+    Returns
+    -------
+    X: np.ndarray
+        (n_players, n_features) array
+    """
+
+    features = list(features)
+    if isinstance(data, np.ndarray):
+        X = np.asarray(data, dtype=dtype)
+        if X.ndim != 2 or X.shape[1] != len(features):
+            raise ValueError(
+                f"Expected a 2-D array with {len(features)} feature columns, "
+                f"got shape {X.shape}."
+            )
+        return X
+
+    backend = _backend(data)
+    if backend == "pandas" and hasattr(data, "columns"):
+        return data[features].to_numpy(dtype=dtype, na_value=np.nan)
+    if backend == "polars":
+        X = data.select(features).to_numpy()
+        return np.asfortranarray(X, dtype=dtype)
+    if backend == "pyarrow":
+        X = np.empty((data.num_rows, len(features)), dtype=dtype, order="F")
+        for j, feat in enumerate(features):
+            X[:, j] = data.column(feat).to_numpy()
+        return X
+
+    # mapping of columns, or a single row of scalars
+    columns = [data[feat] for feat in features]
+    if columns and np.ndim(columns[0]) == 0:
+        return np.array([columns], dtype=dtype)
+    X = np.empty((len(columns[0]) if columns else 0, len(features)), dtype=dtype, order="F")
+    for j, column in enumerate(columns):
+        X[:, j] = np.asarray(column, dtype=dtype)
+
+    return X
+
+
+def column_values(data, column):
+    """
+    Values of a single (non-feature) column, e.g. player IDs or names, as a
+    list
+
+    Parameters
+    ---------
+    data: pd.DataFrame, pl.DataFrame, pa.Table or dict
+        player data
+    column: str
+        column name
+
+    Returns
+    -------
+    values: list
+        column values
+    """
+    if _backend(data) == "pyarrow":
+        return data.column(column).to_pylist()
+    return list(data[column])
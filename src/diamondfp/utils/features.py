@@ -2,19 +2,33 @@
 Feature prep and generation methods
 """
 
+import contextlib
+import time
+import tracemalloc
+
 import numpy as np
 
+from .. import _backends
+from ..profiling import instrument, track_peak
+from .adapters import to_feature_matrix
+
 
-def generate_quantiles(data, stat_features):
+@instrument("features.generate_quantiles", rows_arg=0)
+def generate_quantiles(data, stat_features, skipna=False):
     """
     Generate features and quantiles to use for fingerprinting
 
     Parameters
     ---------
-    data: dictionary
-        dictionary  to calc quantiles from
+    data: pd.DataFrame, pl.DataFrame, pa.Table, dict or np.ndarray
+        data to calc quantiles from; the feature columns are pulled into
+        one matrix (a 2-D array must hold them in the order of
+        stat_features) and the quantiles of every feature are computed in
+        a single call
     stat_features: dict
         dictionary containing stats and quantiles of interest
+    skipna: bool
+        ignore NaNs (np.nanquantile) instead of propagating them
 
     Returns
     -------
@@ -22,27 +36,27 @@ def generate_quantiles(data, stat_features):
         dictionary of features and their quantiles
     """
 
+    quantile = np.nanquantile if skipna else np.quantile
+    X = to_feature_matrix(data, stat_features.keys())
+    levels = sorted({q for quants in stat_features.values() for q in quants})
+    table = quantile(X, levels, axis=0)
+    level_row = {q: i for i, q in enumerate(levels)}
     feat_quants = {}
-    features = stat_features.keys()
-    for feat in features:
-        quants = stat_features[feat]
-        feat_v = []
-        for q in quants:
-            qv = np.quantile(data[feat], q)
-            feat_v.append(qv)
-        feat_quants[feat] = feat_v
+    for j, (feat, quants) in enumerate(stat_features.items()):
+        feat_quants[feat] = [float(table[level_row[q], j]) for q in quants]
 
     return feat_quants
 
 
+@instrument("features.feature_scaling", rows_arg=0)
 def feature_scaling(data, features, method="zscore"):
     """
     Generate feature scaling parameters for normalization
 
     Parameters
     ---------
-    data: dictionary
-        dictionary to calc quantiles from
+    data: pd.DataFrame, pl.DataFrame, pa.Table, dict or np.ndarray
+        data to calc scaling parameters from
     features: list
         list of features to scale
     method: str
@@ -54,59 +68,163 @@ def feature_scaling(data, features, method="zscore"):
         dictionary of features and their scaling parameters
     """
 
-    feat_scaling = {}
-    for feat in features:
-        values = np.array(data[feat])
-        # use np.nan* to ignore NaNs in calculations
-        if method == "minmax":
-            min_v = float(np.nanmin(values))
-            max_v = float(np.nanmax(values))
-            feat_scaling[feat] = (min_v, max_v)
-        elif method == "zscore":
-            mean_v = float(np.nanmean(values))
-            std_v = float(np.nanstd(values, ddof=0))
-            feat_scaling[feat] = (mean_v, std_v)
-        else:
-            raise ValueError("Invalid scaling method. Use 'minmax' or 'zscore'.")
-
+    features = list(features)
+    X = to_feature_matrix(data, features)
+    # use np.nan* to ignore NaNs in calculations
+    if method == "minmax":
+        first = np.nanmin(X, axis=0)
+        second = np.nanmax(X, axis=0)
+    elif method == "zscore":
+        first = np.nanmean(X, axis=0)
+        second = np.nanstd(X, axis=0, ddof=0)
+    else:
+        raise ValueError("Invalid scaling method. Use 'minmax' or 'zscore'.")
 
+    feat_scaling = {
+        feat: (float(first[j]), float(second[j])) for j, feat in enumerate(features)
+    }
     return feat_scaling
 
 
-def create_archetypes(data, features, k=5, method="kmeans"):
+def _complete_rows(data, features, sample_size, random_state):
+    """
+    Feature matrix of the rows without NaNs, optionally subsampled
+    """
+    X = to_feature_matrix(data, features)
+    X = X[~np.isnan(X).any(axis=1)]
+    if sample_size is not None and len(X) > sample_size:
+        rng = np.random.default_rng(random_state)
+        X = X[np.sort(rng.choice(len(X), size=sample_size, replace=False))]
+    return X
+
+
+def _is_chunks(data):
+    """
+    Whether data is an iterable of tables (e.g. a generator or a chunked
+    CSV reader) rather than a single table, dict of columns or array
+    """
+    if isinstance(data, (dict, np.ndarray)) or hasattr(data, "columns"):
+        return False
+    return hasattr(data, "__iter__")
+
+
+@instrument("features.create_archetypes", rows_arg=0)
+def create_archetypes(
+    data,
+    features,
+    k=5,
+    method="kmeans",
+    sample_size=None,
+    init=None,
+    batch_size=1024,
+    random_state=42,
+    return_info=False,
+):
     """
     Helper function to generate archetypes from a dataset.
 
     Parameters
     ---------
-    data: pd.DataFrame
-        DataFrame of player stats
+    data: pd.DataFrame, pl.DataFrame, pa.Table, dict or an iterable of them
+        table of player stats; with method 'minibatch' an iterable of
+        chunks is streamed through partial_fit
     features: list
         List of feature names to use
     k: int
         Number of archetypes to find
     method: str
-        Clustering method (currently only 'kmeans')
+        Clustering method ('kmeans' for full-batch KMeans or 'minibatch' for
+        MiniBatchKMeans)
+    sample_size: int
+        Cluster a random sample of this many rows instead of every row;
+        when streaming chunks, a sample of this many rows from each chunk
+    init: pd.DataFrame
+        Previous archetypes (e.g. last season's) to warm start from
+    batch_size: int
+        Mini-batch size for 'minibatch'
+    random_state: int
+        Seed for sampling and clustering
+    return_info: bool
+        Also return fit time, peak traced memory and inertia
 
     Returns
     -------
     archetypes: pd.DataFrame
         DataFrame of archetype centroids
+    info: dict
+        Only if return_info; method, k, n_samples, fit_time (s),
+        peak_memory (bytes traced by tracemalloc), inertia over the
+        clustered rows (NaN when streamed) and n_iter. tracemalloc runs
+        during the fit, so fit_time includes its overhead and is only
+        comparable with other return_info fits.
     """
-    from sklearn.cluster import KMeans
-    import pandas as pd
-    
-    X = data[features].dropna()
-    
-    if method == "kmeans":
-        kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
-        kmeans.fit(X)
-        centroids = kmeans.cluster_centers_
-        
-        # Create meaningful names or just indices
-        archetypes = pd.DataFrame(centroids, columns=features)
-        archetypes.index = [f"Archetype_{i}" for i in range(k)]
-        
+    if method not in ("kmeans", "minibatch"):
+        raise ValueError("Method not supported. Use 'kmeans' or 'minibatch'.")
+    streamed = _is_chunks(data)
+    if streamed and method != "minibatch":
+        raise ValueError("Streamed chunks need method 'minibatch'.")
+
+    init_centers = "k-means++"
+    n_init = 10 if method == "kmeans" else 3
+    if init is not None:
+        init_centers = np.asarray(init[features], dtype=float)
+        if init_centers.shape[0] != k:
+            raise ValueError(f"Got {init_centers.shape[0]} initial archetypes for k={k}.")
+        n_init = 1
+
+    tracker = contextlib.nullcontext()
+    if return_info:
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        tracker = track_peak()
+        start = time.perf_counter()
+
+    with tracker as peak:
+        if method == "kmeans":
+            model = _backends.sklearn_cluster.KMeans(
+                n_clusters=k, init=init_centers, random_state=random_state, n_init=n_init
+            )
+        else:
+            model = _backends.sklearn_cluster.MiniBatchKMeans(
+                n_clusters=k,
+                init=init_centers,
+                batch_size=batch_size,
+                random_state=random_state,
+                n_init=n_init,
+            )
+
+        if streamed:
+            n_samples = 0
+            for chunk in data:
+                X = _complete_rows(chunk, features, sample_size, random_state)
+                model.partial_fit(X)
+                n_samples += len(X)
+        else:
+            X = _complete_rows(data, features, sample_size, random_state)
+            model.fit(X)
+            n_samples = len(X)
+
+    # Create meaningful names or just indices
+    archetypes = _backends.pd.DataFrame(model.cluster_centers_, columns=features)
+    archetypes.index = [f"Archetype_{i}" for i in range(k)]
+
+    if not return_info:
         return archetypes
-    else:
-        raise ValueError("Method not supported. Use 'kmeans'.")
+
+    fit_time = time.perf_counter() - start
+    peak_memory = peak.bytes
+    if not tracing:
+        tracemalloc.stop()
+    info = {
+        "method": method,
+        "k": k,
+        "n_samples": n_samples,
+        "fit_time": fit_time,
+        "peak_memory": peak_memory,
+        # a streamed fit never sees all rows at once to measure inertia
+        "inertia": np.nan if streamed else float(model.inertia_),
+        "n_iter": int(getattr(model, "n_iter_", getattr(model, "n_steps_", 0))),
+    }
+
+    return archetypes, info
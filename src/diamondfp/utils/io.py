@@ -0,0 +1,159 @@
+"""
+Chunked, typed loading of Baseball Savant style CSV exports
+"""
+
+import numpy as np
+
+from .. import _backends
+from .adapters import to_feature_matrix
+from .stats import OnlineFeatureStats
+
+
+# columns holding innings pitched in thirds notation ("194.2" = 194 2/3)
+SAVANT_INNINGS_COLUMNS = ("p_formatted_ip",)
+
+
+def innings_to_float(innings):
+    """
+    Converts innings pitched from thirds notation, where the digit after
+    the point counts outs ("194.2" is 194 innings and 2 outs), to innings
+
+    Parameters
+    ---------
+    innings: float, str, list or np.ndarray
+        innings in thirds notation
+
+    Returns
+    -------
+    innings: float or np.ndarray
+        innings as fractional numbers (194.2 -> 194.667)
+    """
+    values = np.asarray(innings, dtype=float)
+    whole = np.trunc(values)
+    outs = np.round((values - whole) * 10)
+    if np.any(outs > 2):
+        raise ValueError("Innings must be in thirds notation (.0, .1 or .2).")
+    return (whole + outs / 3)[()]
+
+
+def read_savant_csv(
+    path, features=None, id_cols=None, chunk_size=None, innings_cols=SAVANT_INNINGS_COLUMNS
+):
+    """
+    Reads a Savant style CSV export. The byte order mark is skipped, quoted
+    numbers (".240", "98.563404126") are parsed as floats by the CSV parser
+    and innings columns are converted from thirds notation. With chunk_size
+    the file is read lazily, one fixed-size chunk at a time, so memory use
+    does not grow with the file.
+
+    Parameters
+    ---------
+    path: str
+        CSV file
+    features: list
+        numeric columns to load as float64, all columns (with inferred
+        types) if None
+    id_cols: list
+        other columns to keep as they are (e.g. player_id, names); only
+        used with features
+    chunk_size: int
+        rows per chunk, None reads the whole file at once
+    innings_cols: list
+        columns in innings thirds notation, converted where present
+
+    Returns
+    -------
+    data: pd.DataFrame or iterator of pd.DataFrame
+        the whole file, or an iterator over chunks of chunk_size rows
+    """
+    pd = _backends.pd
+    kwargs = {"encoding": "utf-8-sig", "chunksize": chunk_size}
+    if features is not None:
+        features = list(features)
+        kwargs["usecols"] = list(id_cols or []) + features
+        kwargs["dtype"] = {feat: np.float64 for feat in features}
+
+    reader = pd.read_csv(path, **kwargs)
+    if chunk_size is None:
+        return _convert_innings(reader, innings_cols)
+    return (_convert_innings(chunk, innings_cols) for chunk in reader)
+
+
+def _convert_innings(chunk, innings_cols):
+    for col in innings_cols:
+        if col in chunk.columns:
+            chunk[col] = innings_to_float(chunk[col].to_numpy())
+    return chunk
+
+
+def iter_feature_chunks(
+    path, features, chunk_size=100_000, id_col=None, innings_cols=SAVANT_INNINGS_COLUMNS
+):
+    """
+    Streams a Savant style CSV as fixed-size feature matrices, ready for
+    the batch fingerprint functions and OnlineFeatureStats.partial_fit
+
+    Ex:
+    stats = scan_stats("pitches.csv", features)
+    feat_quants = stats.generate_quantiles(stat_features)
+    for ids, X in iter_feature_chunks("pitches.csv", features, id_col="player_id"):
+        fps = binaryfp_batch(X, feat_quants)
+
+    Parameters
+    ---------
+    path: str
+        CSV file
+    features: list
+        feature columns, in the order of the matrix columns
+    chunk_size: int
+        rows per chunk
+    id_col: str
+        column of player IDs to yield with each chunk
+    innings_cols: list
+        columns in innings thirds notation, converted where present
+
+    Yields
+    -------
+    ids: np.ndarray
+        player IDs of the chunk rows, None without id_col
+    X: np.ndarray
+        (chunk rows, n_features) float matrix
+    """
+    features = list(features)
+    id_cols = [] if id_col is None else [id_col]
+    for chunk in read_savant_csv(path, features, id_cols, chunk_size, innings_cols):
+        ids = None if id_col is None else chunk[id_col].to_numpy()
+        yield ids, to_feature_matrix(chunk, features)
+
+
+def scan_stats(
+    path, features, chunk_size=100_000, k=200, seed=None, innings_cols=SAVANT_INNINGS_COLUMNS
+):
+    """
+    Computes the feature statistics of a Savant style CSV in one pass over
+    fixed-size chunks
+
+    Parameters
+    ---------
+    path: str
+        CSV file
+    features: list
+        features to track
+    chunk_size: int
+        rows per chunk
+    k: int
+        accuracy parameter of the quantile sketches
+    seed: int
+        seed for the quantile sketches
+    innings_cols: list
+        columns in innings thirds notation, converted where present
+
+    Returns
+    -------
+    stats: OnlineFeatureStats
+        statistics of every row, for feature_scaling and generate_quantiles
+    """
+    stats = OnlineFeatureStats(features, k=k, seed=seed)
+    for _, X in iter_feature_chunks(path, features, chunk_size, innings_cols=innings_cols):
+        stats.partial_fit(X)
+    return stats
@@ -0,0 +1,256 @@
+"""
+Streaming feature statistics for incremental updates
+"""
+
+import numpy as np
+
+from .adapters import to_feature_matrix
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch (Karnin, Lang & Liberty, 2016). Keeps a bounded
+    number of weighted samples so quantiles can be estimated over a stream
+    of any length with a rank error of roughly 1.7 / k, and sketches built
+    on separate partitions can be merged. Quantiles are exact (and match
+    np.quantile) until more than k values have been seen.
+
+    Parameters
+    ---------
+    k: int
+        accuracy parameter, larger is more accurate and uses more memory
+    seed: int
+        seed for the random compaction offsets
+    """
+
+    _DECAY = 2.0 / 3.0
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * self._DECAY**depth)))
+
+    def _compress(self):
+        while sum(len(items) for items in self.levels) > sum(
+            self._capacity(h) for h in range(len(self.levels))
+        ):
+            for h, items in enumerate(self.levels):
+                if len(items) >= self._capacity(h):
+                    break
+            if h + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(items)
+            # an odd item out stays behind at this level
+            keep = items[len(items) - len(items) % 2 :]
+            pairs = items[: len(items) - len(items) % 2]
+            promoted = pairs[self._rng.integers(2) :: 2]
+            self.levels[h] = keep
+            self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+
+    def update(self, values):
+        """
+        Adds a batch of values to the sketch, NaNs are ignored
+
+        Parameters
+        ---------
+        values: list or np.ndarray
+            new values
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """
+        Merges another sketch into this one
+
+        Parameters
+        ---------
+        other: KLLSketch
+            sketch built on another partition of the data
+        """
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        """
+        Estimates quantiles of all values seen so far
+
+        Parameters
+        ---------
+        q: float or list
+            quantile(s) between 0 and 1
+
+        Returns
+        -------
+        values: float or np.ndarray
+            estimated quantile(s), NaN when the sketch is empty
+        """
+        if self.n == 0:
+            return np.full(np.shape(q), np.nan)[()]
+        items = np.concatenate(self.levels)
+        weights = np.concatenate(
+            [np.full(len(level), 2.0**h) for h, level in enumerate(self.levels)]
+        )
+        order = np.argsort(items, kind="stable")
+        items, weights = items[order], weights[order]
+        # each item stands for `weight` consecutive ranks; place it at their
+        # center so unit weights reproduce np.quantile's linear interpolation
+        cum = np.cumsum(weights)
+        positions = cum - (weights + 1) / 2
+        target = np.asarray(q, dtype=float) * (cum[-1] - 1)
+        return np.interp(target, positions, items)
+
+
+class OnlineFeatureStats:
+    """
+    Incrementally updated per-feature statistics. Tracks the count, mean and
+    variance (Welford/Chan updates), min/max and a KLL quantile sketch of
+    each feature so feat_scaling and feat_quants can be refreshed from new
+    batches, or merged across partitions, without rescanning history.
+    NaNs are ignored as in feature_scaling.
+
+    Parameters
+    ---------
+    features: list
+        list of features to track
+    k: int
+        accuracy parameter of the quantile sketches
+    seed: int
+        seed for the quantile sketches
+    """
+
+    def __init__(self, features, k=200, seed=None):
+        self.features = list(features)
+        n_feats = len(self.features)
+        self.count = np.zeros(n_feats)
+        self.mean = np.zeros(n_feats)
+        self.m2 = np.zeros(n_feats)
+        self.min = np.full(n_feats, np.inf)
+        self.max = np.full(n_feats, -np.inf)
+        seeds = np.random.SeedSequence(seed).spawn(n_feats)
+        self.sketches = [KLLSketch(k, seed=s) for s in seeds]
+
+    def _combine(self, count, mean, m2, min_v, max_v):
+        total = self.count + count
+        safe_total = np.where(total == 0, 1, total)
+        delta = mean - self.mean
+        self.mean = self.mean + delta * count / safe_total
+        self.m2 = self.m2 + m2 + delta**2 * self.count * count / safe_total
+        self.count = total
+        self.min = np.fmin(self.min, min_v)
+        self.max = np.fmax(self.max, max_v)
+
+    def partial_fit(self, data):
+        """
+        Updates the statistics with a new batch of rows
+
+        Parameters
+        ---------
+        data: pd.DataFrame, pl.DataFrame, pa.Table, dict or np.ndarray
+            new rows; a 2-D array must hold the features as columns in the
+            same order as features
+
+        Returns
+        -------
+        self: OnlineFeatureStats
+            updated statistics
+        """
+        X = to_feature_matrix(data, self.features)
+        valid = ~np.isnan(X)
+        count = valid.sum(axis=0).astype(float)
+        filled = np.where(valid, X, 0.0)
+        mean = filled.sum(axis=0) / np.where(count == 0, 1, count)
+        m2 = (np.where(valid, X - mean, 0.0) ** 2).sum(axis=0)
+        min_v = np.where(valid, X, np.inf).min(axis=0, initial=np.inf)
+        max_v = np.where(valid, X, -np.inf).max(axis=0, initial=-np.inf)
+        self._combine(count, mean, m2, min_v, max_v)
+        for j, sketch in enumerate(self.sketches):
+            sketch.update(X[valid[:, j], j])
+        return self
+
+    def merge(self, other):
+        """
+        Merges statistics computed on another partition of the data
+
+        Parameters
+        ---------
+        other: OnlineFeatureStats
+            statistics over the same features
+
+        Returns
+        -------
+        self: OnlineFeatureStats
+            merged statistics
+        """
+        if other.features != self.features:
+            raise ValueError("Cannot merge statistics over different features.")
+        self._combine(other.count, other.mean, other.m2, other.min, other.max)
+        for sketch, other_sketch in zip(self.sketches, other.sketches):
+            sketch.merge(other_sketch)
+        return self
+
+    def feature_scaling(self, method="zscore"):
+        """
+        Feature scaling parameters in the format of
+        utils.features.feature_scaling
+
+        Parameters
+        ---------
+        method: str
+            method of scaling to use (minmax or zscore)
+
+        Returns
+        -------
+        feat_scaling: dict
+            dictionary of features and their scaling parameters
+        """
+        seen = self.count > 0
+        if method == "minmax":
+            first = np.where(seen, self.min, np.nan)
+            second = np.where(seen, self.max, np.nan)
+        elif method == "zscore":
+            first = np.where(seen, self.mean, np.nan)
+            second = np.sqrt(self.m2 / np.where(seen, self.count, np.nan))
+        else:
+            raise ValueError("Invalid scaling method. Use 'minmax' or 'zscore'.")
+
+        return {
+            feat: (float(first[j]), float(second[j]))
+            for j, feat in enumerate(self.features)
+        }
+
+    def generate_quantiles(self, stat_features):
+        """
+        Estimated feature quantiles in the format of
+        utils.features.generate_quantiles
+
+        Parameters
+        ---------
+        stat_features: dict
+            dictionary containing stats and quantiles of interest
+
+        Returns
+        -------
+        feat_quants: dict
+            dictionary of features and their quantiles
+        """
+        feat_quants = {}
+        for feat, quants in stat_features.items():
+            sketch = self.sketches[self.features.index(feat)]
+            feat_quants[feat] = np.atleast_1d(sketch.quantile(quants)).tolist()
+
+        return feat_quants
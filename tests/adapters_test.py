@@ -0,0 +1,93 @@
+import pytest
+import numpy as np
+import pandas as pd
+from diamondfp.fingerprints import binaryfp_batch
+from diamondfp.utils.adapters import to_feature_matrix
+
+
+FEATURES = ["AVG", "HR"]
+COLUMNS = {"AVG": [0.250, 0.300, 0.275], "HR": [10, 30, 20], "Name": ["A", "B", "C"]}
+EXPECTED = np.array([[0.250, 10], [0.300, 30], [0.275, 20]])
+
+
+def test_to_feature_matrix_pandas():
+    X = to_feature_matrix(pd.DataFrame(COLUMNS), FEATURES)
+    assert X.dtype == float
+    assert np.array_equal(X, EXPECTED)
+
+
+def test_to_feature_matrix_pandas_nullable():
+    df = pd.DataFrame({"AVG": pd.array([0.250, None], dtype="Float64"),
+                       "HR": pd.array([10, None], dtype="Int64")})
+    X = to_feature_matrix(df, FEATURES)
+    assert X[0].tolist() == [0.250, 10]
+    assert np.isnan(X[1]).all()
+
+
+def test_to_feature_matrix_dict_and_row():
+    assert np.array_equal(to_feature_matrix(COLUMNS, FEATURES), EXPECTED)
+    row = to_feature_matrix({"AVG": 0.250, "HR": 10, "Name": "A"}, FEATURES)
+    assert row.shape == (1, 2)
+    series = pd.DataFrame(COLUMNS).iloc[1]
+    assert np.array_equal(to_feature_matrix(series, FEATURES), EXPECTED[1:2])
+
+
+def test_to_feature_matrix_array_shape():
+    assert to_feature_matrix(EXPECTED, FEATURES, dtype=np.float32).dtype == np.float32
+    with pytest.raises(ValueError):
+        to_feature_matrix(EXPECTED[:, :1], FEATURES)
+
+
+def test_to_feature_matrix_layout():
+    frame = pd.DataFrame({"AVG": [0.250, 0.300, 0.275], "OBP": 0.3, "HR": [10.0, 30.0, 20.0]})
+    tables = [frame, frame.to_dict("list")]
+    for module in ["polars", "pyarrow"]:
+        try:
+            lib = __import__(module)
+        except ImportError:
+            continue
+        tables.append(lib.DataFrame(frame) if module == "polars" else lib.table(frame))
+    for table in tables:
+        X = to_feature_matrix(table, FEATURES)
+        assert np.array_equal(X, EXPECTED)
+        assert X[:, 0].flags.c_contiguous and X[:, 1].flags.c_contiguous
+
+    # one float64 block: a view, even of a subset of its columns
+    X = to_feature_matrix(frame, FEATURES)
+    assert np.shares_memory(X, frame["AVG"].to_numpy())
+    mixed = frame.assign(HR=frame["HR"].astype(int))
+    assert not np.shares_memory(to_feature_matrix(mixed, FEATURES), mixed["AVG"].to_numpy())
+    assert to_feature_matrix(EXPECTED, FEATURES) is EXPECTED
+    assert not np.shares_memory(to_feature_matrix(EXPECTED, FEATURES, np.float32), EXPECTED)
+
+
+def test_to_feature_matrix_polars():
+    pl = pytest.importorskip("polars")
+    df = pl.DataFrame({"AVG": [0.250, 0.300, None], "HR": [10, 30, 20], "Name": ["A", "B", "C"]})
+    X = to_feature_matrix(df, FEATURES)
+    assert np.array_equal(X[:2], EXPECTED[:2])
+    assert np.isnan(X[2, 0]) and X[2, 1] == 20
+
+
+def test_to_feature_matrix_arrow():
+    pa = pytest.importorskip("pyarrow")
+    table = pa.table(COLUMNS)
+    assert np.array_equal(to_feature_matrix(table, FEATURES), EXPECTED)
+    chunked = pa.concat_tables([table.slice(0, 1), table.slice(1)])
+    assert np.array_equal(to_feature_matrix(chunked, FEATURES), EXPECTED)
+
+
+def test_batch_fingerprints_match_across_backends():
+    pl = pytest.importorskip("polars")
+    feat_quants = {"AVG": [0.275], "HR": [15, 25]}
+    expected = binaryfp_batch(pd.DataFrame(COLUMNS), feat_quants)
+    assert np.array_equal(binaryfp_batch(pl.DataFrame(COLUMNS), feat_quants), expected)
+    assert np.array_equal(binaryfp_batch(COLUMNS, feat_quants), expected)
+
+
+def test_build_index_from_arrow():
+    pa = pytest.importorskip("pyarrow")
+    from diamondfp.index import build_index
+
+    index = build_index(pa.table(COLUMNS), "Name", None, feat_quants={"HR": [15, 25]})
+    assert index.ids == ["A", "B", "C"]
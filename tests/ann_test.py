@@ -0,0 +1,59 @@
+import pytest
+import numpy as np
+from diamondfp.ann import ANNIndex, benchmark_recall
+from diamondfp.search import top_k
+
+
+@pytest.fixture
+def fps():
+    rng = np.random.default_rng(7)
+    centers = rng.normal(scale=5, size=(8, 6))
+    return np.concatenate([c + rng.normal(size=(60, 6)) for c in centers])
+
+
+@pytest.mark.parametrize("metric", ["manhattan", "cosine_sim"])
+def test_ann_full_probe_is_exact(fps, metric):
+    index = ANNIndex(n_lists=8, metric=metric).build(fps)
+    for q in [0, 100, 400]:
+        expected_idx, expected_scores = top_k(fps[q], fps, k=5, metric=metric)
+        idx, scores = index.query(fps[q], k=5, n_probe=8)
+        assert idx.tolist() == expected_idx.tolist()
+        assert np.allclose(scores, expected_scores)
+
+
+def test_ann_recall_increases_with_probes(fps):
+    index = ANNIndex(n_lists=16).build(fps)
+    results = benchmark_recall(index, fps, fps[::40], k=10, n_probes=(1, 16))
+    assert [r["n_probe"] for r in results] == [1, 16]
+    assert results[0]["recall"] <= results[1]["recall"] == 1.0
+    assert results[0]["recall"] > 0.5
+
+
+def test_ann_save_load(fps, tmp_path):
+    index = ANNIndex(n_lists=8, metric="cosine_sim").build(fps)
+    index.save(tmp_path / "ann")
+    loaded = ANNIndex.load(tmp_path / "ann")
+    assert loaded.metric == "cosine_sim"
+    idx, scores = loaded.query(fps[3], k=4, n_probe=2)
+    expected_idx, expected_scores = index.query(fps[3], k=4, n_probe=2)
+    assert idx.tolist() == expected_idx.tolist()
+    assert np.array_equal(scores, expected_scores)
+
+
+def test_ann_invalid():
+    with pytest.raises(ValueError):
+        ANNIndex(metric="tanimoto")
+    with pytest.raises(ValueError):
+        ANNIndex().query([0.0, 1.0])
+    with pytest.raises(ValueError):
+        ANNIndex().build([[0.0, np.nan]])
+
+
+def test_ann_duplicate_players_never_probe_empty_lists():
+    fps = np.zeros((50, 4))
+    fps[40:] = np.arange(40).reshape(10, 4)
+    index = ANNIndex(n_lists=20).build(fps)
+    assert np.all(np.diff(index.offsets) > 0)
+    idx, scores = index.query(fps[0], k=3, n_probe=4)
+    assert idx.tolist() == [0, 1, 2]
+    assert np.array_equal(scores, [0, 0, 0])
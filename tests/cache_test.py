@@ -0,0 +1,110 @@
+import os
+
+import pytest
+import numpy as np
+import pandas as pd
+from diamondfp.cache import CachedSearch, SimilarityCache, spec_hash
+from diamondfp.index import build_index
+from diamondfp.search import top_k
+
+
+@pytest.fixture
+def index():
+    rng = np.random.default_rng(9)
+    data = pd.DataFrame(rng.random((50, 2)), columns=["AVG", "HR"])
+    data.insert(0, "playerID", [f"p{i:02d}" for i in range(50)])
+    feat_quants = {"AVG": [0.25, 0.5, 0.75], "HR": [0.5, 0.9]}
+    return build_index(data, "playerID", feat_quants=feat_quants)
+
+
+def test_cached_search_matches_top_k(index):
+    search = CachedSearch(index)
+    for metric in ["tanimoto", "manhattan"]:
+        idx, scores = search.top_k("p03", k=5, metric=metric)
+        expected_idx, expected_scores = top_k(index.fps[3], index.fps, k=6, metric=metric, packed=True)
+        keep = expected_idx != 3
+        assert idx.tolist() == expected_idx[keep][:5].tolist()
+        assert np.array_equal(scores, expected_scores[keep][:5])
+        assert not idx.flags.writeable
+
+    again = search.top_k("p03", k=5, metric="manhattan")
+    assert again[0] is idx
+    assert search.cache.stats() == {
+        "hits": 1, "disk_hits": 0, "misses": 2, "evictions": 0, "size": 2, "hit_rate": 1 / 3,
+    }
+
+
+def test_lru_eviction(index):
+    search = CachedSearch(index, SimilarityCache(maxsize=2))
+    for player in ["p01", "p02", "p01", "p03", "p02"]:
+        search.top_k(player, k=3)
+    stats = search.cache.stats()
+    # p02 was least recently used when p03 came in
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 4, 2)
+    assert len(search.cache) == 2
+
+
+def test_disk_cache_shared_between_instances(index, tmp_path):
+    first = CachedSearch(index, SimilarityCache(path=tmp_path / "cache"))
+    expected = first.top_k("p07", k=4)
+    second = CachedSearch(index, SimilarityCache(path=tmp_path / "cache"))
+    result = second.top_k("p07", k=4)
+    assert second.cache.stats()["disk_hits"] == 1
+    assert np.array_equal(result[0], expected[0])
+    assert np.array_equal(result[1], expected[1])
+
+
+def test_refit_invalidates_cache(index, tmp_path):
+    search = CachedSearch(index, SimilarityCache(path=tmp_path / "cache"))
+    search.top_k("p07", k=4)
+    old_spec = spec_hash(index)
+    index.feat_quants = {"AVG": [0.3, 0.5, 0.7], "HR": [0.5, 0.9]}
+    assert spec_hash(index) != old_spec
+
+    search.top_k("p07", k=4)
+    assert search.cache.stats()["misses"] == 2
+    assert sorted(os.listdir(tmp_path / "cache")) == sorted([old_spec, spec_hash(index)])
+
+
+def test_unused_specs_expire(index, tmp_path):
+    search = CachedSearch(index, SimilarityCache(path=tmp_path / "cache", max_age=3600))
+    search.top_k("p07", k=4)
+    os.utime(tmp_path / "cache" / spec_hash(index), (0, 0))
+    index.feat_quants = {"AVG": [0.3, 0.5, 0.7], "HR": [0.5, 0.9]}
+    search.top_k("p07", k=4)
+    assert os.listdir(tmp_path / "cache") == [spec_hash(index)]
+
+
+def test_spec_hash_covers_contents(index):
+    spec = spec_hash(index)
+    other = build_index(
+        pd.DataFrame({"playerID": [f"q{i:02d}" for i in range(50)], "AVG": 0.3, "HR": 0.6}),
+        "playerID",
+        feat_quants=index.feat_quants,
+    )
+    assert spec_hash(other) != spec
+
+    search = CachedSearch(index)
+    before = search.top_k("p07", k=4)
+    fps = index.fps.copy()
+    fps[7] = fps[0]
+    index.fps = fps
+    assert spec_hash(index) != spec
+    after = search.top_k("p07", k=4)
+    assert after[0][0] == 0 and before[0][0] != 0
+
+
+def test_indices_share_a_disk_cache(index, tmp_path):
+    other = build_index(
+        pd.DataFrame({"playerID": [f"q{i:02d}" for i in range(50)], "AVG": 0.3, "HR": 0.6}),
+        "playerID",
+        feat_quants=index.feat_quants,
+    )
+    first = CachedSearch(index, SimilarityCache(path=tmp_path / "cache"))
+    second = CachedSearch(other, SimilarityCache(path=tmp_path / "cache"))
+    first.top_k("p07", k=4)
+    second.top_k("q07", k=4)
+    first.top_k("p07", k=4)
+    assert first.cache.stats()["hits"] == 1
+    assert len(os.listdir(tmp_path / "cache")) == 2
+    assert CachedSearch(index, SimilarityCache(path=tmp_path / "cache")).top_k("p07", k=4)
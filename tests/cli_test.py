@@ -0,0 +1,84 @@
+import csv
+import json
+import subprocess
+import sys
+
+import pytest
+import numpy as np
+import pandas as pd
+from diamondfp.cli import main
+from diamondfp.index import FingerprintIndex
+from diamondfp.search import top_k
+
+
+@pytest.fixture
+def index_dir(tmp_path):
+    rng = np.random.default_rng(8)
+    df = pd.DataFrame(rng.random((40, 3)), columns=["AVG", "HR", "OPS"])
+    df.insert(0, "playerID", [f"p{i:02d}" for i in range(40)])
+    df.insert(1, "Name", [f"Player {i}" for i in range(40)])
+    df.to_csv(tmp_path / "players.csv", index=False)
+    spec = json.dumps({"AVG": [0.25, 0.5, 0.75], "HR": [0.5, 0.9], "OPS": [0.5]})
+    argv = ["-q", "build", str(tmp_path / "players.csv"), str(tmp_path / "idx")]
+    argv += ["--id-col", "playerID", "--name-col", "Name", "--features", spec]
+    assert main(argv) == 0
+    return tmp_path / "idx"
+
+
+def test_cli_build(index_dir):
+    index = FingerprintIndex.load(index_dir)
+    assert len(index) == 40 and index.packed and index.n_bits == 6
+    assert index.row("Player 3") == index.row("p03") == 3
+
+
+def test_cli_query_streams_csv(index_dir, capsys):
+    assert main(["query", str(index_dir), "Player 3", "p07", "-k", "4", "--n-jobs", "1"]) == 0
+    out, err = capsys.readouterr()
+    rows = list(csv.DictReader(out.splitlines()))
+    assert len(rows) == 8
+    assert "queries/s" in err
+
+    index = FingerprintIndex.load(index_dir)
+    idx, scores = top_k(index.fps[3], index.fps, k=5, packed=True)
+    keep = idx != 3
+    assert [r["match_id"] for r in rows[:4]] == [index.ids[i] for i in idx[keep][:4]]
+    assert [float(r["score"]) for r in rows[:4]] == scores[keep][:4].tolist()
+    assert rows[0]["query_name"] == "Player 3" and rows[0]["rank"] == "1"
+
+
+def test_cli_pairs(index_dir, tmp_path):
+    out = tmp_path / "pairs.csv"
+    argv = ["-q", "pairs", str(index_dir), "--threshold", "0.8", "--out", str(out)]
+    assert main(argv + ["--n-jobs", "1", "--block-size", "7"]) == 0
+    with open(out) as f:
+        rows = list(csv.DictReader(f))
+    assert rows and all(float(r["score"]) >= 0.8 for r in rows)
+    assert all(r["id_a"] < r["id_b"] for r in rows)
+    assert len({(r["id_a"], r["id_b"]) for r in rows}) == len(rows)
+
+
+def test_cli_parquet_output(index_dir, tmp_path):
+    pytest.importorskip("pyarrow")
+    out = tmp_path / "matches.parquet"
+    argv = ["-q", "query", str(index_dir), "--all", "-k", "2", "--out", str(out)]
+    assert main(argv + ["--n-jobs", "1"]) == 0
+    df = pd.read_parquet(out)
+    assert len(df) == 80
+    assert list(df.columns) == ["query_id", "query_name", "rank", "match_id", "match_name", "score"]
+
+
+def test_cli_unknown_player(index_dir, capsys):
+    with pytest.raises(SystemExit) as err:
+        main(["query", str(index_dir), "Nobody"])
+    assert err.value.code == 2
+    assert "not found" in capsys.readouterr().err
+
+
+def test_cli_query_closed_pipe(index_dir):
+    argv = [sys.executable, "-m", "diamondfp", "-q", "query", str(index_dir), "--all"]
+    proc = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    # the reader goes away before any output, as with `| head` quitting early
+    proc.stdout.close()
+    _, err = proc.communicate(timeout=60)
+    assert proc.returncode == 0
+    assert err == b""
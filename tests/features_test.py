@@ -26,6 +26,25 @@ def test_generate_quantiles_empty_df():
         generate_quantiles(test_data, stat_features)
 
 
+def test_generate_quantiles_array_all_features():
+    X = np.array([[0.200, 100], [0.250, 200], [0.300, 300], [0.350, 400]])
+    stat_features = {"AVG": [0.25, 0.5, 0.75], "HR": [0.5]}
+    result = generate_quantiles(X, stat_features)
+
+    assert np.allclose(result["AVG"], [0.2375, 0.275, 0.3125])
+    assert np.allclose(result["HR"], [250])
+    assert result == generate_quantiles({"AVG": X[:, 0], "HR": X[:, 1]}, stat_features)
+
+
+def test_generate_quantiles_skipna():
+    X = np.array([[0.200], [np.nan], [0.300]])
+    stat_features = {"AVG": [0.5]}
+    assert np.isnan(generate_quantiles(X, stat_features)["AVG"][0])
+    assert np.allclose(generate_quantiles(X, stat_features, skipna=True)["AVG"], [0.25])
+    result = generate_quantiles({"AVG": X[:, 0]}, stat_features, skipna=True)
+    assert np.allclose(result["AVG"], [0.25])
+
+
 def test_feature_scaling_minmax():
     test_data = {"AVG": [0.200, 0.300, 0.400]}
 
@@ -67,3 +86,62 @@ def test_create_archetypes():
     assert list(archetypes.columns) == features
     assert "Archetype_0" in archetypes.index
 
+
+@pytest.fixture
+def cluster_data():
+    rng = np.random.default_rng(0)
+    centers = np.array([[0.0, 0.0], [5.0, 5.0], [0.0, 5.0]])
+    points = np.concatenate([c + rng.normal(scale=0.1, size=(200, 2)) for c in centers])
+    return pd.DataFrame(points, columns=["A", "B"])
+
+
+def test_create_archetypes_minibatch_info(cluster_data):
+    archetypes, info = create_archetypes(
+        cluster_data, ["A", "B"], k=3, method="minibatch", sample_size=300, return_info=True
+    )
+    assert archetypes.shape == (3, 2)
+    assert info["method"] == "minibatch"
+    assert info["n_samples"] == 300
+    assert info["fit_time"] > 0
+    assert info["peak_memory"] > 0
+    centers = np.sort(archetypes.to_numpy().round(), axis=0)
+    assert np.array_equal(centers, [[0, 0], [0, 5], [5, 5]])
+
+
+def test_create_archetypes_warm_start(cluster_data):
+    previous = create_archetypes(cluster_data, ["A", "B"], k=3)
+    archetypes = create_archetypes(cluster_data, ["A", "B"], k=3, init=previous)
+    assert np.allclose(archetypes.to_numpy(), previous.to_numpy(), atol=1e-6)
+    with pytest.raises(ValueError):
+        create_archetypes(cluster_data, ["A", "B"], k=2, init=previous)
+
+
+def test_create_archetypes_streamed_chunks(cluster_data):
+    shuffled = cluster_data.sample(frac=1, random_state=0)
+    chunks = (shuffled.iloc[i : i + 100] for i in range(0, len(shuffled), 100))
+    archetypes, info = create_archetypes(
+        chunks, ["A", "B"], k=3, method="minibatch", return_info=True
+    )
+    assert list(archetypes.index) == ["Archetype_0", "Archetype_1", "Archetype_2"]
+    assert info["n_samples"] == 600
+    assert np.isnan(info["inertia"])
+
+    chunks = (shuffled.iloc[i : i + 100] for i in range(0, len(shuffled), 100))
+    _, info = create_archetypes(
+        chunks, ["A", "B"], k=3, method="minibatch", sample_size=50, return_info=True
+    )
+    assert info["n_samples"] == 300
+    with pytest.raises(ValueError):
+        create_archetypes(iter([shuffled]), ["A", "B"], k=3)
+
+
+def test_create_archetypes_minibatch_dict(cluster_data):
+    columns = {col: cluster_data[col].to_numpy() for col in cluster_data.columns}
+    archetypes = create_archetypes(columns, ["A", "B"], k=3, method="minibatch")
+    centers = np.sort(archetypes.to_numpy().round(), axis=0)
+    assert np.array_equal(centers, [[0, 0], [0, 5], [5, 5]])
+
+
+def test_create_archetypes_invalid_method(cluster_data):
+    with pytest.raises(ValueError):
+        create_archetypes(cluster_data, ["A", "B"], method="invalid")
@@ -1,7 +1,22 @@
 import pytest
 import pandas as pd
 import numpy as np
-from diamondfp.fingerprints import binaryfp, binnedfp, normalizedfp, percentilefp, archetypefp
+from diamondfp.fingerprints import (
+    binaryfp,
+    binnedfp,
+    normalizedfp,
+    percentilefp,
+    archetypefp,
+    binaryfp_batch,
+    binnedfp_batch,
+    normalizedfp_batch,
+    percentilefp_batch,
+    PercentileReference,
+    archetypefp_batch,
+    ArchetypeMatrix,
+    pack_fp,
+    unpack_fp,
+)
 
 
 def test_binaryfp():
@@ -121,3 +136,166 @@ def test_archetypefp_df():
     assert len(fp) == 2
     assert fp[0] == 0.0
     assert np.isclose(fp[1], np.sqrt(200))
+
+
+def test_binaryfp_batch_matches_rows():
+    data = pd.DataFrame({"AVG": [0.298, 0.305, 0.200, np.nan], "HR": [250, 700, 0, 400]})
+    feat_quants = {"AVG": [0.250, 0.275, 0.300], "HR": [200, 400, 600]}
+    expected = [binaryfp(row, feat_quants) for row in data.to_dict("records")]
+    result = binaryfp_batch(data, feat_quants)
+    assert result.shape == (4, 6)
+    assert result.tolist() == expected
+
+
+def test_binnedfp_batch_matches_rows():
+    data = {"AVG": [0.298, 0.305, 0.260, 0.200], "HR": [250, 700, 0, 400]}
+    feat_quants = {"AVG": [0.250, 0.275, 0.300], "HR": [200, 400, 600]}
+    rows = [dict(zip(data, vals)) for vals in zip(*data.values())]
+    expected = [binnedfp(row, feat_quants) for row in rows]
+    assert binnedfp_batch(data, feat_quants).tolist() == expected
+
+
+def test_binaryfp_batch_array_input():
+    X = np.array([[0.298, 250], [0.200, 0]])
+    feat_quants = {"AVG": [0.250, 0.275, 0.300], "HR": [200, 400, 600]}
+    assert binaryfp_batch(X, feat_quants).tolist() == [
+        [1, 1, 0, 1, 0, 0],
+        [0, 0, 0, 0, 0, 0],
+    ]
+    with pytest.raises(ValueError):
+        binaryfp_batch(X[:, :1], feat_quants)
+
+
+@pytest.mark.parametrize("method", ["minmax", "zscore"])
+def test_normalizedfp_batch_matches_rows(method):
+    data = {"AVG": [0.298, 0.305, 0.200], "HR": [250, 700, 0]}
+    feat_scaling = {"AVG": (0.200, 0.350), "HR": (0, 0)}
+    rows = [dict(zip(data, vals)) for vals in zip(*data.values())]
+    expected = [normalizedfp(row, feat_scaling, method=method) for row in rows]
+    assert normalizedfp_batch(data, feat_scaling, method=method).tolist() == expected
+
+
+def test_normalizedfp_batch_invalid_method():
+    with pytest.raises(ValueError):
+        normalizedfp_batch({"AVG": [0.3]}, {"AVG": (0.2, 0.4)}, method="invalid")
+
+
+def test_percentilefp_batch_matches_rows():
+    distros = {"stat1": list(range(100)), "stat2": [5, 1, 3, 3]}
+    data = {"stat1": [50, 99.5, -1], "stat2": [3, 0, 10]}
+    rows = [dict(zip(data, vals)) for vals in zip(*data.values())]
+    expected = [percentilefp(row, distros) for row in rows]
+    result = percentilefp_batch(data, distros)
+    assert result.tolist() == expected
+
+
+def test_percentile_reference_nans():
+    distros = {"stat1": [3.0, np.nan, 1.0, 2.0, 2.0], "stat2": []}
+    reference = PercentileReference(distros)
+    data = {"stat1": [2.0, np.nan, 10.0, 0.0], "stat2": [1.0, 1.0, 1.0, 1.0]}
+    rows = [dict(zip(data, vals)) for vals in zip(*data.values())]
+    with np.errstate(invalid="ignore"), pytest.warns(RuntimeWarning):
+        expected = [percentilefp(row, distros) for row in rows]
+    result = percentilefp_batch(data, reference)
+    assert np.array_equal(result, expected, equal_nan=True)
+    assert np.array_equal(percentilefp(rows[0], reference), expected[0], equal_nan=True)
+
+
+@pytest.mark.parametrize("n_bits", [1, 63, 64, 65, 70, 130, 190])
+def test_pack_fp_roundtrip(n_bits):
+    fps = np.random.default_rng(n_bits).integers(0, 2, size=(5, n_bits))
+    packed = pack_fp(fps)
+    assert packed.shape == (5, -(-n_bits // 64))
+    assert packed.dtype == np.uint64
+    assert np.array_equal(unpack_fp(packed, n_bits), fps)
+    assert np.array_equal(unpack_fp(pack_fp(fps[0]), n_bits), fps[0])
+
+
+def test_pack_fp_single():
+    packed = pack_fp([1, 1, 0, 1, 0, 0])
+    assert packed.shape == (1,)
+    assert packed[0] == 0b1011
+
+
+@pytest.fixture
+def archetype_df():
+    return pd.DataFrame(
+        {"stat1": [0.0, 10.0, 3.0], "stat2": [0.0, 10.0, -4.0]},
+        index=["Low", "High", "Mixed"],
+    )
+
+
+def test_archetypefp_batch_matches_rows(archetype_df):
+    data = pd.DataFrame({"stat1": [0.0, 1.5, 12.0], "stat2": [0.0, -2.0, 7.0]})
+    expected = [archetypefp(row, archetype_df) for row in data.to_dict("records")]
+    as_dict = {name: arch.to_dict() for name, arch in archetype_df.iterrows()}
+    for archetypes in [archetype_df, as_dict, ArchetypeMatrix(archetype_df)]:
+        result = archetypefp_batch(data, archetypes)
+        assert result.shape == (3, 3)
+        assert np.allclose(result, expected)
+
+
+def test_archetypefp_batch_metrics(archetype_df):
+    X = np.array([[1.0, 2.0], [-3.0, 5.0]])
+    C = archetype_df.to_numpy()
+    diff = X[:, None, :] - C[None, :, :]
+    sq = archetypefp_batch(X, archetype_df, metric="sqeuclidean")
+    assert np.allclose(sq, (diff**2).sum(axis=2))
+    l1 = archetypefp_batch(X, archetype_df, metric="manhattan")
+    assert np.allclose(l1, np.abs(diff).sum(axis=2))
+    VI = np.array([[2.0, 0.5], [0.5, 1.0]])
+    mahal = archetypefp_batch(X, archetype_df, metric="mahalanobis", VI=VI)
+    assert np.allclose(mahal, np.sqrt(np.einsum("nki,ij,nkj->nk", diff, VI, diff)))
+    with pytest.raises(ValueError):
+        archetypefp_batch(X, archetype_df, metric="invalid")
+
+
+def test_archetype_matrix_fixed_mahalanobis(archetype_df):
+    rng = np.random.default_rng(2)
+    fit = pd.DataFrame(rng.normal(size=(200, 2)) * [3.0, 1.0], columns=["stat1", "stat2"])
+    archetypes = ArchetypeMatrix(archetype_df, data=fit)
+    VI = np.linalg.inv(np.cov(fit.to_numpy(), rowvar=False))
+    assert np.allclose(archetypes.VI, VI)
+
+    X = np.array([[1.0, 2.0], [-3.0, 5.0], [0.5, 0.5]])
+    batch = archetypefp_batch(X, archetypes, metric="mahalanobis")
+    for i in range(len(X)):
+        single = archetypefp_batch(X[i : i + 1], archetypes, metric="mahalanobis")
+        assert np.allclose(single[0], batch[i])
+    expected = archetypefp_batch(X, archetype_df, metric="mahalanobis", VI=VI)
+    assert np.allclose(batch, expected)
+    with pytest.raises(ValueError):
+        archetypefp_batch(X, archetype_df, metric="mahalanobis")
+
+
+def test_fingerprint_dtype_option(archetype_df):
+    row = {"AVG": 0.298, "HR": 250}
+    feat_quants = {"AVG": [0.250, 0.275, 0.300], "HR": [200, 400, 600]}
+    for func in (binaryfp, binnedfp):
+        for dtype in (np.uint8, bool):
+            fp = func(row, feat_quants, dtype=dtype)
+            assert fp.dtype == dtype
+            assert fp.tolist() == [dtype(b) for b in func(row, feat_quants)]
+            batch = (binaryfp_batch if func is binaryfp else binnedfp_batch)(
+                row, feat_quants, dtype=dtype
+            )
+            assert batch.dtype == dtype and np.array_equal(batch[0], fp)
+
+    feat_scaling = {"AVG": (0.200, 0.350), "HR": (0, 700)}
+    fp = normalizedfp(row, feat_scaling, method="minmax", dtype=np.float32)
+    assert fp.dtype == np.float32
+    assert np.allclose(fp, normalizedfp(row, feat_scaling, method="minmax"))
+    batch = normalizedfp_batch(row, feat_scaling, method="minmax", dtype=np.float32)
+    assert batch.dtype == np.float32 and np.array_equal(batch[0], fp)
+
+    distros = {"AVG": [0.2, 0.3, 0.4], "HR": [100, 300]}
+    assert np.allclose(percentilefp(row, distros, dtype=np.float32), [1 / 3, 0.5])
+    reference = PercentileReference(distros)
+    assert percentilefp(row, reference, dtype=np.float32).dtype == np.float32
+    assert percentilefp_batch(row, reference, dtype=np.float32).dtype == np.float32
+
+    point = {"stat1": 0.0, "stat2": 0.0}
+    fp = archetypefp(point, archetype_df, dtype=np.float32)
+    assert fp.dtype == np.float32
+    assert np.allclose(fp, archetypefp(point, archetype_df))
+    assert archetypefp_batch(point, archetype_df, dtype=np.float32).dtype == np.float32
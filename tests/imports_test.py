@@ -0,0 +1,43 @@
+import subprocess
+import sys
+
+import pytest
+import diamondfp
+from diamondfp import _backends
+
+
+def _loaded_after(statement):
+    code = f"import sys; {statement}; print(' '.join(sorted(sys.modules)))"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return set(out.stdout.split())
+
+
+def test_import_package_loads_no_heavy_backends():
+    loaded = _loaded_after("import diamondfp")
+    assert not {"pandas", "sklearn", "polars", "pyarrow", "numpy"} & loaded
+
+
+def test_import_core_modules_loads_only_numpy():
+    loaded = _loaded_after(
+        "import diamondfp.fingerprints, diamondfp.scoring, diamondfp.search, diamondfp.utils.features"
+    )
+    assert "numpy" in loaded
+    assert not {"pandas", "sklearn", "polars", "pyarrow"} & loaded
+
+
+def test_lazy_submodules():
+    assert "pipeline" in dir(diamondfp)
+    assert diamondfp.scoring.tanimoto([1, 0], [1, 1]) == 0.5
+    assert diamondfp.utils.features.generate_quantiles is not None
+    with pytest.raises(AttributeError):
+        diamondfp.not_a_module
+
+
+def test_backends_import_once(monkeypatch):
+    pd = _backends.pd
+    assert pd is sys.modules["pandas"]
+    assert "pd" in vars(_backends)
+    monkeypatch.delitem(vars(_backends), "pl", raising=False)
+    monkeypatch.setitem(sys.modules, "polars", None)
+    with pytest.raises(ImportError, match="pip install polars"):
+        _backends.pl
@@ -0,0 +1,67 @@
+import pytest
+import numpy as np
+import pandas as pd
+from diamondfp.fingerprints import binaryfp, normalizedfp, unpack_fp
+from diamondfp.index import FingerprintIndex, build_index, FORMAT_VERSION
+
+
+@pytest.fixture
+def data():
+    return pd.DataFrame({
+        "playerID": ["a01", "b01", "c01"],
+        "Name": ["Player A", "Player B", "Player C"],
+        "AVG": [0.298, 0.305, 0.200],
+        "HR": [250, 700, 0],
+    })
+
+
+def test_build_index_binary(data):
+    feat_quants = {"AVG": [0.250, 0.275, 0.300], "HR": [200, 400, 600]}
+    index = build_index(data, "playerID", "Name", feat_quants=feat_quants)
+    assert index.packed and index.n_bits == 6
+    expected = [binaryfp(row, feat_quants) for row in data.to_dict("records")]
+    assert unpack_fp(index.fps, index.n_bits).tolist() == expected
+
+
+def test_index_save_load_roundtrip(data, tmp_path):
+    feat_quants = {"AVG": [0.250, 0.275, 0.300], "HR": [200, 400, 600]}
+    index = build_index(data, "playerID", "Name", feat_quants=feat_quants)
+    index.save(tmp_path / "idx")
+
+    loaded = FingerprintIndex.load(tmp_path / "idx")
+    assert isinstance(loaded.fps, np.memmap)
+    assert np.array_equal(loaded.fps, index.fps)
+    assert loaded.ids == ["a01", "b01", "c01"]
+    assert loaded.feat_quants == feat_quants
+    assert loaded.row("Player B") == 1
+    assert loaded.row("c01") == 2
+    with pytest.raises(KeyError):
+        loaded.row("Nobody")
+
+
+def test_index_normalized_roundtrip(data, tmp_path):
+    feat_scaling = {"AVG": (0.200, 0.350), "HR": (0, 700)}
+    index = build_index(data, "playerID", feat_scaling=feat_scaling, fp_type="normalized", method="minmax")
+    index.save(tmp_path / "idx")
+
+    loaded = FingerprintIndex.load(tmp_path / "idx", mmap=False)
+    assert loaded.feat_scaling == feat_scaling
+    assert loaded.method == "minmax"
+    expected = normalizedfp(data.iloc[0], feat_scaling, method="minmax")
+    assert loaded.fps[0].tolist() == expected
+
+
+def test_index_version_mismatch(data, tmp_path):
+    index = FingerprintIndex(np.zeros((3, 2)), data["playerID"])
+    index.save(tmp_path / "idx")
+    meta = (tmp_path / "idx" / "meta.json").read_text()
+    (tmp_path / "idx" / "meta.json").write_text(
+        meta.replace(f'"format_version": {FORMAT_VERSION}', '"format_version": 999')
+    )
+    with pytest.raises(ValueError):
+        FingerprintIndex.load(tmp_path / "idx")
+
+
+def test_build_index_invalid_type(data):
+    with pytest.raises(ValueError):
+        build_index(data, "playerID", fp_type="invalid")
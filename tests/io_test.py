@@ -0,0 +1,75 @@
+import os
+
+import pytest
+import numpy as np
+import pandas as pd
+from diamondfp.fingerprints import binaryfp_batch
+from diamondfp.utils.features import generate_quantiles
+from diamondfp.utils.io import (
+    innings_to_float,
+    iter_feature_chunks,
+    read_savant_csv,
+    scan_stats,
+)
+
+
+SAVANT_CSV = (
+    '\ufeff"last_name, first_name","player_id","year","p_formatted_ip","batting_avg","woba"\n'
+    '"Colon, Bartolo",112526,2015,"194.2",".281","79.319844363"\n'
+    '"Burnett, A.J.",150359,2015,"164.0",".275","79.730745252"\n'
+    '"Hudson, Tim",218596,2015,"123.1",".282",""\n'
+)
+
+
+@pytest.fixture
+def savant_csv(tmp_path):
+    path = tmp_path / "pitching.csv"
+    path.write_text(SAVANT_CSV, encoding="utf-8")
+    return path
+
+
+def test_innings_to_float():
+    assert innings_to_float("194.2") == pytest.approx(194 + 2 / 3)
+    assert np.allclose(innings_to_float([123.1, 164.0]), [123 + 1 / 3, 164])
+    with pytest.raises(ValueError):
+        innings_to_float(5.4)
+
+
+def test_read_savant_csv_types(savant_csv):
+    df = read_savant_csv(savant_csv)
+    assert df.columns[0] == "last_name, first_name"
+    assert df["batting_avg"].tolist() == [0.281, 0.275, 0.282]
+    assert np.allclose(df["p_formatted_ip"], [194 + 2 / 3, 164, 123 + 1 / 3])
+    assert np.isnan(df["woba"].iloc[2])
+
+
+def test_read_savant_csv_chunks(savant_csv):
+    features = ["p_formatted_ip", "batting_avg"]
+    chunks = list(read_savant_csv(savant_csv, features, ["player_id"], chunk_size=2))
+    assert [len(c) for c in chunks] == [2, 1]
+    assert list(chunks[0].columns) == ["player_id"] + features
+    pd.testing.assert_frame_equal(
+        pd.concat(chunks, ignore_index=True),
+        read_savant_csv(savant_csv, features, ["player_id"]),
+    )
+
+
+def test_stream_into_fingerprints_and_stats():
+    features = ["p_formatted_ip", "batting_avg", "p_era", "k_percent"]
+    path = os.path.join(os.path.dirname(__file__), "..", "data", "pitching_2015-2025.csv")
+    full = read_savant_csv(path, features)
+    stat_features = {feat: [0.25, 0.5, 0.75] for feat in features}
+    feat_quants = generate_quantiles(full, stat_features)
+
+    chunks = list(iter_feature_chunks(path, features, chunk_size=500, id_col="player_id"))
+    assert [len(X) for _, X in chunks] == [500, 500, 215]
+    fps = np.concatenate([binaryfp_batch(X, feat_quants) for _, X in chunks])
+    assert np.array_equal(fps, binaryfp_batch(full, feat_quants))
+    assert np.concatenate([ids for ids, _ in chunks]).tolist()[:2] == [112526, 150359]
+
+    stats = scan_stats(path, features, chunk_size=300, k=2000)
+    scaling = stats.feature_scaling("zscore")
+    for feat in features:
+        assert scaling[feat][0] == pytest.approx(full[feat].mean())
+        assert scaling[feat][1] == pytest.approx(full[feat].std(ddof=0))
+    assert np.allclose(stats.generate_quantiles(stat_features)["p_era"], feat_quants["p_era"])
@@ -0,0 +1,50 @@
+import pytest
+import numpy as np
+from diamondfp.minhash import minhash_signatures, MinHashLSH, lsh_recall
+from diamondfp.scoring import jaccard
+
+
+@pytest.fixture
+def fps():
+    rng = np.random.default_rng(8)
+    base = (rng.random((20, 40)) < 0.4).astype(np.uint8)
+    # noisy copies of each base fingerprint plus exact duplicates
+    noisy = base ^ (rng.random(base.shape) < 0.03)
+    return np.concatenate([base, noisy, base[:5], np.zeros((3, 40), dtype=np.uint8)])
+
+
+def test_minhash_agreement_estimates_jaccard():
+    rng = np.random.default_rng(9)
+    a = (rng.random(60) < 0.5).astype(np.uint8)
+    b = a.copy()
+    b[:15] = 1 - b[:15]
+    sig = minhash_signatures(np.stack([a, b]), n_perm=2000, seed=1)
+    assert abs((sig[0] == sig[1]).mean() - jaccard(a, b)) < 0.05
+
+
+def test_lsh_pairs_are_exact(fps):
+    lsh = MinHashLSH(bands=20, rows=5).index(fps)
+    found = {}
+    for rows_a, rows_b, scores in lsh.iter_pairs(threshold=0.8):
+        for a, b, s in zip(rows_a, rows_b, scores):
+            assert a < b
+            found[(a, b)] = s
+
+    expected = {
+        (a, b): jaccard(fps[a], fps[b])
+        for a in range(len(fps))
+        for b in range(a + 1, len(fps))
+        if jaccard(fps[a], fps[b]) >= 0.8
+    }
+    assert set(found) <= set(expected)
+    assert all(found[p] == expected[p] for p in found)
+    assert len(found) >= 0.95 * len(expected)
+    # empty fingerprints never pair up
+    assert not any(a >= 45 or b >= 45 for a, b in found)
+
+
+def test_lsh_recall(fps):
+    recall = lsh_recall(fps, threshold=0.8, bands=25, rows=4)
+    assert 0.9 < recall["player_recall"] <= 1.0
+    assert recall["unique_recall"] > 0.9
+    assert recall["found_unique_pairs"] <= recall["exact_unique_pairs"]
@@ -0,0 +1,61 @@
+import pytest
+import numpy as np
+from diamondfp.fingerprints import pack_fp
+from diamondfp.index import FingerprintIndex
+from diamondfp.parallel import parallel_pairs, parallel_top_k
+from diamondfp.scoring import score_matrix
+from diamondfp.search import top_k
+
+
+@pytest.fixture
+def fps():
+    return np.random.default_rng(6).integers(0, 2, size=(60, 24), dtype=np.uint8)
+
+
+def expected_top_k(fps, row, k, metric="tanimoto", packed=False):
+    idx, scores = top_k(fps[row], fps, k=k + 1, metric=metric, packed=packed)
+    keep = idx != row
+    return idx[keep][:k], scores[keep][:k]
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_parallel_top_k_matches_search(fps, n_jobs):
+    results = list(parallel_top_k(fps, k=5, n_jobs=n_jobs, block_size=7))
+    assert [row for row, _, _ in results] == list(range(60))
+    for row, idx, scores in results:
+        expected_idx, expected_scores = expected_top_k(fps, row, 5)
+        assert idx.tolist() == expected_idx.tolist()
+        assert np.array_equal(scores, expected_scores)
+
+
+def test_parallel_top_k_saved_index(fps, tmp_path):
+    packed = pack_fp(fps)
+    FingerprintIndex(packed, list(range(60)), packed=True, n_bits=24).save(tmp_path / "idx")
+    index = FingerprintIndex.load(tmp_path / "idx")
+    results = list(parallel_top_k(index, k=3, metric="manhattan", queries=[4, 9], n_jobs=1))
+    assert [row for row, _, _ in results] == [4, 9]
+    for row, idx, scores in results:
+        expected_idx, expected_scores = expected_top_k(packed, row, 3, "manhattan", True)
+        assert idx.tolist() == expected_idx.tolist()
+        assert np.array_equal(scores, expected_scores)
+
+
+def test_parallel_top_k_keep_self(fps):
+    results = list(parallel_top_k(fps, k=1, queries=[0], exclude_self=False, n_jobs=1))
+    assert results[0][1].tolist() == [0]
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+@pytest.mark.parametrize("metric, threshold", [("tanimoto", 0.5), ("manhattan", 8)])
+def test_parallel_pairs_matches_score_matrix(fps, n_jobs, metric, threshold):
+    blocks = list(parallel_pairs(fps, threshold, metric=metric, n_jobs=n_jobs, block_size=7))
+    rows_a = np.concatenate([a for a, _, _ in blocks])
+    rows_b = np.concatenate([b for _, b, _ in blocks])
+    scores = np.concatenate([s for _, _, s in blocks])
+    matrix = score_matrix(fps, metric=metric)
+    hit = matrix >= threshold if metric == "tanimoto" else matrix <= threshold
+    expected_a, expected_b = np.nonzero(np.triu(hit, 1))
+    order = np.lexsort((rows_b, rows_a))
+    assert rows_a[order].tolist() == expected_a.tolist()
+    assert rows_b[order].tolist() == expected_b.tolist()
+    assert np.array_equal(scores[order], matrix[expected_a, expected_b])
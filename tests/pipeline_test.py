@@ -0,0 +1,83 @@
+import pickle
+
+import pytest
+import numpy as np
+import pandas as pd
+from diamondfp.fingerprints import (
+    binaryfp,
+    binnedfp,
+    normalizedfp,
+    percentilefp,
+    archetypefp,
+)
+from diamondfp.pipeline import FingerprintPipeline
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(10)
+    return pd.DataFrame({
+        "AVG": rng.uniform(0.15, 0.35, 50),
+        "HR": rng.integers(0, 60, 50),
+        "K%": rng.uniform(0.1, 0.3, 50),
+    })
+
+
+def test_pipeline_matches_row_functions(data):
+    stat_features = {"AVG": [0.5, 0.75, 0.9], "HR": [0.9]}
+    pipe = FingerprintPipeline([
+        ("binary", stat_features),
+        ("binned", stat_features),
+        ("normalized", ["HR", "K%"], {"method": "minmax"}),
+        ("percentile", ["AVG"]),
+        ("archetype", ["AVG", "K%"], {"k": 3}),
+    ])
+    fps = pipe.fit_transform(data)
+    assert fps.shape == (50, 4 + 4 + 2 + 1 + 3) == (50, pipe.n_dims)
+    assert pipe.slices_ == [(0, 4), (4, 8), (8, 10), (10, 11), (11, 14)]
+
+    feat_quants, _, feat_scaling, _, archetypes = pipe.params_
+    distros = {"AVG": data["AVG"].to_numpy()}
+    for i, row in enumerate(data.to_dict("records")):
+        expected = (
+            binaryfp(row, feat_quants)
+            + binnedfp(row, feat_quants)
+            + normalizedfp(row, feat_scaling, method="minmax")
+            + percentilefp(row, distros)
+        )
+        assert fps[i, :11].tolist() == expected
+        assert np.allclose(fps[i, 11:], archetypefp(row, archetypes))
+
+
+def test_pipeline_binary_only_is_uint8(data):
+    pipe = FingerprintPipeline([("binary", {"HR": [0.5, 0.9]})]).fit(data)
+    fps = pipe.transform(data[["HR"]].to_numpy())
+    assert fps.dtype == np.uint8
+    assert pipe.features_ == ["HR"]
+
+
+def test_pipeline_prefit_params(data):
+    pipe = FingerprintPipeline([("binary", {"AVG": [0.5]})])
+    pipe.params_ = [{"AVG": [0.25]}]
+    fps = pipe.compile().transform(data)
+    assert fps[:, 0].tolist() == (data["AVG"] >= 0.25).astype(int).tolist()
+
+
+def test_pipeline_pickles(data):
+    pipe = FingerprintPipeline([
+        ("binned", {"AVG": [0.25, 0.5, 0.75]}),
+        ("percentile", ["HR"]),
+    ]).fit(data)
+    restored = pickle.loads(pickle.dumps(pipe))
+    assert np.array_equal(restored.transform(data), pipe.transform(data))
+
+
+def test_pipeline_invalid():
+    with pytest.raises(ValueError):
+        FingerprintPipeline([("invalid", ["HR"])])
+    with pytest.raises(ValueError):
+        FingerprintPipeline([("binary", {"HR": [0.5]})]).transform({"HR": [1.0]})
+    with pytest.raises(ValueError, match="not been fitted"):
+        FingerprintPipeline([("binary", {"HR": [0.5]})]).n_dims
+    with pytest.raises(ValueError, match="not been fitted"):
+        FingerprintPipeline([("binary", {"HR": [0.5]})]).slices_
@@ -0,0 +1,157 @@
+import json
+import threading
+import pytest
+import numpy as np
+import pandas as pd
+from diamondfp import profiling
+from diamondfp.fingerprints import binaryfp_batch
+from diamondfp.profiling import instrument, profile, track_peak
+from diamondfp.scoring import score_many, score_matrix, tanimoto
+from diamondfp.utils.features import generate_quantiles
+
+
+STAT_FEATURES = {"AVG": [0.5, 0.9], "HR": [0.75]}
+
+
+def make_data(n=200):
+    rng = np.random.default_rng(8)
+    return pd.DataFrame({"AVG": rng.random(n), "HR": rng.random(n)})
+
+
+def test_profile_records_stages():
+    df = make_data()
+    with profile() as prof:
+        feat_quants = generate_quantiles(df, STAT_FEATURES)
+        fps = binaryfp_batch(df, feat_quants)
+        for q in range(3):
+            score_many(fps[q], fps=fps)
+        score_matrix(fps[:50], fps, max_memory=50 * 200 * 40 // 5)
+        tanimoto(fps[0], fps[1])
+
+    report = prof.to_dict()
+    stages = report["stages"]
+    assert stages["features.generate_quantiles"]["rows"] == 200
+    assert stages["fingerprints.binaryfp_batch"] == {
+        "calls": 1,
+        "seconds": stages["fingerprints.binaryfp_batch"]["seconds"],
+        "rows": 200,
+        "bytes": fps.nbytes,
+        "rows_per_second": stages["fingerprints.binaryfp_batch"]["rows_per_second"],
+    }
+    assert stages["scoring.score_many"]["calls"] == 3
+    assert stages["scoring.score_many"]["rows"] == 600
+    assert stages["scoring.score_matrix"]["rows"] == 50
+    assert stages["scoring.iter_score_blocks"]["calls"] == 5
+    assert stages["scoring.iter_score_blocks"]["bytes"] == 50 * 200 * 8
+    # per-pair functions are not instrumented
+    assert "scoring.tanimoto" not in stages
+    assert report["seconds"] > 0
+    assert json.loads(prof.to_json()) == json.loads(json.dumps(report))
+
+
+def test_profile_disabled_and_wrapped():
+    df = make_data()
+    with profile() as prof:
+        pass
+    binaryfp_batch(df, {"AVG": [0.5]})
+    assert prof.to_dict()["stages"] == {}
+    assert binaryfp_batch.__name__ == "binaryfp_batch"
+    assert "binary fingerprint" in binaryfp_batch.__doc__
+
+
+def test_profile_callback_nesting_and_stage(tmp_path):
+    df = make_data()
+    calls = []
+    with profile() as outer:
+        with profile(callback=lambda *args: calls.append(args)) as inner:
+            binaryfp_batch(df, {"AVG": [0.5]})
+            with inner.stage("load"):
+                pass
+        binaryfp_batch(df, {"AVG": [0.5]})
+
+    assert [c[0] for c in calls] == ["fingerprints.binaryfp_batch", "load"]
+    assert calls[0][2:] == (200, 200)
+    assert inner.stages["fingerprints.binaryfp_batch"]["calls"] == 1
+    assert outer.stages["fingerprints.binaryfp_batch"]["calls"] == 2
+    assert outer.stages["load"]["calls"] == 1
+
+    path = tmp_path / "profile.json"
+    outer.to_json(path, indent=2)
+    assert json.loads(path.read_text())["stages"]["load"]["calls"] == 1
+
+
+def test_profile_track_memory():
+    df = make_data(20_000)
+    with profile(track_memory=True) as prof:
+        binaryfp_batch(df, STAT_FEATURES)
+    assert prof.stages["fingerprints.binaryfp_batch"]["peak_bytes"] >= 20_000 * 3
+
+
+def test_profile_ignores_other_threads():
+    df = make_data()
+    with profile() as prof:
+        thread = threading.Thread(target=binaryfp_batch, args=(df, {"AVG": [0.5]}))
+        thread.start()
+        thread.join()
+    assert prof.stages == {}
+
+
+def test_profile_reentry():
+    df = make_data()
+    prof = profile()
+    with prof:
+        with pytest.raises(ValueError):
+            with prof:
+                pass
+        binaryfp_batch(df, {"AVG": [0.5]})
+    with prof:
+        binaryfp_batch(df, {"AVG": [0.5]})
+    assert prof.stages["fingerprints.binaryfp_batch"]["calls"] == 2
+
+
+def test_profile_counts_threads():
+    def enter_many():
+        for _ in range(2000):
+            with profile():
+                pass
+
+    threads = [threading.Thread(target=enter_many) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert profiling._n_active == 0
+    assert profiling.active() is None
+
+
+@instrument("test.inner")
+def allocate_small():
+    return np.ones(1_000)
+
+
+@instrument("test.outer")
+def allocate_then_call():
+    big = np.ones(1_000_000)
+    del big
+    return allocate_small()
+
+
+def test_profile_nested_peaks():
+    with profile(track_memory=True) as prof:
+        allocate_then_call()
+    stages = prof.stages
+    assert stages["test.outer"]["peak_bytes"] >= 8_000_000
+    assert 8_000 <= stages["test.inner"]["peak_bytes"] < 1_000_000
+    assert profiling._PEAKS == {}
+
+
+def test_track_peak_nested():
+    with profile(track_memory=True):
+        with track_peak() as outer:
+            big = np.ones(1_000_000)
+            del big
+            with track_peak() as inner:
+                allocate_small()
+    assert outer.bytes >= 8_000_000
+    assert inner.bytes < outer.bytes
+    assert profiling._PEAKS == {}
@@ -5,7 +5,18 @@ from diamondfp.scoring import (
     jaccard,
     manhattan,
     cosine_sim,
+    popcount,
+    tanimoto_packed,
+    jaccard_packed,
+    score_many,
+    iter_score_blocks,
+    score_matrix,
+    block_weights,
+    weighted_tanimoto,
+    weighted_manhattan,
+    weighted_cosine,
 )
+from diamondfp.fingerprints import pack_fp
 
 
 def test_tanimoto_similarity():
@@ -37,3 +48,182 @@ def test_cosine_similarity():
     norm_v2 = np.sqrt(1**2 + 1**2 + 0**2)
     expected_score = dot_product / (norm_v1 * norm_v2)
     assert np.isclose(cosine_sim(v1, v2), expected_score)
+
+
+def test_popcount():
+    packed = pack_fp([[1, 0, 1, 1, 0], [0, 0, 0, 0, 0]])
+    assert popcount(packed).tolist() == [3, 0]
+
+
+def test_tanimoto_packed_matches_unpacked():
+    fps = np.random.default_rng(1).integers(0, 2, size=(10, 100))
+    packed = pack_fp(fps)
+    for i in range(len(fps)):
+        expected = tanimoto(fps[0], fps[i])
+        assert tanimoto_packed(packed[0], packed[i]) == expected
+        assert jaccard_packed(packed[0], packed[i]) == expected
+    expected = [tanimoto(fps[0], fp) for fp in fps]
+    assert np.allclose(tanimoto_packed(packed[0], packed), expected)
+
+
+def test_tanimoto_packed_empty():
+    empty = pack_fp([0, 0, 0])
+    assert tanimoto_packed(empty, empty) == 0
+    assert tanimoto_packed(empty, pack_fp([[0, 0, 0]])).tolist() == [0.0]
+
+
+PAIRWISE = {
+    "tanimoto": tanimoto,
+    "jaccard": jaccard,
+    "manhattan": manhattan,
+    "cosine_sim": cosine_sim,
+}
+
+
+@pytest.mark.parametrize("metric", list(PAIRWISE))
+@pytest.mark.parametrize("packed", [False, True])
+def test_score_many_matches_pairwise(metric, packed):
+    fps = np.random.default_rng(2).integers(0, 2, size=(30, 20))
+    fps[0] = 0
+    data = pack_fp(fps) if packed else fps
+    with np.errstate(invalid="ignore"):
+        expected = [PAIRWISE[metric](fps[3], fp) for fp in fps]
+        result = score_many(data[3], data, metric=metric, packed=packed, max_memory=64)
+    assert np.allclose(result, expected, equal_nan=True)
+
+
+@pytest.mark.parametrize("metric", list(PAIRWISE))
+def test_score_matrix_matches_pairwise(metric):
+    rng = np.random.default_rng(3)
+    if metric in ("tanimoto", "jaccard"):
+        fps_a, fps_b = rng.integers(0, 2, size=(7, 5)), rng.integers(0, 2, size=(9, 5))
+    else:
+        fps_a, fps_b = rng.random((7, 5)), rng.random((9, 5))
+    expected = [[PAIRWISE[metric](a, b) for b in fps_b] for a in fps_a]
+    result = score_matrix(fps_a, fps_b, metric=metric, max_memory=100)
+    assert result.shape == (7, 9)
+    assert np.allclose(result, expected)
+
+
+def test_iter_score_blocks_memory_budget():
+    fps = np.random.default_rng(4).integers(0, 2, size=(50, 16))
+    # 0/1 integers are packed: one 64-bit word plus 32 bytes per pair
+    blocks = list(iter_score_blocks(fps, max_memory=50 * 40 * 4, dtype=np.float32))
+    assert [(start, stop) for start, stop, _ in blocks][:2] == [(0, 4), (4, 8)]
+    assert all(block.dtype == np.float32 for _, _, block in blocks)
+    full = np.concatenate([block for _, _, block in blocks])
+    assert np.allclose(full, score_matrix(fps))
+
+
+@pytest.mark.parametrize("metric", ["tanimoto", "jaccard", "manhattan"])
+def test_integer_fingerprints_scored_packed(metric):
+    fps = np.random.default_rng(6).integers(0, 2, size=(40, 70)).astype(np.uint8)
+    expected = score_matrix(fps.astype(float), metric=metric)
+    for data in (fps, fps.astype(bool)):
+        assert np.array_equal(score_matrix(data, metric=metric), expected)
+        assert np.array_equal(score_many(data[3], data, metric=metric), expected[3])
+    # values other than 0/1 keep the dense kernels
+    counts = fps * 2
+    dense = counts.astype(float)
+    assert np.array_equal(
+        score_many(counts[3], counts, metric=metric), score_many(dense[3], dense, metric=metric)
+    )
+
+
+def test_score_many_invalid_metric():
+    with pytest.raises(ValueError):
+        score_many([1, 0], [[1, 0]], metric="invalid")
+
+
+@pytest.mark.parametrize("metric", list(PAIRWISE))
+def test_scoring_typed_fingerprints(metric):
+    rng = np.random.default_rng(5)
+    if metric in ("tanimoto", "jaccard"):
+        fps = rng.integers(0, 2, size=(8, 12))
+        typed = [fps.astype(np.uint8), fps.astype(bool)]
+    else:
+        fps = rng.integers(0, 4, size=(8, 12)).astype(float)
+        typed = [fps.astype(np.uint8), fps.astype(np.float32)]
+    expected = [PAIRWISE[metric](fps[0].tolist(), fp.tolist()) for fp in fps]
+    for data in typed:
+        assert np.allclose([PAIRWISE[metric](data[0], fp) for fp in data], expected)
+        assert np.allclose(score_many(data[0], data, metric=metric), expected)
+
+
+def test_float32_fingerprints_not_copied():
+    from diamondfp.scoring import _as_bits, _as_values, _prepare
+
+    bits = np.ones(8, dtype=np.uint8)
+    values = np.ones((4, 8), dtype=np.float32)
+    assert _as_bits(bits) is bits
+    assert _as_values(values) is values
+    assert _prepare(values, "cosine_sim", False)[0] is values
+
+
+def test_block_weights():
+    feat_quants = {"HR": [10, 20], "SLG": [0.4], "K%": [0.2, 0.3, 0.4]}
+    weights = block_weights({("HR", "SLG"): 2.0, "K%": 0.5}, feat_quants=feat_quants)
+    assert weights.tolist() == [2.0, 2.0, 2.0, 0.5, 0.5, 0.5]
+    weights = block_weights({"SLG": 3}, features=["HR", "SLG"], default=0.0)
+    assert weights.tolist() == [0.0, 3.0]
+    with pytest.raises(ValueError):
+        block_weights({"OPS": 1.0}, feat_quants=feat_quants)
+    with pytest.raises(ValueError):
+        block_weights({"HR": -1.0}, feat_quants=feat_quants)
+    with pytest.raises(ValueError):
+        block_weights({"HR": 1.0})
+
+
+def test_weighted_pairwise():
+    v1, v2 = [1, 0, 1, 1], [1, 1, 0, 1]
+    weights = np.array([2.0, 1.0, 0.5, 1.0])
+    assert np.isclose(weighted_tanimoto(v1, v2, weights), 3 / 4.5)
+    assert weighted_tanimoto(v1, v2, np.ones(4)) == tanimoto(v1, v2)
+    assert np.isclose(weighted_manhattan(v1, v2, weights), 1.5)
+    a, b = np.array([0.2, 0.5, 0.8, 0.1]), np.array([0.1, 0.4, 0.9, 0.3])
+    scaled = np.sqrt(weights)
+    assert np.isclose(weighted_cosine(a, b, weights), cosine_sim(a * scaled, b * scaled))
+
+
+WEIGHTED = {
+    "tanimoto": weighted_tanimoto,
+    "jaccard": weighted_tanimoto,
+    "manhattan": weighted_manhattan,
+    "cosine_sim": weighted_cosine,
+}
+
+
+@pytest.mark.parametrize("metric", list(WEIGHTED))
+@pytest.mark.parametrize("packed", [False, True])
+def test_weighted_bulk_matches_pairwise(metric, packed):
+    rng = np.random.default_rng(6)
+    fps = rng.integers(0, 2, size=(40, 70))
+    fps[0] = 0
+    weights = np.repeat([2.0, 0.0, 0.5, 1.0, 3.0, 0.5, 1.0], 10)
+    data = pack_fp(fps) if packed else fps
+    with np.errstate(invalid="ignore", divide="ignore"):
+        expected = np.array([[WEIGHTED[metric](a, b, weights) for b in fps] for a in fps[:5]])
+        many = score_many(data[3], data, metric=metric, packed=packed, weights=weights)
+        matrix = score_matrix(
+            data[:5], data, metric=metric, packed=packed, max_memory=500, weights=weights
+        )
+    assert np.allclose(many, expected[3], equal_nan=True)
+    assert np.allclose(matrix, expected, equal_nan=True)
+    with pytest.raises(ValueError):
+        score_many(data[3], data, metric=metric, packed=packed, weights=weights[:-20])
+
+
+def test_packed_weights_cover_every_bit():
+    fps = np.random.default_rng(7).integers(0, 2, size=(20, 190))
+    packed = pack_fp(fps)
+    weights = np.linspace(0.5, 2.0, 190)
+    expected = [weighted_tanimoto(fps[0], b, weights) for b in fps]
+    assert np.allclose(score_many(packed[0], packed, packed=True, weights=weights), expected)
+    # 150 weights pack into the same 3 words but leave bits 150-189 unweighted
+    with pytest.raises(ValueError, match="past bit 150"):
+        score_many(packed[0], packed, packed=True, weights=weights[:150])
+    with pytest.raises(ValueError):
+        score_many(packed[0], packed, packed=True, weights=weights[:120])
+    # fingerprints without bits past the weights are scored as given
+    short = pack_fp(fps[:, :150])
+    score_many(short[0], short, packed=True, weights=weights[:150])
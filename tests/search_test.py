@@ -0,0 +1,143 @@
+import pytest
+import numpy as np
+from diamondfp.fingerprints import pack_fp
+from diamondfp.scoring import _score_block, score_many, weighted_cosine, weighted_tanimoto
+from diamondfp.search import top_k, top_k_many, PopcountIndex, HIGHER_IS_BETTER
+
+
+def brute_force(query, fps, k, metric, packed=False):
+    scores = score_many(query, fps, metric=metric, packed=packed)
+    key = -scores if HIGHER_IS_BETTER[metric] else scores
+    order = np.lexsort((np.arange(len(scores)), key))[:k]
+    return order, scores[order]
+
+
+@pytest.fixture
+def fps():
+    rng = np.random.default_rng(5)
+    fps = (rng.random((300, 40)) < rng.random((300, 1))).astype(np.uint8)
+    fps[10] = fps[20]  # exact ties
+    return fps
+
+
+@pytest.mark.parametrize("metric", ["tanimoto", "jaccard", "cosine_sim"])
+@pytest.mark.parametrize("k", [1, 5, 25])
+def test_top_k_matches_brute_force(fps, metric, k):
+    for q in [0, 10, 150]:
+        expected_idx, expected_scores = brute_force(fps[q], fps, k, metric)
+        idx, scores = top_k(fps[q], fps, k=k, metric=metric)
+        assert idx.tolist() == expected_idx.tolist()
+        assert np.array_equal(scores, expected_scores)
+
+
+@pytest.mark.parametrize("metric", ["tanimoto", "manhattan"])
+def test_top_k_packed_index(fps, metric):
+    packed = pack_fp(fps)
+    index = PopcountIndex(packed, packed=True)
+    for q in range(0, 300, 37):
+        expected_idx, expected_scores = brute_force(packed[q], packed, 10, metric, packed=True)
+        idx, scores = top_k(packed[q], index, k=10, metric=metric)
+        assert idx.tolist() == expected_idx.tolist()
+        assert np.array_equal(scores, expected_scores)
+
+
+def test_top_k_ties_prefer_lower_index():
+    fps = np.array([[1, 0], [1, 1], [1, 0], [1, 0]])
+    idx, scores = top_k([1, 0], fps, k=2)
+    assert idx.tolist() == [0, 2]
+    assert scores.tolist() == [1.0, 1.0]
+
+
+def test_top_k_k_larger_than_players():
+    idx, _ = top_k([1, 0], [[0, 1], [1, 0]], k=5)
+    assert idx.tolist() == [1, 0]
+
+
+def test_top_k_invalid():
+    with pytest.raises(ValueError):
+        top_k([1, 0], [[1, 0]], metric="invalid")
+    with pytest.raises(ValueError):
+        top_k([1, 0], [[1, 0]], k=0)
+
+
+@pytest.mark.parametrize("metric", ["tanimoto", "manhattan", "cosine_sim"])
+@pytest.mark.parametrize("packed", [False, True])
+def test_top_k_weighted(fps, metric, packed):
+    weights = np.repeat([2.0, 1.0, 0.5, 0.0], 10)
+    data = pack_fp(fps) if packed else fps
+    scores = score_many(data[0], data, metric=metric, packed=packed, weights=weights)
+    key = -scores if HIGHER_IS_BETTER[metric] else scores
+    expected = np.lexsort((np.arange(len(scores)), key))[:5]
+
+    idx, sc = top_k(data[0], data, k=5, metric=metric, packed=packed, weights=weights)
+    assert idx.tolist() == expected.tolist()
+    assert np.array_equal(sc, scores[expected])
+    index = PopcountIndex(data, packed=packed)
+    idx, _ = top_k(data[0], index, k=5, metric=metric, weights=weights)
+    assert idx.tolist() == expected.tolist()
+    idx, _ = top_k_many(data[:1], data, k=5, metric=metric, packed=packed, weights=weights)
+    assert idx[0].tolist() == expected.tolist()
+
+
+def test_top_k_matrix_skips_index_build(fps, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("PopcountIndex built for a plain matrix")
+
+    expected_idx, expected_scores = brute_force(fps[3], fps, 10, "tanimoto")
+    monkeypatch.setattr(PopcountIndex, "__init__", fail)
+    idx, scores = top_k(fps[3], fps, k=10)
+    assert idx.tolist() == expected_idx.tolist()
+    assert np.array_equal(scores, expected_scores)
+
+
+@pytest.mark.parametrize("metric", ["tanimoto", "jaccard", "manhattan"])
+@pytest.mark.parametrize("packed", [False, True])
+def test_top_k_weighted_index_pruned(metric, packed, monkeypatch):
+    import diamondfp.search as search
+
+    scored = []
+
+    def score_block(prep_a, prep_b, *args):
+        scored.append(len(prep_b[0]))
+        return _score_block(prep_a, prep_b, *args)
+
+    monkeypatch.setattr(search, "_score_block", score_block)
+    rng = np.random.default_rng(12)
+    fps = (rng.random((3000, 70)) < rng.random((3000, 1))).astype(np.uint8)
+    fps[100] = fps[200]  # exact ties
+    weights = np.repeat([2.0, 1.0, 0.5, 0.0, 3.0, 1.0, 0.25], 10)
+    data = pack_fp(fps) if packed else fps
+    index = PopcountIndex(data, packed=packed)
+    for q in [0, 100, 2500]:
+        scores = score_many(data[q], data, metric=metric, packed=packed, weights=weights)
+        key = -scores if HIGHER_IS_BETTER[metric] else scores
+        expected = np.lexsort((np.arange(len(scores)), key))[:10]
+        scored.clear()
+        idx, sc = top_k(data[q], index, k=10, metric=metric, weights=weights)
+        assert idx.tolist() == expected.tolist()
+        assert np.array_equal(sc, scores[expected])
+        # only some of the blocks were scored
+        assert 0 < sum(scored) < len(fps)
+    assert index.weighted(weights) is index.weighted(weights.copy())
+
+
+@pytest.mark.parametrize("metric", ["tanimoto", "cosine_sim"])
+@pytest.mark.parametrize("packed", [False, True])
+def test_top_k_weighted_ties(metric, packed):
+    rng = np.random.default_rng(12)
+    fps = (rng.random((600, 12)) < 0.5).astype(np.uint8)
+    weights = np.repeat([3.0, 2.0, 1.0], 4)
+    pairwise = weighted_tanimoto if metric == "tanimoto" else weighted_cosine
+    data = pack_fp(fps) if packed else fps.astype(float)
+    index = PopcountIndex(data, packed=packed)
+    for q in range(0, 600, 40):
+        scores = np.array([pairwise(fps[q], fp, weights) for fp in fps])
+        expected = np.lexsort((np.arange(len(fps)), -scores))[:40]
+        # exact ties must come back in lower-index order
+        assert len(np.unique(scores[expected])) < 40
+        idx, sc = top_k(data[q], data, k=40, metric=metric, packed=packed, weights=weights)
+        assert idx.tolist() == expected.tolist()
+        assert np.array_equal(sc, scores[expected])
+        idx, sc = top_k(data[q], index, k=40, metric=metric, weights=weights)
+        assert idx.tolist() == expected.tolist()
+        assert np.array_equal(sc, scores[expected])
@@ -0,0 +1,74 @@
+import pytest
+import numpy as np
+import pandas as pd
+from diamondfp.utils.features import generate_quantiles, feature_scaling
+from diamondfp.utils.stats import KLLSketch, OnlineFeatureStats
+
+
+def test_kll_exact_when_small():
+    values = np.random.default_rng(0).random(50)
+    sketch = KLLSketch(k=100).update(values)
+    assert np.allclose(sketch.quantile([0.1, 0.5, 0.9]), np.quantile(values, [0.1, 0.5, 0.9]))
+
+
+def test_kll_rank_error_bounded():
+    values = np.random.default_rng(1).standard_normal(200_000)
+    sketch = KLLSketch(k=200, seed=0)
+    for chunk in np.array_split(values, 20):
+        sketch.update(chunk)
+    assert sum(len(level) for level in sketch.levels) < 1000
+    qs = np.array([0.05, 0.25, 0.5, 0.75, 0.95])
+    ranks = np.array([(values < v).mean() for v in sketch.quantile(qs)])
+    assert np.all(np.abs(ranks - qs) < 0.01)
+
+
+def test_kll_merge():
+    values = np.random.default_rng(2).random(20_000)
+    left = KLLSketch(k=200, seed=0).update(values[:7000])
+    right = KLLSketch(k=200, seed=1).update(values[7000:])
+    merged = left.merge(right)
+    assert merged.n == 20_000
+    ranks = np.array([(values < v).mean() for v in merged.quantile([0.1, 0.5, 0.9])])
+    assert np.all(np.abs(ranks - [0.1, 0.5, 0.9]) < 0.01)
+
+
+def test_kll_empty():
+    assert np.isnan(KLLSketch().update([np.nan]).quantile(0.5))
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(3)
+    data = pd.DataFrame({"AVG": rng.random(500), "HR": rng.integers(0, 60, 500).astype(float)})
+    data.loc[::17, "AVG"] = np.nan
+    return data
+
+
+@pytest.mark.parametrize("method", ["minmax", "zscore"])
+def test_online_feature_scaling_matches_batch(data, method):
+    stats = OnlineFeatureStats(["AVG", "HR"])
+    for chunk in np.array_split(np.arange(len(data)), 6):
+        stats.partial_fit(data.iloc[chunk])
+    expected = feature_scaling(data, ["AVG", "HR"], method=method)
+    result = stats.feature_scaling(method=method)
+    for feat in expected:
+        assert np.allclose(result[feat], expected[feat])
+
+
+def test_online_merge_and_quantiles(data):
+    left = OnlineFeatureStats(["AVG", "HR"]).partial_fit(data.iloc[:200])
+    right = OnlineFeatureStats(["AVG", "HR"]).partial_fit(data.iloc[200:])
+    merged = left.merge(right)
+    assert np.allclose(merged.feature_scaling()["AVG"], feature_scaling(data, ["AVG"])["AVG"])
+
+    stat_features = {"AVG": [0.25, 0.75]}
+    expected = generate_quantiles(data, stat_features, skipna=True)
+    assert np.allclose(merged.generate_quantiles(stat_features)["AVG"], expected["AVG"], atol=0.02)
+
+
+def test_online_invalid():
+    stats = OnlineFeatureStats(["AVG"])
+    with pytest.raises(ValueError):
+        stats.feature_scaling(method="invalid")
+    with pytest.raises(ValueError):
+        stats.merge(OnlineFeatureStats(["HR"]))
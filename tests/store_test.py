@@ -0,0 +1,134 @@
+import pytest
+import numpy as np
+import pandas as pd
+from diamondfp.fingerprints import binaryfp_batch, normalizedfp_batch, pack_fp
+from diamondfp.search import PopcountIndex, top_k
+from diamondfp.store import FingerprintStore
+
+
+FEAT_QUANTS = {"AVG": [0.25, 0.5, 0.75], "HR": [0.5, 0.9]}
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(10)
+    df = pd.DataFrame(rng.random((60, 2)), columns=["AVG", "HR"])
+    df.insert(0, "playerID", [f"p{i:02d}" for i in range(60)])
+    return df
+
+
+def expected_fps(store, frame, feat_quants=FEAT_QUANTS):
+    frame = frame.set_index("playerID").loc[store.ids]
+    return pack_fp(binaryfp_batch(frame, feat_quants))
+
+
+def test_store_from_data(data):
+    store = FingerprintStore.from_data(data, "playerID", feat_quants=FEAT_QUANTS)
+    assert len(store) == 60 and store.stale == []
+    assert np.array_equal(store.fps, expected_fps(store, data))
+
+
+def test_upsert_and_delete(data):
+    store = FingerprintStore.from_data(data, "playerID", feat_quants=FEAT_QUANTS)
+    store.upsert(["p05", "new"], {"AVG": [0.9, 0.1], "HR": [0.95, 0.2]})
+    assert store.stale == ["p05", "new"]
+    store.delete(["p10", "p00"])
+    assert store.refresh() == 2
+
+    data = data.set_index("playerID")
+    data.loc["p05"] = [0.9, 0.95]
+    data.loc["new"] = [0.1, 0.2]
+    data = data.drop(["p10", "p00"]).reset_index()
+    assert sorted(store.ids) == sorted(data["playerID"])
+    assert np.array_equal(store.fps, expected_fps(store, data))
+    with pytest.raises(KeyError):
+        store.top_k("p10")
+
+
+def test_refit_marks_only_changed_rows(data):
+    store = FingerprintStore.from_data(data, "playerID", feat_quants=FEAT_QUANTS)
+    before = store.fps.copy()
+    refit = {"AVG": [0.25, 0.45, 0.75], "HR": [0.5, 0.95]}
+    n_stale = store.refit(feat_quants=refit)
+
+    after = expected_fps(store, data, refit)
+    changed = [store.ids[i] for i in np.flatnonzero((before != after).any(axis=1))]
+    assert n_stale == len(changed) > 0
+    assert store.stale == changed
+    assert store.refresh() == n_stale
+    assert np.array_equal(store.fps, after)
+
+
+def test_refit_new_layout_rebuilds(data):
+    store = FingerprintStore.from_data(data, "playerID", feat_quants=FEAT_QUANTS)
+    refit = {"AVG": [0.5], "HR": [0.5, 0.9]}
+    assert store.refit(feat_quants=refit) == 60
+    assert np.array_equal(store.fps, expected_fps(store, data, refit))
+    with pytest.raises(ValueError):
+        store.refit(feat_quants={"AVG": [0.5]})
+
+
+def test_normalized_refit(data):
+    scaling = {"AVG": (0.0, 1.0), "HR": (0.0, 1.0)}
+    store = FingerprintStore.from_data(
+        data, "playerID", feat_scaling=scaling, fp_type="normalized", method="minmax"
+    )
+    assert store.refit(feat_scaling={"AVG": (0.0, 1.0), "HR": (0.0, 2.0)}) == 60
+    expected = normalizedfp_batch(data, {"AVG": (0.0, 1.0), "HR": (0.0, 2.0)}, "minmax")
+    assert np.allclose(store.fps, expected)
+
+
+@pytest.mark.parametrize("metric", ["tanimoto", "manhattan", "cosine_sim"])
+def test_top_k_consistent_through_updates(data, metric):
+    store = FingerprintStore.from_data(data, "playerID", feat_quants=FEAT_QUANTS)
+    store.top_k("p01", metric=metric)
+    store.upsert(["p01", "p02"], np.array([[0.8, 0.95], [0.3, 0.1]]))
+    store.delete(["p03"])
+    ids, scores = store.top_k("p01", k=5, metric=metric)
+
+    fps = store.fps
+    row = store.ids.index("p01")
+    idx, expected = top_k(fps[row], fps, k=6, metric=metric, packed=True)
+    keep = idx != row
+    assert ids == [store.ids[i] for i in idx[keep][:5]]
+    assert np.array_equal(scores, expected[keep][:5])
+
+
+def test_normalized_refit_nan_rows_follow_spread(data):
+    data = data.copy()
+    data.loc[[4, 9], "HR"] = np.nan
+    store = FingerprintStore.from_data(
+        data, "playerID", feat_scaling={"AVG": (0.5, 0.2), "HR": (0.5, 0.0)}, fp_type="normalized"
+    )
+    assert np.all(store.fps[:, 1] == 0.0)
+    refit = {"AVG": (0.5, 0.2), "HR": (0.5, 0.3)}
+    assert store.refit(feat_scaling=refit) == 60
+    assert np.allclose(store.fps, normalizedfp_batch(data, refit), equal_nan=True)
+    assert np.isnan(store.fps[[4, 9], 1]).all()
+
+
+@pytest.mark.parametrize("metric", ["tanimoto", "manhattan"])
+def test_popcount_buckets_follow_updates(data, metric):
+    rng = np.random.default_rng(3)
+    store = FingerprintStore.from_data(data, "playerID", feat_quants=FEAT_QUANTS)
+    store.top_k("p00", metric=metric)
+    buckets = store._buckets
+    # a helper of the store, not a PopcountIndex missing its attributes
+    assert not isinstance(buckets, PopcountIndex)
+    next_id = 60
+    for step in range(20):
+        store.upsert([f"p{next_id:02d}", store.ids[step]], rng.random((2, 2)))
+        store.delete([store.ids[rng.integers(len(store))]])
+        next_id += 1
+        player = store.ids[rng.integers(len(store))]
+        ids, scores = store.top_k(player, k=5, metric=metric)
+
+        fps = store.fps
+        row = store.ids.index(player)
+        idx, expected = top_k(fps[row], fps, k=6, metric=metric, packed=True)
+        keep = idx != row
+        assert ids == [store.ids[i] for i in idx[keep][:5]]
+        assert np.array_equal(scores, expected[keep][:5])
+    # the buckets were updated in place rather than rebuilt
+    assert store._buckets is buckets
+    assert sum(len(rows) for rows in buckets._rows.values()) == len(store)
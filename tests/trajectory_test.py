@@ -0,0 +1,199 @@
+import pytest
+import numpy as np
+import pandas as pd
+from diamondfp.fingerprints import binaryfp_batch, pack_fp
+from diamondfp.scoring import tanimoto, manhattan
+from diamondfp.trajectory import (
+    Trajectories,
+    build_trajectories,
+    aligned_top_k,
+    dtw_top_k,
+    dtw_distance,
+)
+
+
+FEAT_QUANTS = {"AVG": [0.25, 0.5, 0.75], "HR": [0.3, 0.6]}
+
+
+@pytest.fixture
+def seasons():
+    rng = np.random.default_rng(7)
+    lengths = rng.integers(1, 8, size=80)
+    ids = np.repeat([f"p{i:02d}" for i in range(80)], lengths)
+    years = np.concatenate([2015 + rng.permutation(n) for n in lengths])
+    df = pd.DataFrame({"player_id": ids, "year": years})
+    df["name"] = "Name " + df["player_id"]
+    df["AVG"] = np.round(rng.random(len(df)), 1)
+    df["HR"] = np.round(rng.random(len(df)), 1)
+    return df.sample(frac=1, random_state=0)
+
+
+def test_build_trajectories(seasons):
+    traj = build_trajectories(
+        seasons, "player_id", "year", name_col="name", feat_quants=FEAT_QUANTS, pack=False
+    )
+    assert len(traj) == 80
+    assert traj.lengths.sum() == len(seasons)
+    for pid in ["p00", "p41"]:
+        rows = seasons[seasons["player_id"] == pid].sort_values("year")
+        assert np.array_equal(traj[pid], binaryfp_batch(rows, FEAT_QUANTS))
+        assert np.array_equal(traj[f"Name {pid}"], traj[pid])
+        i = traj.row(pid)
+        assert traj.keys[traj.offsets[i] : traj.offsets[i + 1]].tolist() == rows["year"].tolist()
+
+    head = traj.head(3)
+    assert head.lengths.tolist() == np.minimum(traj.lengths, 3).tolist()
+    assert np.array_equal(head["p41"], traj["p41"][:3])
+    with pytest.raises(ValueError):
+        Trajectories(traj.fps, traj.offsets[:-1], traj.ids)
+
+
+def naive_dtw(a, b, cost):
+    acc = np.full((len(a) + 1, len(b) + 1), np.inf)
+    acc[0, 0] = 0.0
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            acc[i, j] = cost(a[i - 1], b[j - 1]) + min(
+                acc[i - 1, j], acc[i, j - 1], acc[i - 1, j - 1]
+            )
+    return acc[-1, -1]
+
+
+def tanimoto_cost(a, b):
+    return 1 - tanimoto(a, b)
+
+
+def test_dtw_distance():
+    a = np.array([[1, 0, 1], [1, 1, 0], [0, 0, 1]])
+    b = np.array([[1, 0, 1], [0, 0, 1]])
+    assert dtw_distance(a, a) == 0.0
+    assert np.isclose(dtw_distance(a, b), naive_dtw(a, b, tanimoto_cost))
+    assert np.isclose(dtw_distance(pack_fp(a), pack_fp(b), packed=True), dtw_distance(a, b))
+    assert np.isclose(dtw_distance(a, b, metric="manhattan"), naive_dtw(a, b, manhattan))
+
+
+@pytest.mark.parametrize("packed", [False, True])
+@pytest.mark.parametrize("k", [1, 5, 30])
+def test_aligned_top_k_matches_brute_force(seasons, packed, k):
+    traj = build_trajectories(seasons, "player_id", feat_quants=FEAT_QUANTS, pack=packed)
+    plain = build_trajectories(seasons, "player_id", feat_quants=FEAT_QUANTS, pack=False)
+    for player in ["p03", "p10", "p55"]:
+        query = plain[player][:3]
+        scores = np.full(len(plain), np.nan)
+        for i, pid in enumerate(plain.ids):
+            if plain.lengths[i] >= len(query) and pid != player:
+                seq = plain[pid]
+                scores[i] = np.mean([tanimoto(q, s) for q, s in zip(query, seq)])
+        valid = np.flatnonzero(~np.isnan(scores))
+        expected = valid[np.lexsort((valid, -scores[valid]))][:k]
+
+        idx, sc = traj.top_k(player, k=k, seasons=3)
+        assert idx.tolist() == expected.tolist()
+        assert np.allclose(sc, scores[expected])
+
+
+@pytest.mark.parametrize("metric", ["tanimoto", "manhattan"])
+@pytest.mark.parametrize("k", [1, 5, 30])
+def test_dtw_top_k_matches_brute_force(seasons, metric, k):
+    traj = build_trajectories(seasons, "player_id", feat_quants=FEAT_QUANTS, pack=False)
+    cost = tanimoto_cost if metric == "tanimoto" else manhattan
+    for player in ["p03", "p10"]:
+        query = traj[player][:4]
+        costs = np.full(len(traj), np.inf)
+        for i, pid in enumerate(traj.ids):
+            if pid != player and traj.lengths[i] >= 2:
+                costs[i] = naive_dtw(query, traj[pid][:4], cost)
+        valid = np.flatnonzero(np.isfinite(costs))
+        expected = valid[np.lexsort((valid, costs[valid]))][:k]
+
+        idx, sc = dtw_top_k(
+            query, traj, k=k, metric=metric, seasons=4, min_seasons=2, exclude=traj.row(player)
+        )
+        assert idx.tolist() == expected.tolist()
+        assert np.allclose(sc, costs[expected])
+
+
+def test_trajectory_normalized_and_invalid(seasons):
+    traj = build_trajectories(
+        seasons,
+        "player_id",
+        feat_scaling={"AVG": (0.0, 1.0), "HR": (0.0, 1.0)},
+        fp_type="normalized",
+        method="minmax",
+    )
+    query = traj["p07"]
+    idx, sc = aligned_top_k(query, traj, k=3, metric="manhattan")
+    assert idx[0] == traj.row("p07") and sc[0] == 0.0
+    idx, sc = dtw_top_k(query, traj, k=3, metric="cosine_sim")
+    assert sc[0] == pytest.approx(0.0)
+    with pytest.raises(ValueError):
+        traj.top_k("p07", method="invalid")
+    with pytest.raises(ValueError):
+        aligned_top_k(query[:0], traj)
+
+
+@pytest.fixture
+def gappy():
+    rng = np.random.default_rng(11)
+    frames = []
+    for i in range(60):
+        years = np.sort(rng.choice(np.arange(2015, 2026), size=rng.integers(1, 8), replace=False))
+        frames.append(pd.DataFrame({"player_id": f"p{i:02d}", "year": years}))
+    df = pd.concat(frames, ignore_index=True)
+    df["AVG"] = np.round(rng.random(len(df)), 1)
+    df["HR"] = np.round(rng.random(len(df)), 1)
+    return df.sample(frac=1, random_state=1)
+
+
+def test_career_seasons_and_censored(gappy):
+    traj = build_trajectories(gappy, "player_id", feat_quants=FEAT_QUANTS, pack=False)
+    for pid in ["p00", "p07", "p33"]:
+        i = traj.row(pid)
+        years = np.sort(gappy.loc[gappy["player_id"] == pid, "year"].to_numpy())
+        career = traj.career_seasons[traj.offsets[i] : traj.offsets[i + 1]]
+        assert career.tolist() == (years - years[0]).tolist()
+        assert traj.censored[i] == (years[0] == 2015)
+    head = traj.head(3)
+    assert (head.career_seasons < 3).all()
+    careers = np.split(traj.career_seasons, traj.offsets[1:-1])
+    assert head.lengths.tolist() == [(career < 3).sum() for career in careers]
+
+
+@pytest.mark.parametrize("min_seasons", [None, 2])
+@pytest.mark.parametrize("k", [1, 5, 30])
+def test_aligned_top_k_skips_missed_seasons(gappy, min_seasons, k):
+    traj = build_trajectories(gappy, "player_id", feat_quants=FEAT_QUANTS, pack=True)
+    plain = build_trajectories(gappy, "player_id", feat_quants=FEAT_QUANTS, pack=False)
+    seasons = dict(zip(plain.ids, np.split(plain.career_seasons, plain.offsets[1:-1])))
+    for player in ["p03", "p10", "p41"]:
+        window = seasons[player] < 4
+        query, query_seasons = plain[player][window], seasons[player][window]
+        need = len(query) if min_seasons is None else min(min_seasons, len(query))
+        scores = np.full(len(plain), np.nan)
+        for i, pid in enumerate(plain.ids):
+            if pid == player or plain.censored[i]:
+                continue
+            by_season = dict(zip(seasons[pid], plain[pid]))
+            shared = [s for s in query_seasons if s in by_season]
+            if len(shared) >= need:
+                pairs = zip(query[np.isin(query_seasons, shared)], shared)
+                scores[i] = np.mean([tanimoto(q, by_season[s]) for q, s in pairs])
+        valid = np.flatnonzero(~np.isnan(scores))
+        expected = valid[np.lexsort((valid, -scores[valid]))][:k]
+
+        idx, sc = traj.top_k(
+            player, k=k, seasons=4, min_seasons=min_seasons, skip_censored=True
+        )
+        assert idx.tolist() == expected.tolist()
+        assert np.allclose(sc, scores[expected])
+
+
+def test_dtw_top_k_cuts_query(seasons):
+    traj = build_trajectories(seasons, "player_id", feat_quants=FEAT_QUANTS, pack=False)
+    exclude = int(np.argmax(traj.lengths))
+    query = traj[traj.ids[exclude]]
+    assert len(query) > 2
+    cut = dtw_top_k(query, traj, k=5, seasons=2, exclude=exclude)
+    full = dtw_top_k(query[:2], traj, k=5, seasons=2, exclude=exclude)
+    assert cut[0].tolist() == full[0].tolist()
+    assert np.allclose(cut[1], full[1])